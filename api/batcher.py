@@ -0,0 +1,155 @@
+import time
+import asyncio
+from collections import deque
+import numpy as np
+
+class QueueFullError(Exception):
+    """Raised by MicroBatcher.submit when accepting the request would exceed the queue limit."""
+
+class MicroBatcher:
+    """
+    Collects items from concurrent callers into batches and runs process_fn once
+    per batch in a worker thread.
+
+    A batch is closed when it holds max_batch_size items or max_wait_ms have
+    passed since its oldest request arrived. A caller's items always stay in
+    one batch, and each caller gets back the slice of results for its own items.
+    process_fn(items) must return one result per item, in order.
+    """
+
+    def __init__(self, process_fn, max_batch_size=64, max_wait_ms=5.0, max_queue_size=2048, recent_window=1000):
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+
+        self._pending = deque()
+        self._pending_items = 0
+        self._wakeup = None
+        self._task = None
+
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.batch_size_counts = {}
+        self._recent_batch_sizes = deque(maxlen=recent_window)
+        self._recent_queue_delays = deque(maxlen=recent_window)
+
+    async def start(self):
+        """Start the batching loop on the running event loop."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any requests still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._pending:
+            _, future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+        self._pending_items = 0
+
+    def queue_depth(self):
+        """Number of items waiting to be batched."""
+        return self._pending_items
+
+    async def submit(self, items):
+        """Queue items for the next batch and wait for their results."""
+        items = list(items)
+        if self._pending_items + len(items) > self.max_queue_size:
+            self.rejected += 1
+            raise QueueFullError(f"Queue holds {self._pending_items} items (limit {self.max_queue_size})")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((items, future, time.perf_counter()))
+        self._pending_items += len(items)
+        self._wakeup.set()
+        return await future
+
+    async def _collect(self):
+        """Wait until a batch is full or its oldest request has waited max_wait, then take it."""
+        oldest = self._pending[0][2]
+        while self._pending_items < self.max_batch_size:
+            remaining = oldest + self.max_wait - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        batch = []
+        size = 0
+        while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_batch_size):
+            request = self._pending.popleft()
+            batch.append(request)
+            size += len(request[0])
+        self._pending_items -= size
+        return batch, size
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            batch, size = await self._collect()
+            now = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self._recent_queue_delays.append(now - enqueued_at)
+
+            self.batches += 1
+            self.items += size
+            self.requests += len(batch)
+            self._recent_batch_sizes.append(size)
+            bucket = 1 << max(0, size - 1).bit_length()
+            self.batch_size_counts[bucket] = self.batch_size_counts.get(bucket, 0) + 1
+
+            flat_items = [item for items, _, _ in batch for item in items]
+            try:
+                results = await loop.run_in_executor(None, self.process_fn, flat_items)
+            except Exception as e:
+                self.failed_batches += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for items, future, _ in batch:
+                # The caller may have gone away (e.g. client disconnect)
+                if not future.done():
+                    future.set_result(results[start:start + len(items)])
+                start += len(items)
+
+    def metrics(self):
+        """Batch size and queueing delay statistics (recent window for percentiles)."""
+        delays_ms = np.array(self._recent_queue_delays) * 1000
+        sizes = np.array(self._recent_batch_sizes)
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "items": self.items,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "queue_depth": self._pending_items,
+            "mean_batch_size": float(sizes.mean()) if len(sizes) else 0.0,
+            "batch_size_histogram": {f"<={k}": v for k, v in sorted(self.batch_size_counts.items())},
+            "queue_delay_ms": {
+                "p50": float(np.percentile(delays_ms, 50)) if len(delays_ms) else 0.0,
+                "p99": float(np.percentile(delays_ms, 99)) if len(delays_ms) else 0.0,
+                "max": float(delays_ms.max()) if len(delays_ms) else 0.0,
+            },
+        }
@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse
+from api.batcher import MicroBatcher
+from api.routes import match
+from api.schemas import HealthResponse
+from models import match_engine, registry, sentence_encoder
+from utils import tracing
+
+EMBEDDINGS_DIR = os.environ.get("OCIE_EMBEDDINGS_DIR", "data/embeddings")
+# Set to 0 to skip loading the encoder (embedding-only deployments)
+PRELOAD_MODEL = os.environ.get("OCIE_PRELOAD_MODEL", "1") != "0"
+# Micro-batching: close a batch at this many controls or after this long, and
+# reject new requests (429) once this many controls are queued
+BATCH_MAX_ITEMS = int(os.environ.get("OCIE_BATCH_MAX_ITEMS", 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get("OCIE_BATCH_MAX_WAIT_MS", 5))
+BATCH_MAX_QUEUE = int(os.environ.get("OCIE_BATCH_MAX_QUEUE", 2048))
+# float32, float16 or int8; quantized matrices re-rank a shortlist at full precision
+MATRIX_PRECISION = os.environ.get("OCIE_MATRIX_PRECISION", "float32")
+
+def warm_engine(app):
+    """
+    Load the regulation matrix and the encoder once, and run one dummy request
+    through both so the first real request doesn't pay any start-up cost.
+    """
+    start = time.perf_counter()
+    regulations = match_engine.load_all_regulation_embeddings(EMBEDDINGS_DIR)
+    regulation_matrix = match_engine.build_regulation_matrix(regulations, precision=MATRIX_PRECISION)
+    app.state.regulation_matrix = regulation_matrix
+
+    if PRELOAD_MODEL:
+        registry.preload([sentence_encoder.MODEL_NAME])
+        warmup_embeddings = sentence_encoder.encode_texts(["warm-up control statement"])
+    else:
+        warmup_embeddings = regulation_matrix['matrix'][:1]
+    match_engine.match_controls_to_regulations(warmup_embeddings, None, regulation_matrix=regulation_matrix)
+
+    app.state.warmup_seconds = time.perf_counter() - start
+    print(f"🔥 Engine warm in {app.state.warmup_seconds:.2f}s: "
+          f"{len(regulation_matrix['regulations'])} regulations, {len(regulation_matrix['matrix'])} requirements")
+
+async def start_engine(app):
+    """
+    Warm the engine in a worker thread, then start the micro-batcher and mark
+    the app ready. Runs in the background so the server answers /health and
+    /ready (503) while it loads.
+    """
+    try:
+        await asyncio.to_thread(warm_engine, app)
+        app.state.batcher = MicroBatcher(
+            partial(match.run_match_batch, app.state.regulation_matrix),
+            max_batch_size=BATCH_MAX_ITEMS,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_queue_size=BATCH_MAX_QUEUE,
+        )
+        await app.state.batcher.start()
+        app.state.ready = True
+    except Exception as e:
+        app.state.warmup_error = f"{type(e).__name__}: {e}"
+        print(f"❌ Engine warm-up failed: {app.state.warmup_error}")
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.ready = False
+    app.state.warmup_seconds = None
+    app.state.warmup_error = None
+    app.state.batcher = None
+    warmup = asyncio.create_task(start_engine(app))
+    yield
+    warmup.cancel()
+    if app.state.batcher is not None:
+        await app.state.batcher.stop()
+
+app = FastAPI(title="Compliance Intelligence Engine", lifespan=lifespan)
+app.include_router(match.router)
+
+@app.get("/health", response_model=HealthResponse)
+def health():
+    """Liveness plus a readiness flag that turns true once the engine is warm."""
+    regulation_matrix = getattr(app.state, "regulation_matrix", None)
+    ready = getattr(app.state, "ready", False)
+    return HealthResponse(
+        status="ok",
+        ready=ready,
+        model=sentence_encoder.MODEL_NAME,
+        model_loaded=registry.is_loaded(sentence_encoder.MODEL_NAME),
+        regulations=len(regulation_matrix['regulations']) if regulation_matrix else 0,
+        requirements=len(regulation_matrix['matrix']) if regulation_matrix else 0,
+        warmup_seconds=getattr(app.state, "warmup_seconds", None),
+        warmup_error=getattr(app.state, "warmup_error", None),
+    )
+
+@app.get("/ready")
+def ready(response: Response):
+    """503 until the engine is warm (or if warm-up failed), for load balancer readiness probes."""
+    if not getattr(app.state, "ready", False):
+        response.status_code = 503
+        return {"ready": False, "error": getattr(app.state, "warmup_error", None)}
+    return {"ready": True}
+
+@app.get("/metrics/batching")
+def batching_metrics(response: Response):
+    """Micro-batcher batch sizes, queue depth and queueing delay (503 until the engine is warm)."""
+    if getattr(app.state, "batcher", None) is None:
+        response.status_code = 503
+        return {"ready": False}
+    return app.state.batcher.metrics()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage pipeline metrics in Prometheus text format (empty unless OCIE_TRACE=1)."""
+    return tracing.prometheus_text()
+
+@app.get("/metrics/stages")
+def stage_metrics():
+    """Per-stage pipeline metrics as a JSON run summary."""
+    return tracing.summary()
+
@@ -0,0 +1,88 @@
+import time
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from api.batcher import QueueFullError
+from api.schemas import MatchRequest, MatchResponse
+from models import match_engine, partitions, sentence_encoder
+
+router = APIRouter()
+
+def run_match_batch(regulation_matrix, items):
+    """
+    Process one micro-batch of controls from any number of requests.
+    items: (text, embedding, top_n, min_threshold, filters) tuples with either text or embedding set.
+    All texts are encoded in one call and the controls sharing a filter are
+    scored in one similarity pass (over the filter's partitions only) using
+    the loosest top_n/min_threshold among them, then each item is cut back to
+    its own request's settings.
+    """
+    texts = [text for text, _, _, _, _ in items if text is not None]
+    encoded = iter(sentence_encoder.encode_texts(texts)) if texts else iter(())
+    control_embeddings = np.vstack([
+        next(encoded) if text is not None else embedding for text, embedding, _, _, _ in items
+    ])
+
+    groups = {}
+    for pos, item in enumerate(items):
+        groups.setdefault(item[4], []).append(pos)
+
+    results = [None] * len(items)
+    for filters, positions in groups.items():
+        group_results = match_engine.match_controls_to_regulations(
+            control_embeddings[positions],
+            None,
+            top_n=max(items[pos][2] for pos in positions),
+            min_threshold=min(items[pos][3] for pos in positions),
+            regulation_matrix=regulation_matrix,
+            filters=filters,
+        )
+        # Matches are sorted by similarity, so the first top_n above the threshold are the item's own top_n
+        for pos, control_matches in zip(positions, group_results):
+            _, _, top_n, threshold, _ = items[pos]
+            results[pos] = [m for m in control_matches if m['similarity'] >= threshold][:top_n]
+    return results
+
+@router.post("/match", response_model=MatchResponse)
+async def match_controls(body: MatchRequest, request: Request):
+    """
+    Match control texts or precomputed control embeddings against the warm
+    regulation matrix. Concurrent requests are micro-batched together.
+    An optional filter expression (e.g. "region=India") scores only those partitions.
+    Returns match_controls_to_regulations output.
+    """
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Engine is still warming up")
+
+    start = time.perf_counter()
+    regulation_matrix = request.app.state.regulation_matrix
+
+    if body.filter is not None:
+        if regulation_matrix.get('precision', "float32") != "float32":
+            raise HTTPException(status_code=422, detail="Filtered matching needs a float32 regulation matrix")
+        try:
+            partitions.validate_filter(regulation_matrix, body.filter)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    if body.texts is not None:
+        items = [(text, None, body.top_n, body.min_threshold, body.filter) for text in body.texts]
+    else:
+        dim = regulation_matrix['matrix'].shape[1]
+        if any(len(embedding) != dim for embedding in body.embeddings):
+            raise HTTPException(status_code=422, detail=f"Embeddings must all have dimension {dim}")
+        items = [
+            (None, np.asarray(embedding, dtype=np.float32), body.top_n, body.min_threshold, body.filter)
+            for embedding in body.embeddings
+        ]
+
+    try:
+        results = await request.app.state.batcher.submit(items)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    # control_index is relative to this request, not to the shared batch
+    for i, control_matches in enumerate(results):
+        for m in control_matches:
+            m['control_index'] = i
+
+    return MatchResponse(results=results, took_ms=(time.perf_counter() - start) * 1000)
@@ -0,0 +1,46 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from models import partitions
+
+class MatchRequest(BaseModel):
+    """Controls to match, as raw texts or precomputed embeddings (exactly one of the two)."""
+    texts: Optional[List[str]] = None
+    embeddings: Optional[List[List[float]]] = None
+    top_n: int = Field(5, ge=1, le=100)
+    min_threshold: float = Field(0.65, ge=-1.0, le=1.0)
+    # Filter expression scoping the match, e.g. "region=India" (see models.partitions)
+    filter: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_controls(self):
+        if (self.texts is None) == (self.embeddings is None):
+            raise ValueError("Provide exactly one of 'texts' or 'embeddings'")
+        if not (self.texts or self.embeddings):
+            raise ValueError("At least one control is required")
+        if self.filter is not None:
+            partitions.parse_filter(self.filter)
+        return self
+
+class Match(BaseModel):
+    control_index: int
+    regulation: str
+    requirement_index: int
+    requirement_text: str
+    similarity: float
+    match_level: str
+    tags: str
+    category_refined: str
+
+class MatchResponse(BaseModel):
+    results: List[List[Match]]
+    took_ms: float
+
+class HealthResponse(BaseModel):
+    status: str
+    ready: bool
+    model: str
+    model_loaded: bool
+    regulations: int
+    requirements: int
+    warmup_seconds: Optional[float] = None
+    warmup_error: Optional[str] = None
@@ -0,0 +1,8 @@
+import os
+
+# Embedding store the dashboard matches against
+EMBEDDINGS_DIR = os.environ.get("OCIE_EMBEDDINGS_DIR", "data/embeddings")
+
+# Matching parameters for uploaded controls
+TOP_N = int(os.environ.get("OCIE_TOP_N", 5))
+MIN_THRESHOLD = float(os.environ.get("OCIE_MIN_THRESHOLD", 0.65))
@@ -1,18 +1,48 @@
+import hashlib
 import streamlit as st
 import pandas as pd
+from app import config, engine
+from models import sentence_encoder
 from utils import plot_utils
-from models import match_engine
 
 st.set_page_config(page_title="Compliance Intelligence Engine", layout="wide")
 st.title("🛡️ Compliance Intelligence Engine")
 
+# Regulations and the stacked matrix are loaded once per process and shared by
+# every session; a new fingerprint (the embedding store changed) reloads them
+@st.cache_resource(max_entries=1, show_spinner="Loading regulations...")
+def get_engine(fingerprint):
+    return engine.load_engine(config.EMBEDDINGS_DIR, fingerprint)
+
+current_engine = get_engine(engine.store_fingerprint(config.EMBEDDINGS_DIR))
+
 # Sidebar Options
 st.sidebar.header("🔍 Navigation")
 option = st.sidebar.radio("Choose a module:", ["Upload & Match", "Compliance Score", "Visualizations", "Chatbot"])
-
-# Shared session state
-if "match_results" not in st.session_state:
-    st.session_state.match_results = []
+st.sidebar.caption(f"{len(current_engine['regulation_matrix']['regulations'])} regulations, "
+                   f"{len(current_engine['regulation_matrix']['matrix'])} requirements")
+
+# Shared session state: the uploaded controls and what was computed from them.
+# Aggregates are built once per match, so switching tabs only renders them.
+if "match" not in st.session_state:
+    st.session_state.match = None
+
+def run_match(upload_key, texts, embeddings):
+    result = engine.match(current_engine, embeddings)
+    st.session_state.match = {
+        'upload_key': upload_key,
+        'fingerprint': current_engine['fingerprint'],
+        'texts': texts,
+        'embeddings': embeddings,
+        'result': result,
+        'aggregates': engine.aggregates(result, texts),
+    }
+
+# Re-match the current upload (without re-encoding it) if the regulations changed
+match = st.session_state.match
+if match is not None and match['fingerprint'] != current_engine['fingerprint']:
+    with st.spinner("Regulations changed, re-matching..."):
+        run_match(match['upload_key'], match['texts'], match['embeddings'])
 
 # --- 1. Upload & Match ---
 if option == "Upload & Match":
@@ -20,51 +50,63 @@ if option == "Upload & Match":
 
     uploaded_file = st.file_uploader("Upload your policy controls (JSON)", type=["json"])
     if uploaded_file:
-        policy_data = pd.read_json(uploaded_file)
-        st.json(policy_data.to_dict())
-
-        st.info("Matching with regulations...")
+        upload_key = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        match = st.session_state.match
+        if match is None or match['upload_key'] != upload_key:
+            policy_data = pd.read_json(uploaded_file)
+            texts = engine.control_texts(policy_data.to_dict(orient="records"))
 
-        # Load regulations from a local JSON
-        reg_data = match_engine.load_regulations("data/regulations.json")
-        matches = match_engine.get_matches(policy_data.to_dict(orient="records"), reg_data)
+            with st.spinner(f"Matching {len(texts)} controls with regulations..."):
+                run_match(upload_key, texts, sentence_encoder.encode_texts(texts))
 
-        st.session_state.match_results = matches
-        st.success("✅ Matching complete. Now check the next tabs!")
+        aggregates = st.session_state.match['aggregates']
+        st.dataframe(pd.DataFrame({"Control Text": st.session_state.match['texts']}).head(1000))
+        st.success(f"✅ Matching complete: {aggregates['n_controls']} controls, "
+                   f"{aggregates['n_matches']} matches. Now check the next tabs!")
 
 # --- 2. Compliance Score ---
 elif option == "Compliance Score":
     st.subheader("📊 Compliance Score & Gap Analysis")
 
-    if not st.session_state.match_results:
+    if st.session_state.match is None:
         st.warning("Please run matching first.")
     else:
-        regulations = match_engine.load_regulations("data/regulations.json")
-        total_regs = len(regulations)
-        scores, coverage = match_engine.compute_compliance_score(st.session_state.match_results, total_regs)
+        aggregates = st.session_state.match['aggregates']
+        st.dataframe(aggregates['scores'], hide_index=True)
+        st.download_button("⬇️ Download CSV", aggregates['scores_csv'], file_name="compliance_score.csv")
 
-        df = pd.DataFrame({
-            "Control": [f"Control {i+1}" for i in range(len(scores))],
-            "Compliance Score (%)": [round(s * 100, 2) for s in scores],
-        })
-        st.dataframe(df)
-        st.download_button("⬇️ Download CSV", df.to_csv(index=False), file_name="compliance_score.csv")
+        st.markdown("**Coverage per regulator** (controls matching at least one requirement)")
+        st.dataframe(aggregates['regulations'].rename("Controls Covering"))
+        st.markdown("**Category gaps**")
+        st.dataframe(aggregates['categories'])
 
 # --- 3. Visualizations ---
 elif option == "Visualizations":
     st.subheader("📈 Visualizations")
 
-    if not st.session_state.match_results:
+    if st.session_state.match is None:
         st.warning("Please run matching first.")
     else:
-        # Pass compliance score to plotting functions
-        regulations = match_engine.load_regulations("data/regulations.json")
-        total_regs = len(regulations)
-        scores, _ = match_engine.compute_compliance_score(st.session_state.match_results, total_regs)
-
-        st.pyplot(plot_utils.plot_bar_chart(scores))
-        st.pyplot(plot_utils.plot_pie_chart(st.session_state.match_results))
-        st.pyplot(plot_utils.plot_heatmap(st.session_state.match_results))
+        # Charts are drawn from the precomputed aggregates, not from per-match data
+        aggregates = st.session_state.match['aggregates']
+        left, right = st.columns(2)
+        left.markdown("**Controls per compliance score range**")
+        left.bar_chart(aggregates['score_histogram'])
+        right.markdown("**Matches per match level**")
+        right.bar_chart(aggregates['match_levels'])
+        left.markdown("**Controls covering each regulator**")
+        left.bar_chart(aggregates['regulations'])
+        right.markdown("**Controls covering each region**")
+        right.bar_chart(aggregates['regions'])
+
+        # Heatmap rows are score ranges, so its size does not grow with the controls
+        groups, group_names = plot_utils.score_bins(aggregates['compliance_scores'])
+        st.plotly_chart(plot_utils.plot_coverage_heatmap(
+            aggregates['regulation_coverage'], aggregates['regulation_names'],
+            groups=groups, group_names=group_names, backend="plotly"), width="stretch")
+        st.plotly_chart(plot_utils.plot_control_scores(
+            aggregates['compliance_scores'], aggregates['matched_count'], backend="plotly"),
+            width="stretch")
 
 # --- 4. Chatbot ---
 elif option == "Chatbot":
@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from models import match_engine, partitions
+from models.match_result import LEVEL_NAMES
+from utils import scorer, storage
+from app import config
+
+# Data behind the dashboard, kept free of Streamlit so it can be reused and timed.
+# The dashboard caches one engine per process (st.cache_resource) keyed by
+# store_fingerprint, so the regulation matrix is only rebuilt when the
+# embedding store changes. Matching an upload produces a MatchResult once;
+# aggregates() turns it into everything the tabs render, so switching tabs
+# never reloads or rescores anything.
+
+# Column names accepted for the control text in uploaded JSON
+CONTROL_TEXT_FIELDS = ("control_statement", "control_text", "statement", "text", "control")
+
+def store_fingerprint(embeddings_dir=config.EMBEDDINGS_DIR):
+    """
+    Cheap identity of the embedding store: the manifest's bytes, the size and
+    modification time of every file it lists (incremental re-embeds rewrite
+    vectors and metadata without changing the manifest), and the name, size
+    and modification time of every legacy .pkl file.
+    """
+    digest = hashlib.sha256()
+    manifest_path = os.path.join(embeddings_dir, storage.MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            digest.update(f.read())
+    manifest = storage.load_manifest(embeddings_dir) if os.path.isdir(embeddings_dir) else None
+    for reg_name, entry in sorted((manifest or {}).get("regulations", {}).items()):
+        for file in (entry["vectors"], entry["metadata"]):
+            path = os.path.join(embeddings_dir, file)
+            stat = os.stat(path) if os.path.exists(path) else None
+            digest.update(f"{reg_name}:{file}:{stat.st_size if stat else -1}:"
+                          f"{stat.st_mtime_ns if stat else -1}".encode())
+    if os.path.isdir(embeddings_dir):
+        for file in sorted(os.listdir(embeddings_dir)):
+            if file.endswith(".pkl"):
+                stat = os.stat(os.path.join(embeddings_dir, file))
+                digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def load_engine(embeddings_dir=config.EMBEDDINGS_DIR, fingerprint=None):
+    """Load the regulations and build the stacked regulation matrix once."""
+    start = time.perf_counter()
+    regulations = match_engine.load_all_regulation_embeddings(embeddings_dir)
+    regulation_matrix = match_engine.build_regulation_matrix(regulations)
+    return {
+        'fingerprint': fingerprint or store_fingerprint(embeddings_dir),
+        'regulations': regulations,
+        'regulation_matrix': regulation_matrix,
+        'load_seconds': time.perf_counter() - start,
+    }
+
+def control_texts(records):
+    """Control statements from uploaded JSON records (or plain strings)."""
+    texts = []
+    for record in records:
+        if isinstance(record, str):
+            texts.append(record)
+            continue
+        field = next((f for f in CONTROL_TEXT_FIELDS if f in record), None)
+        texts.append(str(record[field]) if field is not None else "")
+    return texts
+
+def match(engine, control_embeddings, top_n=config.TOP_N, min_threshold=config.MIN_THRESHOLD):
+    """Match control embeddings against the cached regulation matrix; returns a MatchResult."""
+    return match_engine.match_controls_compact(control_embeddings, None, top_n=top_n, min_threshold=min_threshold,
+                                               regulation_matrix=engine['regulation_matrix'])
+
+def region_coverage(regulation_coverage, regulation_names, regions=None):
+    """
+    Controls × regions boolean matrix (a control covers a region if it matches any
+    of its regulations) and the region names (see models.partitions.region_of).
+    """
+    labels = [partitions.region_of(name, regions) for name in regulation_names]
+    region_names = sorted(set(labels))
+    membership = np.zeros((len(regulation_names), len(region_names)), dtype=np.int32)
+    membership[np.arange(len(labels)), scorer.encode(labels, scorer.index_of(region_names))] = 1
+    return (regulation_coverage.astype(np.int32) @ membership) > 0, region_names
+
+def aggregates(result, control_texts=None, regions=None):
+    """
+    Everything the dashboard tabs show, computed once per match:
+      scores          per-control table (score, matched count, missing categories)
+      scores_csv      the same table as CSV, for the download button
+      score_histogram controls per 10%-wide compliance score bucket
+      match_levels    matches per match level
+      regulations     controls covering each regulation
+      categories      controls covering / missing each category
+      regions         controls covering each region
+    plus the per-control arrays the charts aggregate (compliance_scores,
+    matched_count, regulation_coverage).
+    """
+    report = scorer.gap_analysis(result)
+    regulation_names = result.regulation_names
+    categories = result.regulation_matrix['categories']
+    n_controls = len(result)
+
+    texts = control_texts if control_texts is not None else [""] * n_controls
+    scores = pd.DataFrame({
+        "Control": [f"Control {int(i) + 1}" for i in report['controls']],
+        "Control Text": [texts[int(i)] if int(i) < len(texts) else "" for i in report['controls']],
+        "Compliance Score (%)": np.round(report['compliance_scores'] * 100, 2),
+        "Matched Regulations": report['matched_count'],
+        "Missing Categories": report['missing_categories'].sum(axis=1),
+    })
+
+    counts, edges = np.histogram(report['compliance_scores'] * 100, bins=10, range=(0, 100))
+    score_histogram = pd.Series(counts, index=[f"{int(lo)}-{int(hi)}%" for lo, hi in zip(edges[:-1], edges[1:])])
+
+    level_counts = np.bincount(result.level, minlength=len(LEVEL_NAMES))
+    region_matrix, region_names = region_coverage(report['regulation_coverage'], regulation_names, regions)
+
+    return {
+        'n_controls': n_controls,
+        'n_matches': result.n_matches,
+        'scores': scores,
+        'scores_csv': scores.to_csv(index=False),
+        'score_histogram': score_histogram,
+        'match_levels': pd.Series(level_counts, index=LEVEL_NAMES),
+        'regulations': pd.Series(report['controls_per_regulation'], dtype=np.int64).sort_index(),
+        'categories': pd.DataFrame({
+            "Controls Covering": report['category_coverage'].sum(axis=0),
+            "Controls Missing": report['missing_categories'].sum(axis=0),
+        }, index=categories),
+        'regions': pd.Series(region_matrix.sum(axis=0), index=region_names, dtype=np.int64),
+        'compliance_scores': report['compliance_scores'],
+        'matched_count': report['matched_count'],
+        'regulation_coverage': report['regulation_coverage'],
+        'regulation_names': list(regulation_names),
+    }
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from models import match_engine, registry
+from utils import scorer
+from utils.sinks import JsonLinesSink, write_records
+from benchmarks.synthetic import SHAPES, generate_controls, generate_regulation_store
+
+# Times and memory-profiles each pipeline stage on a synthetic corpus:
+#   load → (encode) → match → score/gaps → report
+# and saves the numbers as a JSON baseline that later runs can be compared to.
+#
+#   python -m benchmarks.run_benchmarks --profile small --save-baseline
+#   python -m benchmarks.run_benchmarks --profile small --compare benchmarks/baselines/small.json
+
+BASELINE_DIR = "benchmarks/baselines"
+BASELINE_VERSION = 1
+
+PROFILES = {
+    "tiny":   {"requirements": 1_000,     "controls": 100},
+    "small":  {"requirements": 10_000,    "controls": 1_000},
+    "medium": {"requirements": 100_000,   "controls": 10_000},
+    "large":  {"requirements": 1_000_000, "controls": 100_000},
+    "xlarge": {"requirements": 1_000_000, "controls": 1_000_000},
+}
+
+def measure(stages, name, fn, items, trace_memory=True):
+    """
+    Run fn() as one stage and append its wall time, CPU time, throughput and
+    memory (tracemalloc peak and RSS change) to stages. Returns fn's result.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    rss_before = registry.current_rss_bytes()
+    wall, cpu = time.perf_counter(), time.process_time()
+
+    result = fn()
+
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    rss_after = registry.current_rss_bytes()
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    stages[name] = {
+        "seconds": wall,
+        "cpu_seconds": cpu,
+        "items": items,
+        "items_per_second": items / wall if wall > 0 else None,
+        "peak_alloc_bytes": peak,
+        "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+    print(f"⏱️ {name:<14} {wall:8.3f}s  {items:>9} items"
+          + (f"  peak {peak / 2**20:8.1f} MB" if peak is not None else ""))
+    return result
+
+def run(requirements, controls, shape="clustered", dim=384, n_regulations=10, top_n=5, min_threshold=0.65,
+        batch_size=1024, encode=0, dicts=True, trace_memory=True, seed=0, work_dir=None, precision="float32",
+        workers=0, parallel_mode="shards"):
+    """Generate a corpus, run every stage once and return the benchmark record."""
+    if workers and precision != "float32":
+        # Checked up front so a bad combination fails before the earlier stages run
+        raise ValueError("Parallel matching (workers) needs a float32 regulation matrix")
+    stages = {}
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="ocie_bench_")
+    store_dir = os.path.join(work_dir, "embeddings")
+
+    try:
+        print(f"🧪 Generating {requirements} requirements / {controls} controls ({shape}, dim {dim})...")
+        start = time.perf_counter()
+        generate_regulation_store(store_dir, requirements, n_regulations, dim, shape, seed=seed)
+        control_embeddings, control_texts = generate_controls(controls, dim, shape, seed=seed)
+        print(f"   done in {time.perf_counter() - start:.2f}s")
+
+        regs = measure(stages, "load", lambda: match_engine.load_all_regulation_embeddings(store_dir),
+                       requirements, trace_memory)
+        regulation_matrix = measure(stages, "build_matrix", lambda: match_engine.build_regulation_matrix(regs, precision),
+                                    requirements, trace_memory)
+
+        if encode:
+            # The only stage that needs the sentence-transformer model
+            from models.sentence_encoder import encode_texts
+            texts = control_texts[:encode]
+            registry.get_model()
+            measure(stages, "encode", lambda: encode_texts(texts), len(texts), trace_memory)
+
+        compact = measure(stages, "match_compact", lambda: match_engine.match_controls_compact(
+            control_embeddings, regs, top_n, min_threshold, batch_size, regulation_matrix), controls, trace_memory)
+        measure(stages, "gap_analysis", lambda: scorer.gap_analysis(compact), controls, trace_memory)
+
+        if dicts:
+            matches = measure(stages, "match", lambda: match_engine.match_controls_to_regulations(
+                control_embeddings, regs, top_n, min_threshold, batch_size, regulation_matrix), controls, trace_memory)
+            categories = set(regulation_matrix['categories'])
+            measure(stages, "score_gaps", lambda: (
+                match_engine.compute_compliance_score(matches, len(regs)),
+                match_engine.detect_gaps(matches, categories, set())), controls, trace_memory)
+
+            def write_report():
+                with JsonLinesSink(os.path.join(work_dir, "compliance_report.jsonl")) as sink:
+                    return write_records(match_engine.iter_compliance_report(
+                        enumerate(matches), control_texts, len(regs), categories), sink)
+
+            measure(stages, "report", write_report, controls, trace_memory)
+
+            if workers:
+                from models.parallel_match import match_controls_parallel
+                parallel = measure(stages, "match_parallel", lambda: match_controls_parallel(
+                    control_embeddings, regs, top_n, min_threshold, workers, parallel_mode,
+                    regulation_matrix=regulation_matrix), controls, trace_memory)
+                if parallel != matches:
+                    print("❗ Parallel matching returned different results")
+                del parallel
+            del matches
+
+        measure(stages, "report_npz", lambda: compact.save(os.path.join(work_dir, "matches.npz")),
+                compact.n_matches, trace_memory)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "format_version": BASELINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "requirements": requirements, "controls": controls, "shape": shape, "dim": dim,
+            "regulations": n_regulations, "top_n": top_n, "min_threshold": min_threshold,
+            "batch_size": batch_size, "encode": encode, "dicts": dicts,
+            "trace_memory": trace_memory, "seed": seed, "precision": precision,
+            "workers": workers, "parallel_mode": parallel_mode,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "stages": stages,
+    }
+
+def compare(current, baseline, time_tolerance=0.25, memory_tolerance=0.25, min_seconds=0.01):
+    """
+    Stages whose time or peak memory grew by more than the tolerance over the
+    baseline. Time differences under min_seconds are treated as noise.
+    Returns a list of human-readable regression messages.
+    """
+    regressions = []
+    if current["config"] != baseline["config"]:
+        print("⚠️ Baseline was recorded with a different config; comparison may not be meaningful")
+
+    for name, stage in current["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        if stage["seconds"] - base["seconds"] > min_seconds \
+                and stage["seconds"] > base["seconds"] * (1 + time_tolerance):
+            regressions.append(f"{name}: {stage['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if base.get("peak_alloc_bytes") and stage.get("peak_alloc_bytes") \
+                and stage["peak_alloc_bytes"] > base["peak_alloc_bytes"] * (1 + memory_tolerance):
+            regressions.append(f"{name}: peak {stage['peak_alloc_bytes'] / 2**20:.1f} MB "
+                               f"vs baseline {base['peak_alloc_bytes'] / 2**20:.1f} MB")
+    return regressions
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the matching pipeline on synthetic data.")
+    arg_parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    arg_parser.add_argument("--requirements", type=int, help="override the profile's requirement count")
+    arg_parser.add_argument("--controls", type=int, help="override the profile's control count")
+    arg_parser.add_argument("--shape", choices=SHAPES, default="clustered")
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--top-n", type=int, default=5)
+    arg_parser.add_argument("--min-threshold", type=float, default=0.65)
+    arg_parser.add_argument("--batch-size", type=int, default=1024)
+    arg_parser.add_argument("--precision", choices=["float32", "float16", "int8"], default="float32",
+                            help="regulation matrix precision (quantized modes re-rank at full precision)")
+    arg_parser.add_argument("--workers", type=int, default=0, help="also time multi-process matching with this many workers")
+    arg_parser.add_argument("--parallel-mode", choices=["shards", "controls"], default="shards")
+    arg_parser.add_argument("--encode", type=int, default=0, help="also encode this many control texts (needs the model)")
+    arg_parser.add_argument("--no-dicts", action="store_true", help="skip the dict-based match/score/report stages")
+    arg_parser.add_argument("--no-tracemalloc", action="store_true", help="skip allocation tracing (faster, no peak memory)")
+    arg_parser.add_argument("--output", help="write the run's JSON here")
+    arg_parser.add_argument("--save-baseline", action="store_true", help=f"write the run to {BASELINE_DIR}/<profile>.json")
+    arg_parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on regression")
+    arg_parser.add_argument("--time-tolerance", type=float, default=0.25)
+    arg_parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    args = arg_parser.parse_args(argv)
+    if args.workers and args.precision != "float32":
+        arg_parser.error("--workers needs --precision float32 (parallel matching does not support quantized matrices)")
+
+    sizes = PROFILES[args.profile]
+    record = run(args.requirements or sizes["requirements"], args.controls or sizes["controls"],
+                 shape=args.shape, dim=args.dim, top_n=args.top_n, min_threshold=args.min_threshold,
+                 batch_size=args.batch_size, encode=args.encode, dicts=not args.no_dicts,
+                 trace_memory=not args.no_tracemalloc, precision=args.precision,
+                 workers=args.workers, parallel_mode=args.parallel_mode)
+    record["profile"] = args.profile
+
+    outputs = [args.output] if args.output else []
+    if args.save_baseline:
+        outputs.append(os.path.join(BASELINE_DIR, f"{args.profile}.json"))
+    for path in outputs:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"📁 Saved benchmark results to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(record, baseline, args.time_tolerance, args.memory_tolerance)
+        if regressions:
+            print("❗ Regressions against baseline:")
+            for message in regressions:
+                print(f"   - {message}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
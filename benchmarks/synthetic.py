@@ -0,0 +1,126 @@
+import os
+import numpy as np
+from utils import storage
+
+# Synthetic regulation and control corpora for benchmarks, at any size, with
+# no model needed. Embedding shapes:
+#   random    - independent unit vectors (worst case for ANN, few matches)
+#   clustered - requirements and controls scattered around shared topic centres,
+#               so similarities land in the 0.6-0.9 range real data produces
+#   real      - like clustered, but the centres, texts, tags and categories are
+#               rows of an existing embedding store (data/embeddings by default)
+
+SHAPES = ("random", "clustered", "real")
+SYNTHETIC_MODEL = "synthetic"
+
+_WORDS = ("data", "customer", "access", "record", "report", "risk", "encrypt", "retain", "audit",
+          "consent", "transfer", "breach", "notify", "board", "policy", "review", "monitor",
+          "identity", "payment", "vendor", "incident", "backup", "privacy", "control", "log")
+_CATEGORIES = ("Data Protection Principles", "Security > Encryption", "Governance & Transparency",
+               "Data Retention & Minimization", "Individual Rights & Redress", "Cybersecurity",
+               "Transaction Monitoring & Reporting", "Business Continuity Management",
+               "Third-Party Risk", "Incident Response", "Access Control", "Compliance Monitoring")
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+def _sentences(rng, topics, n_words=12):
+    """Pseudo requirement text; each topic draws from its own slice of the vocabulary."""
+    words = np.array(_WORDS)
+    offsets = rng.integers(0, len(words), size=(len(topics), n_words))
+    picks = (offsets + topics[:, None] * 3) % len(words)
+    return [" ".join(row) + "." for row in words[picks]]
+
+def _real_centres(source_dir):
+    """Stacked embeddings and metadata of an existing store, used as topic centres."""
+    from models.match_engine import load_all_regulation_embeddings
+
+    regs = load_all_regulation_embeddings(source_dir)
+    embeddings, texts, tags, categories = [], [], [], []
+    for data in regs.values():
+        emb = np.asarray(data['embeddings'], dtype=np.float32)
+        n = len(emb)
+        embeddings.append(emb)
+        texts.extend((list(data['texts']) + ["N/A"] * n)[:n])
+        tags.extend((list(data['tags']) + ["N/A"] * n)[:n])
+        categories.extend((list(data['categories']) + ["N/A"] * n)[:n])
+    if not embeddings:
+        raise ValueError(f"No embeddings found in {source_dir} for shape='real'")
+    return _unit_rows(np.concatenate(embeddings)), texts, tags, categories
+
+class _Topics:
+    """Topic centres plus the metadata attached to each centre."""
+
+    def __init__(self, shape, dim, n_topics, rng, source_dir):
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape {shape!r}, expected one of {SHAPES}")
+        self.shape = shape
+        if shape == "real":
+            self.centres, self.texts, self.tags, self.categories = _real_centres(source_dir)
+        else:
+            self.centres = _unit_rows(rng.standard_normal((n_topics, dim)))
+            self.texts = self.tags = None
+            self.categories = [_CATEGORIES[i % len(_CATEGORIES)] for i in range(n_topics)]
+        self.dim = self.centres.shape[1]
+
+    def sample(self, rng, n, noise):
+        """n unit vectors and the topic each was drawn from, generated in chunks to bound memory."""
+        topics = rng.integers(0, len(self.centres), size=n)
+        vectors = np.empty((n, self.dim), dtype=np.float32)
+        for start in range(0, n, 65536):
+            chunk = topics[start:start + 65536]
+            noise_rows = rng.standard_normal((len(chunk), self.dim), dtype=np.float32)
+            if self.shape == "random":
+                vectors[start:start + len(chunk)] = _unit_rows(noise_rows)
+            else:
+                vectors[start:start + len(chunk)] = _unit_rows(
+                    self.centres[chunk] + noise_rows * np.float32(noise / np.sqrt(self.dim)))
+        return vectors, topics
+
+def generate_regulation_store(store_dir, n_requirements, n_regulations=10, dim=384, shape="clustered",
+                              n_topics=200, noise=0.6, seed=0, source_dir="data/embeddings"):
+    """
+    Write a synthetic embedding store of n_requirements rows split across
+    n_regulations regulations. Returns the regulation names.
+    """
+    topics = _Topics(shape, dim, n_topics, np.random.default_rng(seed), source_dir)
+    rng = np.random.default_rng([seed, 1])
+    sizes = np.full(n_regulations, n_requirements // n_regulations)
+    sizes[:n_requirements % n_regulations] += 1
+
+    os.makedirs(store_dir, exist_ok=True)
+    entries = {}
+    for r, size in enumerate(sizes):
+        reg_name = f"synthetic_{r:03d}"
+        embeddings, topic_ids = topics.sample(rng, int(size), noise)
+        if topics.texts is not None:
+            texts = [topics.texts[t] for t in topic_ids]
+            tags = [topics.tags[t] for t in topic_ids]
+        else:
+            texts = _sentences(rng, topic_ids)
+            tags = [", ".join(text.split()[:3]) for text in texts]
+        categories = [topics.categories[t] for t in topic_ids]
+        ids = [f"{reg_name}-{i:07d}" for i in range(int(size))]
+        entries[reg_name] = storage.write_regulation_files(store_dir, reg_name, embeddings, texts, tags,
+                                                           categories, ids=ids)
+
+    storage.register_regulations(store_dir, SYNTHETIC_MODEL, entries)
+    return list(entries)
+
+def generate_controls(n_controls, dim=384, shape="clustered", n_topics=200, noise=0.6, seed=0,
+                      source_dir="data/embeddings"):
+    """
+    Synthetic control embeddings (float32, n_controls × dim) and control texts.
+    With the same shape, dim, n_topics, seed and source_dir as the regulation
+    store, controls share its topic centres.
+    """
+    topics = _Topics(shape, dim, n_topics, np.random.default_rng(seed), source_dir)
+    rng = np.random.default_rng([seed, 2])
+    embeddings, topic_ids = topics.sample(rng, n_controls, noise)
+    if topics.texts is not None:
+        texts = [topics.texts[t] for t in topic_ids]
+    else:
+        texts = _sentences(rng, topic_ids)
+    return embeddings, texts
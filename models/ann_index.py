@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+
+# Approximate nearest-neighbour indexes over the stacked regulation matrix
+# built by match_engine.build_regulation_matrix. Both backends return
+# (rows, scores) arrays in the same layout as match_engine.top_k_rows so the
+# matcher can swap them in for the exact search:
+#   IVFIndex     built-in inverted-file index (numpy only), recall knob: nprobe
+#   ChromaIndex  persistent local chromadb HNSW collection, recall knob: ef
+# Rows an index could not fill are padded with -1 and a score of -inf.
+
+INDEX_META_NAME = "index.json"
+
+def _matrix_digest(matrix, chunk_rows=65536):
+    """sha256 of the matrix values, hashed in row chunks so a memory-mapped matrix is never copied whole."""
+    digest = hashlib.sha256()
+    for start in range(0, len(matrix), chunk_rows):
+        digest.update(np.ascontiguousarray(matrix[start:start + chunk_rows], dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def _matrix_fingerprint(regulation_matrix):
+    """
+    Identify the regulation matrix an index was built from, to detect stale
+    indexes. Includes a digest of the vectors, so a re-embed that keeps every
+    regulation's row count still invalidates the index.
+    """
+    return {
+        'regulations': list(regulation_matrix['regulations']),
+        'offsets': [int(o) for o in regulation_matrix['offsets']],
+        'dim': int(regulation_matrix['matrix'].shape[1]),
+        'content': _matrix_digest(regulation_matrix['matrix']),
+    }
+
+def _pad_top_k(rows, scores, k):
+    """Pad per-query candidate lists to a (n, k) array pair."""
+    out_rows = np.full((len(rows), k), -1, dtype=np.int64)
+    out_scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    for i, (r, s) in enumerate(zip(rows, scores)):
+        out_rows[i, :len(r)] = r
+        out_scores[i, :len(s)] = s
+    return out_rows, out_scores
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are clustered with spherical k-means and a query
+    is only scored against the rows of its nprobe closest clusters.
+    Higher nprobe means better recall and slower search.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, matrix, fingerprint, nprobe=8):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.matrix = matrix
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, regulation_matrix, n_lists=None, n_iter=20, nprobe=8, seed=0):
+        """Cluster the regulation matrix into n_lists lists (default ~sqrt(rows))."""
+        matrix = regulation_matrix['matrix']
+        n_rows = len(matrix)
+        if n_rows == 0:
+            raise ValueError("Cannot build an index over an empty regulation matrix")
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n_rows, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = matrix[assign == c]
+                if len(members) == 0:
+                    # Re-seed empty lists so every list stays useful
+                    centroids[c] = matrix[rng.integers(n_rows)]
+                    continue
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[c] = centroid / norm if norm > 0 else centroid
+
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        list_rows = np.argsort(assign, kind='stable').astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+
+        return cls(centroids.astype(np.float32), list_offsets, list_rows, matrix,
+                   _matrix_fingerprint(regulation_matrix), nprobe=nprobe)
+
+    def search(self, queries, k, nprobe=None):
+        """
+        Return the approximate top-k (rows, scores) for L2-normalized query vectors.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        all_rows = []
+        all_scores = []
+        for query, lists in zip(queries, probe):
+            candidates = np.concatenate([
+                self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists
+            ])
+            scores = self.matrix[candidates] @ query
+            top = min(k, len(candidates))
+            if top < len(candidates):
+                keep = np.argpartition(-scores, top - 1)[:top]
+                candidates, scores = candidates[keep], scores[keep]
+            order = np.lexsort((candidates, -scores))
+            all_rows.append(candidates[order])
+            all_scores.append(scores[order])
+
+        return _pad_top_k(all_rows, all_scores, k)
+
+    def save(self, index_dir):
+        """Persist the index to index_dir (the regulation matrix itself is not stored)."""
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "list_offsets.npy"), self.list_offsets)
+        np.save(os.path.join(index_dir, "list_rows.npy"), self.list_rows)
+        with open(os.path.join(index_dir, INDEX_META_NAME), "w") as f:
+            json.dump({'backend': 'ivf', 'nprobe': self.nprobe, 'fingerprint': self.fingerprint}, f)
+
+    @classmethod
+    def load(cls, index_dir, regulation_matrix, nprobe=None):
+        """Load a saved index. Raises ValueError if it was built from a different matrix (rebuild it)."""
+        with open(os.path.join(index_dir, INDEX_META_NAME)) as f:
+            meta = json.load(f)
+        if meta['fingerprint'] != _matrix_fingerprint(regulation_matrix):
+            raise ValueError(f"Index in {index_dir} is stale: regulation embeddings have changed")
+        return cls(
+            np.load(os.path.join(index_dir, "centroids.npy")),
+            np.load(os.path.join(index_dir, "list_offsets.npy")),
+            np.load(os.path.join(index_dir, "list_rows.npy"), mmap_mode="r"),
+            regulation_matrix['matrix'],
+            meta['fingerprint'],
+            nprobe=nprobe or meta['nprobe'],
+        )
+
+class ChromaIndex:
+    """
+    HNSW index in a persistent local chromadb collection (cosine space).
+    Higher ef means better recall and slower search.
+    """
+
+    COLLECTION_NAME = "regulation_requirements"
+
+    def __init__(self, collection, fingerprint, ef=64):
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.ef = ef
+
+    @staticmethod
+    def _client(index_dir):
+        try:
+            import chromadb
+        except ImportError as e:
+            raise ImportError("chromadb is required for the Chroma index backend (pip install chromadb)") from e
+        return chromadb.PersistentClient(path=index_dir)
+
+    @classmethod
+    def build(cls, regulation_matrix, index_dir, ef=64, construction_ef=128, batch_size=5000):
+        """(Re)create the collection in index_dir from the regulation matrix."""
+        client = cls._client(index_dir)
+        try:
+            client.delete_collection(cls.COLLECTION_NAME)
+        except Exception:
+            pass
+
+        fingerprint = _matrix_fingerprint(regulation_matrix)
+        collection = client.create_collection(cls.COLLECTION_NAME, metadata={
+            'hnsw:space': 'cosine',
+            'hnsw:construction_ef': construction_ef,
+            'hnsw:search_ef': ef,
+            'fingerprint': json.dumps(fingerprint),
+        })
+        matrix = regulation_matrix['matrix']
+        for start in range(0, len(matrix), batch_size):
+            block = matrix[start:start + batch_size]
+            collection.add(
+                ids=[str(row) for row in range(start, start + len(block))],
+                embeddings=block.tolist(),
+            )
+        return cls(collection, fingerprint, ef=ef)
+
+    @classmethod
+    def load(cls, index_dir, regulation_matrix, ef=None):
+        """Open an existing collection. Raises ValueError if it was built from a different matrix (rebuild it)."""
+        collection = cls._client(index_dir).get_collection(cls.COLLECTION_NAME)
+        fingerprint = json.loads(collection.metadata['fingerprint'])
+        if fingerprint != _matrix_fingerprint(regulation_matrix):
+            raise ValueError(f"Index in {index_dir} is stale: regulation embeddings have changed")
+        return cls(collection, fingerprint, ef=ef or collection.metadata.get('hnsw:search_ef', 64))
+
+    def search(self, queries, k, ef=None):
+        """Return the approximate top-k (rows, scores) for L2-normalized query vectors."""
+        ef = ef or self.ef
+        if ef != self.collection.metadata.get('hnsw:search_ef'):
+            metadata = {key: value for key, value in self.collection.metadata.items() if key != 'hnsw:space'}
+            metadata['hnsw:search_ef'] = ef
+            self.collection.modify(metadata=metadata)
+
+        result = self.collection.query(query_embeddings=np.asarray(queries).tolist(), n_results=k,
+                                       include=['distances'])
+        rows = [np.array([int(i) for i in ids], dtype=np.int64) for ids in result['ids']]
+        # Chroma's cosine distance is 1 - cosine similarity
+        scores = [1.0 - np.array(d, dtype=np.float32) for d in result['distances']]
+        return _pad_top_k(rows, scores, k)
+
+def build_ann_index(regulation_matrix, index_dir=None, backend="ivf", **kwargs):
+    """
+    Build an ANN index over a regulation matrix and persist it if index_dir is given.
+    backend: "ivf" (built-in) or "chroma" (requires chromadb and index_dir)
+    """
+    if regulation_matrix.get('precision', "float32") != "float32":
+        raise ValueError("ANN indexes need a float32 regulation matrix, not a quantized one")
+    if backend == "ivf":
+        index = IVFIndex.build(regulation_matrix, **kwargs)
+        if index_dir:
+            index.save(index_dir)
+        return index
+    if backend == "chroma":
+        if not index_dir:
+            raise ValueError("The chroma backend needs an index_dir to persist to")
+        return ChromaIndex.build(regulation_matrix, index_dir, **kwargs)
+    raise ValueError(f"Unknown ANN backend: {backend}")
+
+def load_ann_index(index_dir, regulation_matrix, **kwargs):
+    """Load a persisted index of either backend from index_dir."""
+    meta_path = os.path.join(index_dir, INDEX_META_NAME)
+    if os.path.exists(meta_path):
+        return IVFIndex.load(index_dir, regulation_matrix, **kwargs)
+    return ChromaIndex.load(index_dir, regulation_matrix, **kwargs)
+
+def recall_report(control_embeddings, regulation_matrix, index, top_n=5, settings=(1, 2, 4, 8, 16, 32)):
+    """
+    Compare ANN search against exact search for each recall knob setting
+    (nprobe for IVFIndex, ef for ChromaIndex).
+    Returns a list of dicts with recall@top_n and the speed-up over exact search.
+    """
+    from models.match_engine import normalize_rows, top_k_rows
+
+    queries = normalize_rows(control_embeddings)
+    start = time.perf_counter()
+    exact_rows, _ = top_k_rows(queries @ regulation_matrix['matrix'].T, top_n)
+    exact_seconds = time.perf_counter() - start
+    knob = 'nprobe' if isinstance(index, IVFIndex) else 'ef'
+
+    report = []
+    for setting in settings:
+        start = time.perf_counter()
+        ann_rows, _ = index.search(queries, top_n, **{knob: setting})
+        seconds = time.perf_counter() - start
+
+        hits = sum(len(set(a) & set(e)) for a, e in zip(ann_rows.tolist(), exact_rows.tolist()))
+        report.append({
+            knob: setting,
+            'recall': hits / exact_rows.size if exact_rows.size else 1.0,
+            'seconds': seconds,
+            'exact_seconds': exact_seconds,
+            'speedup': exact_seconds / seconds if seconds > 0 else float('inf'),
+        })
+    return report
@@ -0,0 +1,158 @@
+import os
+import time
+import numpy as np
+
+# Encoding engine for bulk sentence embedding. Texts are sorted by token
+# length and cut into batches whose padded size (batch size × longest text)
+# stays under a token budget, so short control statements go in large batches
+# and long ones in small batches, instead of every batch having batch_size
+# rows padded to its longest text. Results come back in input order.
+# Backends for SentenceTransformer models (see models.registry.get_model):
+#   torch      the reference model
+#   quantized  torch dynamic int8 quantization of every Linear layer (CPU)
+#   onnx       ONNX Runtime through sentence-transformers' onnx backend (needs optimum)
+# Non-reference backends produce slightly different vectors, so they are cached
+# under their own model id and should be checked with drift_check first.
+
+BACKENDS = ("torch", "quantized", "onnx")
+# Padded tokens per batch: 16 texts of 128 tokens, 128 of 16 tokens. Larger
+# budgets fall out of CPU cache and get slower; measure with scripts.encoding_report
+DEFAULT_MAX_TOKENS = int(os.environ.get("OCIE_ENCODE_MAX_TOKENS", 2048))
+DEFAULT_MAX_BATCH_SIZE = 256
+
+def load_model(name, backend="torch", threads=None):
+    """Load a SentenceTransformer with the given backend, optionally capping torch threads."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {BACKENDS}")
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    if backend == "onnx":
+        # sentence-transformers raises with install instructions if optimum is missing
+        return SentenceTransformer(name, backend="onnx", device="cpu")
+
+    model = SentenceTransformer(name)
+    if backend == "quantized":
+        import torch
+        model = torch.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def model_id(name, backend="torch"):
+    """Embedding cache id: the model name, plus the backend when it is not the reference one."""
+    return name if backend in (None, "torch") else f"{name}:{backend}"
+
+def token_lengths(model, texts):
+    """
+    Token count of each text as the model will see it (capped at its max_seq_length).
+    Models without a tokenizer fall back to a word count estimate.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = getattr(model, "max_seq_length", None) or 512
+    if tokenizer is None:
+        return np.array([min(len(str(t).split()) * 4 // 3 + 2, max_length) for t in texts], dtype=np.int64)
+    encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)
+    return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+def plan_batches(lengths, max_tokens=DEFAULT_MAX_TOKENS, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """
+    Group text positions into batches, longest texts first. Each batch grows
+    while batch size × its longest text stays within max_tokens, so batch size
+    adapts to text length. Returns a list of position arrays.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    # Stable sort keeps equal-length texts in input order
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(1, int(lengths[order[start]]))
+        size = int(min(max_batch_size, max(1, max_tokens // longest), len(order) - start))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def encode_sorted(model, texts, max_tokens=DEFAULT_MAX_TOKENS, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                  **encode_kwargs):
+    """
+    Encode texts in length-sorted, token-budgeted batches and return a float32
+    array with one row per text, in input order. show_progress_bar shows one
+    bar over all batches.
+    """
+    from tqdm import tqdm
+
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    show_progress_bar = encode_kwargs.pop("show_progress_bar", False)
+    batches = plan_batches(token_lengths(model, texts), max_tokens, max_batch_size)
+    out = None
+    for positions in tqdm(batches, desc="Batches", disable=not show_progress_bar):
+        vectors = model.encode([texts[p] for p in positions], batch_size=len(positions), convert_to_numpy=True,
+                               show_progress_bar=False, **encode_kwargs)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[positions] = vectors
+    return out
+
+def drift_check(reference_model, model, texts, min_cosine=0.99):
+    """
+    Compare a backend's embeddings against the reference model's on the same texts.
+    Returns the mean and minimum cosine similarity between paired vectors, the
+    largest absolute difference, and ok (minimum cosine >= min_cosine).
+    """
+    from models.match_engine import normalize_rows
+
+    reference = normalize_rows(encode_sorted(reference_model, texts))
+    candidate = normalize_rows(encode_sorted(model, texts))
+    cosines = np.einsum("nd,nd->n", reference, candidate)
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()) if len(cosines) else 1.0,
+        "min_cosine": float(cosines.min()) if len(cosines) else 1.0,
+        "max_abs_diff": float(np.abs(reference - candidate).max()) if len(cosines) else 0.0,
+        "ok": bool(len(cosines) == 0 or cosines.min() >= min_cosine),
+    }
+
+def throughput(model, texts, sort_by_length=True, batch_size=64, **kwargs):
+    """Sentences per second encoding texts, in file order (batch_size) or length-sorted."""
+    start = time.perf_counter()
+    if sort_by_length:
+        encode_sorted(model, texts, **kwargs)
+    else:
+        model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    seconds = time.perf_counter() - start
+    return {"texts": len(texts), "seconds": seconds, "sentences_per_second": len(texts) / seconds if seconds > 0 else None}
+
+def throughput_report(name, texts, backends=BACKENDS, threads=None, min_cosine=0.99, batch_size=64,
+                      max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Throughput of each backend in sentences per second, in file order and
+    length-sorted, with its drift against the torch reference model.
+    Backends that cannot be loaded are reported with their error.
+    """
+    reference = load_model(name, "torch", threads=threads)
+    report = []
+    for backend in backends:
+        try:
+            model = reference if backend == "torch" else load_model(name, backend, threads=threads)
+        except Exception as e:
+            report.append({'backend': backend, 'error': str(e)})
+            continue
+        lengths = token_lengths(model, texts)
+        file_order = throughput(model, texts, sort_by_length=False, batch_size=batch_size)
+        sorted_order = throughput(model, texts, sort_by_length=True, max_tokens=max_tokens)
+        report.append({
+            'backend': backend,
+            'texts': len(texts),
+            'mean_tokens': float(lengths.mean()) if len(lengths) else 0.0,
+            'batches': len(plan_batches(lengths, max_tokens)),
+            'file_order_sentences_per_second': file_order['sentences_per_second'],
+            'sorted_sentences_per_second': sorted_order['sentences_per_second'],
+            'drift': drift_check(reference, model, texts, min_cosine) if backend != "torch" else None,
+        })
+    return report
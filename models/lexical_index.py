@@ -0,0 +1,208 @@
+import re
+import time
+from collections import Counter
+import numpy as np
+
+# Lexical candidate prefilter for hybrid matching. A BM25 inverted index over
+# each requirement's tags, category_refined and text picks a candidate set of
+# rows per control from the control's text; only those rows are scored with
+# dense cosine similarity. Controls whose text hits fewer than min_candidates
+# rows fall back to exhaustive search, so a control is never left unmatched
+# because of vocabulary mismatch.
+# LexicalPrefilter plugs into match_engine's ann_index argument. It needs
+# the control texts as well as the embeddings, so it implements
+# search_controls(control_indices, queries, k) and looks texts up by input index.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in into is it its must not of on or shall should "
+    "such that the their them there these this those to under use used where which who will with".split()
+)
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens of a text, without stopwords and single characters."""
+    if not isinstance(text, str):
+        return []
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the rows of a regulation matrix.
+    Postings are stored CSR-style: the rows and BM25 weights of term t are
+    rows[term_offsets[t]:term_offsets[t + 1]], sorted by row.
+    """
+
+    def __init__(self, vocabulary, term_offsets, rows, weights, n_rows, max_df=0.5):
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.rows = rows
+        self.weights = weights
+        self.n_rows = n_rows
+        self.max_df = max_df
+
+    @classmethod
+    def build(cls, regulation_matrix, k1=1.5, b=0.75, tag_weight=2, max_df=0.5):
+        """
+        Index every requirement row. Tag and category tokens count tag_weight
+        times, since they are the curated part of each requirement.
+        Terms found in more than max_df of all rows are skipped at query time.
+        """
+        documents = []
+        for (texts, tags, categories), start, end in zip(
+                regulation_matrix['metadata'], regulation_matrix['offsets'][:-1], regulation_matrix['offsets'][1:]):
+            for idx in range(int(end - start)):
+                tokens = tokenize(texts[idx] if idx < len(texts) else "")
+                curated = (tokenize(tags[idx] if idx < len(tags) else "")
+                           + tokenize(categories[idx] if idx < len(categories) else ""))
+                documents.append(Counter(tokens + curated * tag_weight))
+
+        n_rows = len(documents)
+        lengths = np.array([sum(doc.values()) for doc in documents], dtype=np.float64)
+        avg_length = lengths.mean() if n_rows and lengths.sum() > 0 else 1.0
+
+        vocabulary = {}
+        term_ids, row_ids, freqs = [], [], []
+        for row, doc in enumerate(documents):
+            for term, tf in doc.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                row_ids.append(row)
+                freqs.append(tf)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        row_ids = np.array(row_ids, dtype=np.int64)
+        freqs = np.array(freqs, dtype=np.float64)
+
+        df = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float64)
+        idf = np.log1p((n_rows - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[row_ids] / avg_length)
+        weights = idf[term_ids] * freqs * (k1 + 1) / (freqs + norm)
+
+        # Rows were appended in order, so a stable sort by term keeps each posting list sorted by row
+        order = np.argsort(term_ids, kind="stable")
+        term_offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        return cls(vocabulary, term_offsets, row_ids[order], weights[order].astype(np.float32), n_rows, max_df)
+
+    def scores(self, text):
+        """(rows, bm25 scores) of every row sharing a term with text, rows ascending."""
+        max_postings = max(1, int(self.max_df * self.n_rows))
+        slices = []
+        for term in set(tokenize(text)):
+            t = self.vocabulary.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            if end - start <= max_postings:
+                slices.append((start, end))
+        if not slices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows = np.concatenate([self.rows[start:end] for start, end in slices])
+        weights = np.concatenate([self.weights[start:end] for start, end in slices])
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        return unique_rows, np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def candidates(self, text, n_candidates):
+        """Up to n_candidates best BM25 rows for text (ties go to the lower row), rows ascending."""
+        from models.match_engine import top_k_rows
+
+        rows, scores = self.scores(text)
+        if len(rows) > n_candidates:
+            positions, _ = top_k_rows(scores[None, :], n_candidates)
+            rows = np.sort(rows[positions[0]])
+        return rows
+
+class LexicalPrefilter:
+    """
+    Hybrid search: dense scoring restricted to each control's BM25 candidates,
+    exhaustive for controls with fewer than min_candidates of them.
+    Pass as ann_index to the match_engine functions together with the same
+    control embeddings whose texts are given here. Counts of dense
+    comparisons and fallbacks accumulate in stats.
+    """
+
+    def __init__(self, index, regulation_matrix, control_texts, n_candidates=500, min_candidates=50):
+        if regulation_matrix.get('precision', "float32") != "float32":
+            raise ValueError("The lexical prefilter needs a float32 regulation matrix, not a quantized one")
+        self.index = index
+        self.matrix = regulation_matrix['matrix']
+        self.control_texts = control_texts
+        self.n_candidates = n_candidates
+        self.min_candidates = min_candidates
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'controls': 0, 'fallbacks': 0, 'dense_comparisons': 0, 'exhaustive_comparisons': 0}
+
+    def search(self, queries, k):
+        raise TypeError("LexicalPrefilter needs control texts; call search_controls(control_indices, queries, k)")
+
+    def search_controls(self, control_indices, queries, k):
+        """Top-k (rows, scores) for normalized queries whose texts are control_texts[control_indices]."""
+        from models.ann_index import _pad_top_k
+        from models.match_engine import top_k_rows
+
+        n_rows = len(self.matrix)
+        all_rows, all_scores, fallback = [], [], []
+        for pos, (i, query) in enumerate(zip(control_indices, queries)):
+            text = self.control_texts[i] if i < len(self.control_texts) else ""
+            candidates = self.index.candidates(text, self.n_candidates)
+            if len(candidates) < max(self.min_candidates, k):
+                fallback.append(pos)
+                all_rows.append(None)
+                all_scores.append(None)
+                continue
+            scores = self.matrix[candidates] @ query
+            self.stats['dense_comparisons'] += len(candidates)
+            top = min(k, len(candidates))
+            if top < len(candidates):
+                keep = np.argpartition(-scores, top - 1)[:top]
+                candidates, scores = candidates[keep], scores[keep]
+            order = np.lexsort((candidates, -scores))
+            all_rows.append(candidates[order])
+            all_scores.append(scores[order])
+
+        if fallback:
+            rows, scores = top_k_rows(queries[fallback] @ self.matrix.T, k)
+            for pos, r, s in zip(fallback, rows, scores):
+                all_rows[pos], all_scores[pos] = r, s
+            self.stats['dense_comparisons'] += len(fallback) * n_rows
+
+        self.stats['controls'] += len(queries)
+        self.stats['fallbacks'] += len(fallback)
+        self.stats['exhaustive_comparisons'] += len(queries) * n_rows
+        return _pad_top_k(all_rows, all_scores, k)
+
+def recall_report(control_embeddings, control_texts, regulation_matrix, index=None, top_n=5,
+                  settings=(50, 100, 200, 500, 1000), min_candidates=50):
+    """
+    Compare hybrid search against exact search for each candidate set size.
+    Returns a list of dicts with recall@top_n, the share of dense comparisons
+    left over exhaustive search, the fallback rate and timings.
+    """
+    from models.match_engine import normalize_rows, top_k_rows
+
+    index = index or LexicalIndex.build(regulation_matrix)
+    queries = normalize_rows(control_embeddings)
+    control_indices = np.arange(len(queries))
+    start = time.perf_counter()
+    exact_rows, _ = top_k_rows(queries @ regulation_matrix['matrix'].T, top_n)
+    exact_seconds = time.perf_counter() - start
+
+    report = []
+    for n_candidates in settings:
+        prefilter = LexicalPrefilter(index, regulation_matrix, control_texts, n_candidates, min_candidates)
+        start = time.perf_counter()
+        rows, _ = prefilter.search_controls(control_indices, queries, top_n)
+        seconds = time.perf_counter() - start
+
+        hits = sum(len(set(a) & set(e)) for a, e in zip(rows.tolist(), exact_rows.tolist()))
+        stats = prefilter.stats
+        report.append({
+            'candidates': n_candidates,
+            'recall': hits / exact_rows.size if exact_rows.size else 1.0,
+            'dense_fraction': (stats['dense_comparisons'] / stats['exhaustive_comparisons']
+                               if stats['exhaustive_comparisons'] else 0.0),
+            'fallback_rate': stats['fallbacks'] / stats['controls'] if stats['controls'] else 0.0,
+            'seconds': seconds,
+            'exact_seconds': exact_seconds,
+        })
+    return report
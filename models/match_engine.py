@@ -1,10 +1,7 @@
 import os
 import pickle
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import json
-import csv
-import pandas as pd  # Added missing import
+from utils import scorer, storage, tracing
 
 # --- Load embeddings functions ---
 
@@ -24,15 +21,37 @@ def load_embeddings(path):
         return None
 
 def load_all_regulation_embeddings(embeddings_dir):
-    """Load all regulation embeddings from a directory."""
+    """
+    Load all regulation embeddings from a directory.
+    Regulations listed in the embedding store manifest are memory-mapped from
+    their .npy files; any other .pkl files are unpickled as a fallback.
+    """
     embeddings_dict = {}
     if not os.path.exists(embeddings_dir):
         print(f"Directory not found: {embeddings_dir}")
         return embeddings_dict
 
-    for file in os.listdir(embeddings_dir):
+    with tracing.stage("embedding_load") as span:
+        _load_regulation_embeddings(embeddings_dir, embeddings_dict)
+        span.add_items(sum(len(data['embeddings']) for data in embeddings_dict.values()))
+    return embeddings_dict
+
+def _load_regulation_embeddings(embeddings_dir, embeddings_dict):
+    """Fill embeddings_dict from the store manifest, then from leftover .pkl files."""
+    manifest = storage.load_manifest(embeddings_dir)
+    if manifest is not None:
+        for reg_name in manifest['regulations']:
+            try:
+                embeddings_dict[reg_name] = storage.load_regulation_store(embeddings_dir, reg_name, manifest)
+                print(f"Loading {reg_name}: memory-mapped store")
+            except Exception as e:
+                print(f"Error loading {reg_name} from store: {str(e)}")
+
+    for file in sorted(os.listdir(embeddings_dir)):
         if file.endswith('.pkl'):
             reg_name = file.replace('.pkl', '')
+            if reg_name in embeddings_dict:
+                continue
             path = os.path.join(embeddings_dir, file)
             try:
                 with open(path, 'rb') as f:
@@ -41,14 +60,14 @@ def load_all_regulation_embeddings(embeddings_dir):
 
                     if isinstance(data, dict):
                         embeddings_dict[reg_name] = {
-                            'embeddings': np.array(data.get('embeddings', [])),
+                            'embeddings': np.asarray(data.get('embeddings', []), dtype=np.float32),
                             'texts': data.get('expanded_text', data.get('text', [])),
                             'tags': data.get('tags', []),
                             'categories': data.get('category_refined', []),
                         }
                     else:
                         embeddings_dict[reg_name] = {
-                            'embeddings': np.array(data),
+                            'embeddings': np.asarray(data, dtype=np.float32),
                             'texts': [],
                             'tags': [],
                             'categories': [],
@@ -57,76 +76,407 @@ def load_all_regulation_embeddings(embeddings_dir):
                 print(f"Error loading {file}: {str(e)}")
                 continue
 
-    return embeddings_dict
-
 # --- Matching function ---
 
-def match_controls_to_regulations(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65):
-    """Match controls to regulations based on cosine similarity."""
-    results = []
+# Similarity cut-offs for match levels, checked from strongest to weakest
+MATCH_LEVELS = [
+    (0.80, "Strong"),
+    (0.75, "Possible"),
+    (0.70, "Weak"),
+]
+
+def get_match_level(score):
+    """Map a cosine similarity score to its match level label."""
+    for cutoff, level in MATCH_LEVELS:
+        if score >= cutoff:
+            return level
+    return "No Match"
+
+def normalize_rows(matrix):
+    """L2-normalize each row of a 2D array as float32. All-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def build_regulation_matrix(regulations_embeddings_dict, precision="float32", rerank=4):
+    """
+    Stack every regulation's embeddings into one L2-normalized float32 matrix.
+    With precision="int8" or "float16" the matrix is kept quantized instead and
+    searches re-score a shortlist of top_n * rerank rows at full precision
+    (see models.quantization).
+    Returns a dict with:
+      matrix: (total_requirements, dim) normalized embeddings
+      regulations: regulation names, in the order they were stacked
+      offsets: row offset of each regulation in matrix (len(regulations) + 1 entries)
+      row_regulation: index into regulations for every row of matrix
+      metadata: list of (texts, tags, categories) per stacked regulation
+      categories: sorted distinct category_refined values ("N/A" where missing)
+      row_category: index into categories for every row of matrix
+      partitions: regulator, region and category partitions for filtered matching (see models.partitions)
+    and, for quantized matrices, precision, scales (per-row int8 scale), rerank and
+    sources (each regulation's original embeddings, for re-scoring).
+    Regulations without embeddings, or whose dimension differs from the first
+    one stacked, are skipped.
+    """
+    if precision != "float32":
+        from models import quantization
+        if precision not in quantization.PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {quantization.PRECISIONS}")
+
+    blocks = []
+    scales = []
+    sources = []
+    names = []
+    metadata = []
+    offsets = [0]
+    dim = None
+
+    for reg_name, reg_data in regulations_embeddings_dict.items():
+        reg_embs = reg_data['embeddings']
+        if len(reg_embs) == 0:
+            continue
 
-    if not isinstance(control_embeddings, (list, np.ndarray)):
-        print("Error: control_embeddings must be a list or numpy array")
-        return results
+        try:
+            reg_embs = np.asarray(reg_embs, dtype=np.float32).reshape(len(reg_embs), -1)
+        except Exception as e:
+            print(f"Skipping {reg_name}: could not read embeddings - {str(e)}")
+            continue
+
+        if dim is None:
+            dim = reg_embs.shape[1]
+        elif reg_embs.shape[1] != dim:
+            print(f"Skipping {reg_name}: embedding dimension {reg_embs.shape[1]} != {dim}")
+            continue
+
+        if precision == "float32":
+            blocks.append(normalize_rows(reg_embs))
+        else:
+            # Quantize one regulation at a time so the full float32 matrix never exists
+            values, reg_scales = quantization.quantize_rows(normalize_rows(reg_embs), precision)
+            blocks.append(values)
+            scales.append(reg_scales)
+            sources.append(reg_embs)
+        names.append(reg_name)
+        metadata.append((reg_data['texts'], reg_data['tags'], reg_data['categories']))
+        offsets.append(offsets[-1] + len(reg_embs))
+
+    matrix_dtype = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[precision]
+    matrix = np.vstack(blocks) if blocks else np.zeros((0, dim or 0), dtype=matrix_dtype)
+    offsets = np.array(offsets, dtype=np.int64)
+    row_regulation = np.repeat(np.arange(len(names), dtype=np.int32), np.diff(offsets))
+
+    # Intern category names so results and reports can refer to them by id
+    row_category_names = [
+        categories[idx] if idx < len(categories) else "N/A"
+        for (_, _, categories), start, end in zip(metadata, offsets[:-1], offsets[1:])
+        for idx in range(end - start)
+    ]
+    category_names, row_category = np.unique(np.array(row_category_names, dtype=object).astype(str),
+                                              return_inverse=True)
+
+    regulation_matrix = {
+        'matrix': matrix,
+        'regulations': names,
+        'offsets': offsets,
+        'row_regulation': row_regulation,
+        'metadata': metadata,
+        'categories': category_names.tolist(),
+        'row_category': row_category.astype(np.int32).reshape(-1),
+    }
+    if precision != "float32":
+        regulation_matrix.update({
+            'precision': precision,
+            'scales': np.concatenate(scales) if scales else np.zeros(0, dtype=np.float32),
+            'rerank': rerank,
+            'sources': sources,
+        })
+    from models import partitions
+    regulation_matrix['partitions'] = partitions.build_partitions(regulation_matrix)
+    return regulation_matrix
+
+def build_match(control_index, regulation_matrix, row, score):
+    """Build the match dict for one control and one row of the regulation matrix."""
+    reg_pos = int(regulation_matrix['row_regulation'][row])
+    idx = int(row - regulation_matrix['offsets'][reg_pos])
+    texts, tags, categories = regulation_matrix['metadata'][reg_pos]
+    score = float(score)
+
+    return {
+        'control_index': int(control_index),
+        'regulation': regulation_matrix['regulations'][reg_pos],
+        'requirement_index': idx,
+        'requirement_text': texts[idx] if idx < len(texts) else "N/A",
+        'similarity': score,
+        'match_level': get_match_level(score),
+        'tags': tags[idx] if idx < len(tags) else "N/A",
+        'category_refined': categories[idx] if idx < len(categories) else "N/A"
+    }
 
+def _iter_control_batches(control_embeddings, batch_size):
+    """
+    Flatten control embeddings to float32 vectors and yield them in batches of
+    (control_index, vector) pairs. Works on any iterable, so controls can be
+    streamed in. Controls that are not a list or array, or cannot be reshaped,
+    are dropped from the results altogether.
+    """
+    batch = []
     for i, ctrl_emb in enumerate(control_embeddings):
         if not isinstance(ctrl_emb, (list, np.ndarray)):
             print(f"Skipping control {i}: invalid embedding format")
             continue
-
         try:
-            ctrl_emb = np.array(ctrl_emb).reshape(1, -1)
+            batch.append((i, np.asarray(ctrl_emb, dtype=np.float32).reshape(-1)))
         except Exception as e:
             print(f"Skipping control {i}: could not reshape embedding - {str(e)}")
             continue
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-        control_results = []
-
-        for reg_name, reg_data in regulations_embeddings_dict.items():
-            reg_embs = reg_data['embeddings']
-            texts = reg_data['texts']
-            tags = reg_data['tags']
-            categories = reg_data['categories']
-
-            if len(reg_embs) == 0:
-                continue
-
-            try:
-                sims = cosine_similarity(ctrl_emb, reg_embs)[0]
-                top_indices = sims.argsort()[-top_n:][::-1]
-
-                for idx in top_indices:
-                    score = sims[idx]
-                    if score < min_threshold:
-                        continue
-
-                    if score >= 0.80:
-                        level = "Strong"
-                    elif score >= 0.75:
-                        level = "Possible"
-                    elif score >= 0.70:
-                        level = "Weak"
-                    else:
-                        level = "No Match"
-
-                    control_results.append({
-                        'control_index': int(i),
-                        'regulation': reg_name,
-                        'requirement_index': int(idx),
-                        'requirement_text': texts[idx] if idx < len(texts) else "N/A",
-                        'similarity': float(score),
-                        'match_level': level,
-                        'tags': tags[idx] if idx < len(tags) else "N/A",
-                        'category_refined': categories[idx] if idx < len(categories) else "N/A"
-                    })
-            except Exception as e:
-                print(f"Error processing {reg_name} for control {i}: {str(e)}")
-                continue
+def top_k_rows(scores, k):
+    """
+    Return (rows, scores) of the k best columns of each row of a 2D score block,
+    sorted best first. Ties keep the lower column first.
+    """
+    n_cols = scores.shape[1]
+    k = min(k, n_cols)
+    if k < n_cols:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_cols), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_scores))
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+def merge_top_k(rows, scores, k):
+    """
+    Merge candidate lists from several row ranges (concatenated along axis 1)
+    into the overall top-k, with the same lower-row tie-break as top_k_rows.
+    Padding entries (row -1, score -inf) sort last.
+    """
+    order = np.argsort(rows, axis=1, kind="stable")
+    rows = np.take_along_axis(rows, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    positions, scores = top_k_rows(scores, k)
+    return np.take_along_axis(rows, positions, axis=1), scores
+
+def _iter_scored_batches(control_embeddings, regulation_matrix, top_n, batch_size=1024, ann_index=None,
+                         on_scores=None, filters=None):
+    """
+    Score controls batch by batch and yield (control_indices, top_rows, top_scores).
+    top_rows/top_scores have one row per control, best first; controls with the
+    wrong dimension get rows of -1 with a score of -inf.
+    on_scores, if given, is called with (control_indices, scores) for every
+    batch's full controls × requirements score block before top-k selection
+    (exhaustive float32 search only).
+    filters, a filter expression (see models.partitions), restricts scoring to
+    the selected rows; top_rows are still rows of the full matrix.
+    """
+    matrix = regulation_matrix['matrix']
+    selected = None
+    if filters:
+        if ann_index is not None:
+            raise ValueError("Filtered matching scores the selected partitions exhaustively; don't pass ann_index")
+        from models import partitions
+        part = partitions.partition(regulation_matrix, filters)
+        matrix, selected = part['matrix'], part['rows']
+    dim = matrix.shape[1]
+    k = max(0, min(top_n, len(matrix)))
+
+    for batch in _iter_control_batches(control_embeddings, batch_size):
+        indices = np.array([i for i, _ in batch], dtype=np.int64)
+        top_rows = np.full((len(batch), k), -1, dtype=np.int64)
+        top_scores = np.full((len(batch), k), -np.inf, dtype=np.float32)
+
+        if k > 0:
+            # Controls with the wrong dimension get no matches, as before
+            valid = []
+            for pos, (i, row) in enumerate(batch):
+                if row.shape[0] == dim:
+                    valid.append(pos)
+                else:
+                    print(f"Error processing control {i}: embedding dimension {row.shape[0]} != {dim}")
+
+            if valid:
+                queries = normalize_rows(np.vstack([batch[pos][1] for pos in valid]))
+                if ann_index is not None:
+                    with tracing.stage("ann_search", items=len(valid)):
+                        if hasattr(ann_index, "search_controls"):
+                            rows, scores = ann_index.search_controls(indices[valid], queries, k)
+                        else:
+                            rows, scores = ann_index.search(queries, k)
+                elif regulation_matrix.get('precision', "float32") != "float32":
+                    from models import quantization
+                    with tracing.stage("quantized_search", items=len(valid)):
+                        rows, scores = quantization.search(queries, regulation_matrix, k)
+                else:
+                    with tracing.stage("similarity", items=len(valid)):
+                        scores = queries @ matrix.T
+                    if on_scores is not None:
+                        on_scores(indices[valid], scores)
+                    with tracing.stage("top_k", items=len(valid)):
+                        rows, scores = top_k_rows(scores, k)
+                    if selected is not None:
+                        rows = selected[rows]
+                top_rows[valid] = rows
+                top_scores[valid] = scores
+
+        yield indices, top_rows, top_scores
+
+def iter_match_controls(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                        batch_size=1024, regulation_matrix=None, ann_index=None, filters=None):
+    """
+    Streaming version of match_controls_to_regulations.
+    Yields (control_index, matches) one control at a time, in input order, while
+    only holding batch_size controls in memory. control_embeddings can be any
+    iterable of vectors, e.g. a generator reading them from disk.
+    """
+    if regulation_matrix is None:
+        regulation_matrix = build_regulation_matrix(regulations_embeddings_dict)
+
+    for indices, top_rows, top_scores in _iter_scored_batches(
+            control_embeddings, regulation_matrix, top_n, batch_size, ann_index, filters=filters):
+        keep = (top_scores >= min_threshold) & (top_rows >= 0)
+        for i, ctrl_rows, ctrl_scores, ctrl_keep in zip(indices, top_rows, top_scores, keep):
+            yield int(i), [
+                build_match(i, regulation_matrix, row, score)
+                for row, score in zip(ctrl_rows[ctrl_keep], ctrl_scores[ctrl_keep])
+            ]
+
+def match_controls_compact(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                           batch_size=1024, regulation_matrix=None, ann_index=None, filters=None):
+    """
+    Same matching as match_controls_to_regulations, returned as a compact
+    array-backed MatchResult (see models.match_result) instead of dicts.
+    """
+    if regulation_matrix is None:
+        regulation_matrix = build_regulation_matrix(regulations_embeddings_dict)
+
+    return _collect_compact(_iter_scored_batches(control_embeddings, regulation_matrix, top_n, batch_size, ann_index,
+                                                 filters=filters),
+                            regulation_matrix, min_threshold)
+
+def _collect_compact(scored_batches, regulation_matrix, min_threshold):
+    """Gather _iter_scored_batches output into a MatchResult, keeping matches at or above min_threshold."""
+    from models.match_result import MatchResult
+
+    controls, counts, rows, scores = [], [], [], []
+    for indices, top_rows, top_scores in scored_batches:
+        keep = (top_scores >= min_threshold) & (top_rows >= 0)
+        controls.append(indices)
+        counts.append(keep.sum(axis=1))
+        # Boolean indexing is row-major, so each control's matches stay together, best first
+        rows.append(top_rows[keep])
+        scores.append(top_scores[keep])
+
+    return MatchResult.from_rows(
+        np.concatenate(controls) if controls else np.zeros(0, dtype=np.int64),
+        np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64),
+        np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64),
+        np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32),
+        regulation_matrix,
+    )
+
+def match_controls_bidirectional(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                                 requirement_top_k=3, coverage_threshold=None, batch_size=1024,
+                                 regulation_matrix=None):
+    """
+    Match in both directions from one pass over the similarity matrix.
+    Each batch's controls × requirements score block is computed once and
+    feeds both the per-control top_n (as in match_controls_compact) and a
+    running per-requirement top-k of controls, so the full matrix never
+    exists and no transposed second run is needed.
+    coverage_threshold (default min_threshold) decides which requirements count as covered.
+    Returns (result, requirement_coverage): result is the per-control
+    MatchResult, requirement_coverage a dict with:
+      controls: (requirements, requirement_top_k) best control indices per matrix row, -1 padded
+      scores: their similarities, best first, -inf padded
+      covering_count: controls scoring at or above coverage_threshold, per row
+      uncovered: matrix rows no control reaches coverage_threshold on
+      threshold: the coverage threshold used
+    Use iter_uncovered_requirements to turn uncovered rows into report records.
+    """
+    if regulation_matrix is None:
+        regulation_matrix = build_regulation_matrix(regulations_embeddings_dict)
+    if regulation_matrix.get('precision', "float32") != "float32":
+        raise ValueError("Bidirectional matching needs a float32 regulation matrix, not a quantized one")
+
+    threshold = min_threshold if coverage_threshold is None else coverage_threshold
+    n_rows = len(regulation_matrix['matrix'])
+    k = max(0, requirement_top_k)
+    coverage = {
+        'controls': np.full((n_rows, k), -1, dtype=np.int64),
+        'scores': np.full((n_rows, k), -np.inf, dtype=np.float32),
+        'covering_count': np.zeros(n_rows, dtype=np.int64),
+        'threshold': threshold,
+    }
 
-        control_results = sorted(control_results, key=lambda x: x['similarity'], reverse=True)[:top_n]
-        results.append(control_results)
+    def absorb(control_indices, scores):
+        with tracing.stage("requirement_top_k", items=len(control_indices)):
+            coverage['covering_count'] += np.count_nonzero(scores >= threshold, axis=0)
+            if k == 0:
+                return
+            positions, best = top_k_rows(scores.T, k)
+            # Earlier batches hold lower control indices, so ties still go to the lower control
+            rows = np.concatenate([coverage['controls'], control_indices[positions]], axis=1)
+            merged = np.concatenate([coverage['scores'], best], axis=1)
+            coverage['controls'], coverage['scores'] = merge_top_k(rows, merged, k)
+
+    result = _collect_compact(
+        _iter_scored_batches(control_embeddings, regulation_matrix, top_n, batch_size, on_scores=absorb),
+        regulation_matrix, min_threshold)
+    coverage['uncovered'] = np.flatnonzero(coverage['covering_count'] == 0)
+    return result, coverage
+
+def iter_uncovered_requirements(requirement_coverage, regulation_matrix):
+    """
+    Yield one record per uncovered requirement: its regulation, text, tags and
+    category, plus the closest control and its similarity (below the threshold).
+    """
+    has_controls = requirement_coverage['controls'].shape[1] > 0
+    for row in requirement_coverage['uncovered']:
+        control = requirement_coverage['controls'][row, 0] if has_controls else -1
+        score = requirement_coverage['scores'][row, 0] if has_controls else -np.inf
+        record = build_match(control, regulation_matrix, row, score)
+        del record['control_index'], record['similarity'], record['match_level']
+        record['row'] = int(row)
+        record['covering_controls'] = 0
+        record['closest_control_index'] = int(control) if control >= 0 else None
+        record['closest_similarity'] = float(score) if control >= 0 else None
+        yield record
+
+def match_controls_to_regulations(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                                  batch_size=1024, regulation_matrix=None, ann_index=None, filters=None):
+    """
+    Match controls to regulations based on cosine similarity.
+    All regulations are scored in one matrix multiply per batch of controls and
+    the top_n matches above min_threshold are kept per control.
+    Pass a prebuilt regulation_matrix (see build_regulation_matrix) to reuse it
+    across calls, and an ann_index built from that matrix (see models.ann_index)
+    to use approximate instead of exhaustive search. Any object with a
+    search(queries, k) method works as ann_index, e.g. the multi-process
+    models.parallel_match.ParallelMatcher. Objects that need to know which
+    controls they are searching for (models.lexical_index.LexicalPrefilter
+    looks up control texts) implement search_controls(control_indices, queries, k) instead.
+    filters scopes matching to part of the regulations with a filter
+    expression such as "region=India" or "category=Information Security"
+    (see models.partitions); only the selected rows are scored.
+    Use iter_match_controls to stream results instead of building the full list.
+    """
+    if not isinstance(control_embeddings, (list, np.ndarray)):
+        print("Error: control_embeddings must be a list or numpy array")
+        return []
 
-    return results
+    return [
+        matches for _, matches in iter_match_controls(
+            control_embeddings, regulations_embeddings_dict, top_n=top_n, min_threshold=min_threshold,
+            batch_size=batch_size, regulation_matrix=regulation_matrix, ann_index=ann_index, filters=filters,
+        )
+    ]
 
 # --- Compliance Analysis Functions ---
 
@@ -137,12 +487,9 @@ def compute_compliance_score(matches_per_control, total_regulations):
     total_regulations: int, total number of unique regulations
     Returns a list of compliance scores per control (float 0 to 1)
     """
-    scores = []
-    for matches in matches_per_control:
-        unique_regs = set(m['regulation'] for m in matches)
-        score = len(unique_regs) / total_regulations if total_regulations > 0 else 0
-        scores.append(score)
-    return scores
+    regulations = sorted({m['regulation'] for matches in matches_per_control for m in matches})
+    coverage = scorer.encode_matches(matches_per_control, regulations)
+    return scorer.compliance_scores(coverage['regulations'], total_regulations).tolist()
 
 def detect_gaps(matches_per_control, all_categories, all_regions):
     """
@@ -153,31 +500,61 @@ def detect_gaps(matches_per_control, all_categories, all_regions):
     Returns two lists:
       missing_categories_per_control: list of lists
       missing_regions_per_control: list of lists
+    Coverage is computed on controls × categories / regions matrices (see utils.scorer);
+    for a MatchResult use scorer.gap_analysis instead.
     """
-    missing_categories = []
-    missing_regions = []
-
-    for matches in matches_per_control:
-        matched_cats = set()
-        matched_regions = set()
+    categories = sorted(all_categories or (), key=str)
+    regions = sorted(all_regions or (), key=str)
+    coverage = scorer.encode_matches(matches_per_control, [], categories, regions)
 
-        for m in matches:
-            if 'category_refined' in m and m['category_refined']:
-                matched_cats.add(m['category_refined'])
-            if 'region' in m and m['region']:
-                matched_regions.add(m['region'])
+    return (scorer.expand_names(~coverage['categories'], categories),
+            scorer.expand_names(~coverage['regions'], regions))
 
-        missing_cat = list(all_categories - matched_cats) if all_categories else []
-        missing_reg = list(all_regions - matched_regions) if all_regions else []
-
-        missing_categories.append(missing_cat)
-        missing_regions.append(missing_reg)
-
-    return missing_categories, missing_regions
+def iter_compliance_report(control_matches, control_texts, total_regulations, all_categories, all_regions=frozenset()):
+    """
+    Build per-control compliance report records on the fly.
+    control_matches: iterable of (control_index, matches) pairs, e.g. from iter_match_controls
+    control_texts: control statement for each control index
+    Yields one record per control with its score, matched regulations and gaps.
+    """
+    categories = sorted(all_categories or (), key=str)
+    regions = sorted(all_regions or (), key=str)
+
+    for i, matches in control_matches:
+        with tracing.stage("gap_analysis", items=1):
+            matched_regs = list(dict.fromkeys(m['regulation'] for m in matches))
+            coverage = scorer.encode_matches([matches], matched_regs, categories, regions)
+            record = {
+                "control_id": i + 1,
+                "control_text": control_texts[i],
+                "compliance_score": float(scorer.compliance_scores(coverage['regulations'], total_regulations)[0]),
+                "matched_regulations": matched_regs,
+                "matched_count": len(matched_regs),
+                "missing_categories": scorer.expand_names(~coverage['categories'], categories)[0],
+                "missing_regions": scorer.expand_names(~coverage['regions'], regions)[0],
+                "matches": matches,
+            }
+        yield record
 
 # --- Main script logic ---
 
 if __name__ == "__main__":
+    import argparse
+    from utils.sinks import CsvSink, JsonLinesSink
+
+    arg_parser = argparse.ArgumentParser(description="Match control embeddings against the regulation embeddings.")
+    arg_parser.add_argument("--top-n", type=int, default=5)
+    arg_parser.add_argument("--min-threshold", type=float, default=0.65)
+    arg_parser.add_argument("--filter", default=None,
+                            help='scope matching, e.g. "region=India" or "regulator=GDPR;category=Information Security"')
+    args = arg_parser.parse_args()
+    if args.filter:
+        from models import partitions
+        try:
+            partitions.parse_filter(args.filter)
+        except ValueError as e:
+            arg_parser.error(str(e))
+
     print("Current working directory:", os.getcwd())
 
     # Paths
@@ -197,64 +574,15 @@ if __name__ == "__main__":
     if not regulations_embeddings_dict:
         raise SystemExit("No regulation embeddings loaded - exiting")
     print(f"Loaded embeddings for regulations: {list(regulations_embeddings_dict.keys())}")
+    regulation_matrix = build_regulation_matrix(regulations_embeddings_dict)
+    if args.filter:
+        # Values are only known once the regulations are loaded
+        try:
+            partitions.validate_filter(regulation_matrix, args.filter)
+        except ValueError as e:
+            arg_parser.error(str(e))
 
-    # Perform matching
-    print("Matching controls to regulations...")
-    matches = match_controls_to_regulations(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65)
-
-    # Print results
-    for i, control_matches in enumerate(matches):
-        print(f"\n🔐 Control {i}:")
-        print("-" * 40)
-        if len(control_matches) == 0:
-            print("No matches found above threshold.")
-        else:
-            for match in control_matches:
-                print(f"✅ Regulation: {match['regulation']}")
-                print(f"   - Similarity: {match['similarity']:.2f}")
-                print(f"   - Match Level: {match['match_level']}")
-                print(f"   - Requirement: {match['requirement_text']}")
-                print(f"   - Tags: {match['tags']}")
-                print(f"   - Category: {match['category_refined']}\n")
-
-    print("Preparing to save summary and results...")
-
-    try:
-        # Count total matched controls
-        total_matched_controls = sum(1 for m in matches if len(m) > 0)
-        print(f"\n✅ Total Controls Matched: {total_matched_controls} / {len(matches)}")
-
-        # Save to JSON
-        def convert(obj):
-            if isinstance(obj, (np.integer, np.int64)): return int(obj)
-            if isinstance(obj, (np.floating, np.float64)): return float(obj)
-            if isinstance(obj, (np.ndarray)): return obj.tolist()
-            return obj
-
-        os.makedirs("data", exist_ok=True)
-        with open("data/match_results.json", "w") as f:
-            json.dump(matches, f, indent=2, default=convert)
-        print("📁 Saved match results to data/match_results.json")
-
-        # Save to CSV
-        with open("data/match_results.csv", "w", newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                "control_index", "regulation", "requirement_index",
-                "requirement_text", "similarity", "match_level",
-                "tags", "category_refined"
-            ])
-            writer.writeheader()
-            for control_matches in matches:
-                for row in control_matches:
-                    writer.writerow(row)
-        print("📁 Saved match results to data/match_results.csv")
-
-    except Exception as e:
-        print(f"❌ Error saving results: {e}")
-
-    # Summary stats
-    print("\n📊 Overall Match Summary:")
-
+    # Summary stats, accumulated while results stream to disk
     summary_stats = {
         "Strong": 0,
         "Possible": 0,
@@ -262,17 +590,48 @@ if __name__ == "__main__":
         "No Match": 0
     }
     regulation_counts = {}
+    total_controls = 0
+    total_matched_controls = 0
 
-    for control_matches in matches:
-        if len(control_matches) == 0:
-            summary_stats["No Match"] += 1
-        else:
+    # Perform matching, printing and saving each control's matches as they arrive
+    print("Matching controls to regulations...")
+    os.makedirs("data", exist_ok=True)
+    with JsonLinesSink("data/match_results.jsonl") as json_sink, CsvSink("data/match_results.csv", fieldnames=[
+        "control_index", "regulation", "requirement_index",
+        "requirement_text", "similarity", "match_level",
+        "tags", "category_refined"
+    ]) as csv_sink:
+        for i, control_matches in iter_match_controls(control_embeddings, regulations_embeddings_dict,
+                                                      top_n=args.top_n, min_threshold=args.min_threshold,
+                                                      regulation_matrix=regulation_matrix, filters=args.filter):
+            total_controls += 1
+            print(f"\n🔐 Control {i}:")
+            print("-" * 40)
+            if len(control_matches) == 0:
+                print("No matches found above threshold.")
+                summary_stats["No Match"] += 1
+                continue
+
+            total_matched_controls += 1
             for match in control_matches:
+                print(f"✅ Regulation: {match['regulation']}")
+                print(f"   - Similarity: {match['similarity']:.2f}")
+                print(f"   - Match Level: {match['match_level']}")
+                print(f"   - Requirement: {match['requirement_text']}")
+                print(f"   - Tags: {match['tags']}")
+                print(f"   - Category: {match['category_refined']}\n")
+
+                json_sink.write(match)
+                csv_sink.write(match)
                 summary_stats[match["match_level"]] += 1
                 reg = match["regulation"]
                 regulation_counts[reg] = regulation_counts.get(reg, 0) + 1
 
-    total_controls = len(matches)
+    print(f"\n✅ Total Controls Matched: {total_matched_controls} / {total_controls}")
+    print("📁 Saved match results to data/match_results.jsonl")
+    print("📁 Saved match results to data/match_results.csv")
+
+    print("\n📊 Overall Match Summary:")
     print(f"Total Controls: {total_controls}")
     print(f"Matched Controls: {total_matched_controls}")
     print(f"Unmatched Controls: {summary_stats['No Match']}")
@@ -283,4 +642,4 @@ if __name__ == "__main__":
     print("\nTop Regulations by Match Count:")
     sorted_regs = sorted(regulation_counts.items(), key=lambda x: x[1], reverse=True)
     for reg, count in sorted_regs:
-        print(f"  {reg}: {count} matches")
\ No newline at end of file
+        print(f"  {reg}: {count} matches")
@@ -0,0 +1,178 @@
+import json
+import operator
+from collections.abc import Mapping
+import numpy as np
+from models.match_engine import MATCH_LEVELS
+from utils import scorer, tracing
+
+# Level codes, weakest first: code = number of MATCH_LEVELS cut-offs a score reaches
+LEVEL_NAMES = ["No Match"] + [level for _, level in reversed(MATCH_LEVELS)]
+_LEVEL_CUTOFFS = np.array([cutoff for cutoff, _ in reversed(MATCH_LEVELS)], dtype=np.float64)
+
+def level_codes(similarities):
+    """Vectorized get_match_level, returning int8 codes into LEVEL_NAMES."""
+    return np.searchsorted(_LEVEL_CUTOFFS, np.asarray(similarities, dtype=np.float64), side='right').astype(np.int8)
+
+class MatchView(Mapping):
+    """
+    Read-only dict-like view of one match. Fields are looked up on access, and
+    requirement text, tags and category come from the regulation matrix by reference.
+    """
+    __slots__ = ("_result", "_i")
+
+    KEYS = ('control_index', 'regulation', 'requirement_index', 'requirement_text',
+            'similarity', 'match_level', 'tags', 'category_refined')
+
+    def __init__(self, result, i):
+        self._result = result
+        self._i = i
+
+    def __getitem__(self, key):
+        result, i = self._result, self._i
+        if key == 'control_index':
+            return int(result.control_index[i])
+        if key == 'regulation':
+            return result.regulation_names[result.regulation_id[i]]
+        if key == 'requirement_index':
+            return int(result.requirement_index[i])
+        if key == 'similarity':
+            return float(result.similarity[i])
+        if key == 'match_level':
+            return LEVEL_NAMES[result.level[i]]
+        if key in ('requirement_text', 'tags', 'category_refined'):
+            return result.requirement_metadata(i)[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class MatchResult:
+    """
+    Match results as parallel arrays, one entry per match:
+      control_index, regulation_id, requirement_index, similarity, level
+    plus CSR-style control_offsets: the matches of the n-th control in the result
+    are entries control_offsets[n]:control_offsets[n + 1], best first.
+    controls holds the input index of each control in the result (controls with
+    unusable embeddings are left out, as in match_controls_to_regulations).
+    Requirement metadata stays in the regulation matrix and is only looked up on request.
+    """
+
+    def __init__(self, controls, control_offsets, control_index, regulation_id, requirement_index,
+                 similarity, level, regulation_matrix):
+        self.controls = controls
+        self.control_offsets = control_offsets
+        self.control_index = control_index
+        self.regulation_id = regulation_id
+        self.requirement_index = requirement_index
+        self.similarity = similarity
+        self.level = level
+        self.regulation_matrix = regulation_matrix
+        self.regulation_names = regulation_matrix['regulations']
+
+    @classmethod
+    def from_rows(cls, controls, counts, rows, similarity, regulation_matrix):
+        """Build from per-control match counts and global regulation matrix rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        regulation_id = regulation_matrix['row_regulation'][rows].astype(np.int16)
+        requirement_index = (rows - regulation_matrix['offsets'][regulation_id]).astype(np.int32)
+        control_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        similarity = np.asarray(similarity, dtype=np.float32)
+
+        return cls(
+            np.asarray(controls, dtype=np.int32),
+            control_offsets,
+            np.repeat(np.asarray(controls, dtype=np.int32), np.asarray(counts, dtype=np.int64)),
+            regulation_id,
+            requirement_index,
+            similarity,
+            level_codes(similarity),
+            regulation_matrix,
+        )
+
+    def __len__(self):
+        """Number of controls in the result."""
+        return len(self.controls)
+
+    @property
+    def n_matches(self):
+        return len(self.similarity)
+
+    @property
+    def nbytes(self):
+        """Memory held by the result arrays (the regulation matrix is shared, not counted)."""
+        return sum(a.nbytes for a in (self.controls, self.control_offsets, self.control_index,
+                                      self.regulation_id, self.requirement_index, self.similarity, self.level))
+
+    @property
+    def matrix_row(self):
+        """Global regulation matrix row of every match."""
+        return self.regulation_matrix['offsets'][self.regulation_id] + self.requirement_index
+
+    @property
+    def category_id(self):
+        """Interned category id of every match, indexing regulation_matrix['categories']."""
+        return self.regulation_matrix['row_category'][self.matrix_row]
+
+    def category_bitsets(self):
+        """
+        Categories matched by each control as packed bits (np.packbits, one row per
+        control); bit j is set when category j of regulation_matrix['categories'] is matched.
+        """
+        return scorer.pack(scorer.coverage_from_result(self)['categories'])
+
+    def requirement_metadata(self, i):
+        """requirement_text, tags and category_refined of match i, looked up by reference."""
+        texts, tags, categories = self.regulation_matrix['metadata'][self.regulation_id[i]]
+        idx = int(self.requirement_index[i])
+        return {
+            'requirement_text': texts[idx] if idx < len(texts) else "N/A",
+            'tags': tags[idx] if idx < len(tags) else "N/A",
+            'category_refined': categories[idx] if idx < len(categories) else "N/A",
+        }
+
+    def __getitem__(self, n):
+        """Lazy dict views of the n-th control's matches (negative n counts from the end, as for a list)."""
+        n = operator.index(n)
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError("MatchResult index out of range")
+        start, end = self.control_offsets[n], self.control_offsets[n + 1]
+        return [MatchView(self, i) for i in range(start, end)]
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def to_dicts(self):
+        """Materialize match_controls_to_regulations-style lists of dicts."""
+        return [[dict(view) for view in views] for views in self]
+
+    def save(self, path):
+        """Write the arrays and the regulation/category name tables to an .npz file."""
+        with tracing.stage("serialization", items=self.n_matches):
+            self._save(path)
+
+    def _save(self, path):
+        np.savez(
+            path,
+            controls=self.controls,
+            control_offsets=self.control_offsets,
+            regulation_id=self.regulation_id,
+            requirement_index=self.requirement_index,
+            similarity=self.similarity,
+            level=self.level,
+            category_id=self.category_id.astype(np.int32),
+            category_bitsets=self.category_bitsets(),
+            tables=np.array(json.dumps({
+                'regulations': self.regulation_names,
+                'categories': self.regulation_matrix['categories'],
+                'levels': LEVEL_NAMES,
+            })),
+        )
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from utils import tracing
+from utils.storage import _write_atomic, _write_json
+
+# Persistent per-regulation match state for incremental re-matching.
+# For every control the state keeps its top_k rows and scores within each
+# regulation separately. When one regulation changes only its block is
+# re-scored; every control's global top-n is then re-merged from the
+# per-regulation lists, which gives exactly what a full
+# match_controls_to_regulations run would return.
+#
+# On-disk layout of a state directory (e.g. data/match_state):
+#   state.json       top_k, control fingerprint and one fingerprint per regulation
+#   controls.npz     input indices, normalized embeddings and validity of the controls
+#   <reg>.<key>.npz  per-control top_k local rows and scores for one regulation,
+#                    keyed by the controls, top_k and regulation fingerprint
+
+STATE_NAME = "state.json"
+STATE_FORMAT_VERSION = 1
+
+def regulation_fingerprint(reg_data):
+    """
+    Identify a regulation's embeddings: the per-row content hashes from the
+    store when every row has one, else the vector bytes themselves. With
+    content hashes the first and last vectors are hashed too, so re-embedding
+    the same texts with another model still counts as a change.
+    """
+    embeddings = reg_data['embeddings']
+    digest = hashlib.sha256(str(np.shape(embeddings)).encode())
+    hashes = reg_data.get('content_hashes') or []
+    if len(hashes) == len(embeddings) and len(hashes) > 0:
+        digest.update("\n".join(hashes).encode())
+        digest.update(np.asarray([embeddings[0], embeddings[-1]], dtype=np.float32).tobytes())
+    else:
+        digest.update(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def regulations_dim(regulations_embeddings_dict):
+    """Embedding dimension of the regulations as build_regulation_matrix sees it (first non-empty one)."""
+    for reg_data in regulations_embeddings_dict.values():
+        if len(reg_data['embeddings']):
+            return int(np.prod(np.shape(reg_data['embeddings'])[1:]))
+    return None
+
+def _prepare_controls(control_embeddings, dim=None):
+    """
+    (indices, queries, valid) for the controls, as matching sees them: unusable
+    entries are dropped, and controls whose dimension differs from dim (the
+    regulation matrix's; the first control's if None) get an all-zero query
+    and valid=False so they never match.
+    """
+    from models.match_engine import _iter_control_batches, normalize_rows
+
+    indices, vectors = [], []
+    for batch in _iter_control_batches(control_embeddings, 4096):
+        for i, vec in batch:
+            indices.append(i)
+            vectors.append(vec)
+    if not vectors:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=bool)
+
+    dim = len(vectors[0]) if dim is None else dim
+    valid = np.array([len(v) == dim for v in vectors], dtype=bool)
+    queries = np.zeros((len(vectors), dim), dtype=np.float32)
+    if valid.any():
+        queries[valid] = normalize_rows(np.vstack([v for v, ok in zip(vectors, valid) if ok]))
+    return np.array(indices, dtype=np.int64), queries, valid
+
+def _save_npz(path, **arrays):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+    _write_atomic(path, write)
+
+class MatchState:
+    """Per-control, per-regulation top_k candidates plus what they were computed from."""
+
+    def __init__(self, controls, queries, valid, top_k, regulations=None):
+        self.controls = controls
+        self.queries = queries
+        self.valid = valid
+        self.top_k = top_k
+        # reg_name -> {'fingerprint', 'rows' (local, -1 padded), 'scores' (-inf padded)}
+        self.regulations = regulations or {}
+        self.controls_fingerprint = hashlib.sha256(queries.tobytes()).hexdigest()
+
+    @classmethod
+    def new(cls, control_embeddings, top_k=5, dim=None):
+        """Empty state for the controls, validated against the regulation dimension dim."""
+        return cls(*_prepare_controls(control_embeddings, dim), top_k)
+
+    def matches_controls(self, control_embeddings, dim=None):
+        """True if the state was built for these control embeddings (and regulation dimension)."""
+        controls, queries, _ = _prepare_controls(control_embeddings, dim)
+        return (np.array_equal(controls, self.controls)
+                and hashlib.sha256(queries.tobytes()).hexdigest() == self.controls_fingerprint)
+
+    def _score_regulation(self, reg_embs, batch_size=1024):
+        from models.match_engine import normalize_rows, top_k_rows
+
+        matrix = normalize_rows(np.asarray(reg_embs, dtype=np.float32).reshape(len(reg_embs), -1))
+        k = min(self.top_k, len(matrix))
+        rows = np.full((len(self.queries), k), -1, dtype=np.int32)
+        scores = np.full((len(self.queries), k), -np.inf, dtype=np.float32)
+        for start in range(0, len(self.queries), batch_size):
+            batch_rows, batch_scores = top_k_rows(self.queries[start:start + batch_size] @ matrix.T, k)
+            rows[start:start + batch_size] = batch_rows
+            scores[start:start + batch_size] = batch_scores
+        rows[~self.valid] = -1
+        scores[~self.valid] = -np.inf
+        return rows, scores
+
+    def update(self, regulations_embeddings_dict):
+        """
+        Bring the state in line with the given regulations: re-score only the
+        ones that are new or whose fingerprint changed, and drop removed ones.
+        Returns a summary of what was recomputed and how many rows were scored.
+        """
+        start = time.perf_counter()
+        summary = {"recomputed": [], "unchanged": [], "removed": [], "rows_scored": 0, "total_rows": 0}
+
+        for reg_name in [name for name in self.regulations if name not in regulations_embeddings_dict]:
+            del self.regulations[reg_name]
+            summary["removed"].append(reg_name)
+
+        for reg_name, reg_data in regulations_embeddings_dict.items():
+            n_rows = len(reg_data['embeddings'])
+            summary["total_rows"] += n_rows
+            fingerprint = regulation_fingerprint(reg_data)
+            current = self.regulations.get(reg_name)
+            if current is not None and current['fingerprint'] == fingerprint:
+                summary["unchanged"].append(reg_name)
+                continue
+            if n_rows == 0 or len(self.queries) == 0:
+                self.regulations.pop(reg_name, None)
+                continue
+            reg_dim = int(np.prod(np.shape(reg_data['embeddings'])[1:]))
+            if reg_dim != self.queries.shape[1]:
+                print(f"Skipping {reg_name}: embedding dimension {reg_dim} != {self.queries.shape[1]}")
+                self.regulations.pop(reg_name, None)
+                continue
+
+            with tracing.stage("rematch", items=n_rows):
+                rows, scores = self._score_regulation(reg_data['embeddings'])
+            self.regulations[reg_name] = {'fingerprint': fingerprint, 'rows': rows, 'scores': scores}
+            summary["recomputed"].append(reg_name)
+            summary["rows_scored"] += n_rows
+
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+
+    def merged(self, regulation_matrix, top_n=None):
+        """Global top_n (rows, scores) per control, with rows indexing regulation_matrix."""
+        from models.match_engine import merge_top_k
+
+        top_n = min(top_n or self.top_k, self.top_k)
+        blocks_rows, blocks_scores = [], []
+        for reg_pos, reg_name in enumerate(regulation_matrix['regulations']):
+            state = self.regulations.get(reg_name)
+            if state is None:
+                raise KeyError(f"{reg_name} is in the regulation matrix but not in the match state; call update() first")
+            rows = state['rows'].astype(np.int64)
+            blocks_rows.append(np.where(rows >= 0, rows + regulation_matrix['offsets'][reg_pos], -1))
+            blocks_scores.append(state['scores'])
+
+        if not blocks_rows:
+            empty = np.zeros((len(self.queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        rows = np.concatenate(blocks_rows, axis=1)
+        scores = np.concatenate(blocks_scores, axis=1)
+        return merge_top_k(rows, scores, min(top_n, rows.shape[1]))
+
+    def match_result(self, regulation_matrix, top_n=None, min_threshold=0.65):
+        """The merged matches as a MatchResult (see models.match_result)."""
+        from models.match_result import MatchResult
+
+        rows, scores = self.merged(regulation_matrix, top_n)
+        keep = (scores >= min_threshold) & (rows >= 0)
+        return MatchResult.from_rows(self.controls, keep.sum(axis=1), rows[keep], scores[keep], regulation_matrix)
+
+    def _file_key(self, fingerprint):
+        """Short key for what a regulation file was computed from: controls, top_k and regulation."""
+        key = f"{self.controls_fingerprint}:{self.top_k}:{fingerprint}"
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    def save(self, state_dir):
+        """
+        Write the state to state_dir. Regulation files are named after their
+        fingerprint and state.json is replaced last, so an interrupted save
+        leaves the previous state readable.
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        files = {name: f"{name}.{self._file_key(state['fingerprint'])}.npz" for name, state in self.regulations.items()}
+        for reg_name, state in self.regulations.items():
+            path = os.path.join(state_dir, files[reg_name])
+            if not os.path.exists(path):
+                _save_npz(path, rows=state['rows'], scores=state['scores'])
+        _save_npz(os.path.join(state_dir, "controls.npz"),
+                  controls=self.controls, queries=self.queries, valid=self.valid)
+        _write_json(os.path.join(state_dir, STATE_NAME), {
+            "format_version": STATE_FORMAT_VERSION,
+            "top_k": self.top_k,
+            "controls_fingerprint": self.controls_fingerprint,
+            "regulations": {name: {"fingerprint": state['fingerprint'], "file": files[name]}
+                            for name, state in self.regulations.items()},
+        })
+
+        # Regulation files no longer referenced (changed or removed regulations)
+        current = set(files.values())
+        for file_name in os.listdir(state_dir):
+            if file_name.endswith(".npz") and file_name != "controls.npz" and file_name not in current:
+                os.remove(os.path.join(state_dir, file_name))
+
+    @classmethod
+    def load(cls, state_dir):
+        """Load a saved state, or return None if state_dir holds none."""
+        path = os.path.join(state_dir, STATE_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        with np.load(os.path.join(state_dir, "controls.npz")) as data:
+            state = cls(data['controls'], data['queries'], data['valid'], meta['top_k'])
+        if state.controls_fingerprint != meta['controls_fingerprint']:
+            # controls.npz was replaced by a save that did not finish
+            return None
+        for reg_name, entry in meta['regulations'].items():
+            with np.load(os.path.join(state_dir, entry['file'])) as data:
+                state.regulations[reg_name] = {'fingerprint': entry['fingerprint'],
+                                               'rows': data['rows'], 'scores': data['scores']}
+        return state
+
+def rematch(control_embeddings, regulations_embeddings_dict, state_dir, top_n=5, dim=None):
+    """
+    Load (or start) the match state in state_dir, re-score only changed
+    regulations, save it, and return (state, summary). The state is rebuilt
+    from scratch if the controls or top_n changed. Controls are validated
+    against dim, the regulation matrix's dimension (derived from the
+    regulations if None).
+    """
+    dim = dim or regulations_dim(regulations_embeddings_dict)
+    state = MatchState.load(state_dir)
+    if state is None or state.top_k != top_n or not state.matches_controls(control_embeddings, dim):
+        state = MatchState.new(control_embeddings, top_n, dim)
+    summary = state.update(regulations_embeddings_dict)
+    state.save(state_dir)
+    return state, summary
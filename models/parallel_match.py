@@ -0,0 +1,133 @@
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+# Multi-process exact matching over one shared copy of the regulation matrix.
+# The normalized float32 matrix is copied into multiprocessing.shared_memory
+# once; every worker maps the same pages instead of holding its own copy.
+# ParallelMatcher has the same search(queries, k) interface as the ANN
+# indexes, so it plugs into match_engine's ann_index argument. Two modes:
+#   shards    every worker scores the whole control batch against its slice of
+#             the matrix; per-shard top-k lists are merged (best for large corpora)
+#   controls  every worker scores a slice of the control batch against the whole
+#             matrix (best for many controls against a small corpus)
+# Each worker runs single-threaded BLAS by default, so scaling comes from
+# processes rather than from BLAS threading.
+
+MODES = ("shards", "controls")
+
+# Per-worker state: the attached shared memory block and the matrix view over it
+_worker = {}
+
+def _limit_threads(threads):
+    """Cap BLAS threads in this process."""
+    try:
+        from threadpoolctl import threadpool_limits
+        _worker["threadpool_limits"] = threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+def _init_worker(shm_name, shape, threads):
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    _limit_threads(threads)
+
+    # Spawned workers share the parent's resource tracker, so attaching does not
+    # hand ownership over: the block is unlinked once, by the parent's close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["matrix"] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+
+def _search_shard(queries, k, start, end):
+    """Top-k of the queries against matrix rows start..end-1, as global rows."""
+    from models.match_engine import top_k_rows
+
+    rows, scores = top_k_rows(queries @ _worker["matrix"][start:end].T, k)
+    return rows + start, scores
+
+def _search_controls(queries, k):
+    """Top-k of a slice of the queries against the whole matrix."""
+    from models.match_engine import top_k_rows
+
+    return top_k_rows(queries @ _worker["matrix"].T, k)
+
+class ParallelMatcher:
+    """
+    Worker pool sharing one regulation matrix through shared memory.
+    Use as a context manager (or call close()) so the shared block is released.
+    """
+
+    def __init__(self, regulation_matrix, workers=None, mode="shards", threads_per_worker=1):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        if regulation_matrix.get('precision', "float32") != "float32":
+            raise ValueError("Parallel matching needs a float32 regulation matrix, not a quantized one")
+
+        matrix = np.ascontiguousarray(regulation_matrix['matrix'], dtype=np.float32)
+        self.mode = mode
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.shape = matrix.shape
+        self.shard_bounds = np.linspace(0, len(matrix), self.workers + 1).astype(np.int64)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+        np.ndarray(matrix.shape, dtype=np.float32, buffer=self._shm.buf)[:] = matrix
+
+        # spawn: workers start clean and only see the matrix through shared memory
+        start = time.perf_counter()
+        self._pool = multiprocessing.get_context("spawn").Pool(
+            self.workers, initializer=_init_worker, initargs=(self._shm.name, self.shape, threads_per_worker))
+        self.startup_seconds = time.perf_counter() - start
+
+    def search(self, queries, k):
+        """Exact top-k (rows, scores) for normalized float32 queries, best first."""
+        from models.match_engine import merge_top_k
+
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        k = min(k, self.shape[0])
+        if len(queries) == 0 or k == 0:
+            return np.zeros((len(queries), k), dtype=np.int64), np.zeros((len(queries), k), dtype=np.float32)
+
+        if self.mode == "shards":
+            tasks = [(queries, k, int(lo), int(hi))
+                     for lo, hi in zip(self.shard_bounds[:-1], self.shard_bounds[1:]) if hi > lo]
+            parts = self._pool.starmap(_search_shard, tasks)
+            rows = np.concatenate([r for r, _ in parts], axis=1)
+            scores = np.concatenate([s for _, s in parts], axis=1)
+            return merge_top_k(rows, scores, k)
+
+        chunks = [chunk for chunk in np.array_split(queries, min(self.workers, len(queries))) if len(chunk)]
+        parts = self._pool.starmap(_search_controls, [(chunk, k) for chunk in chunks])
+        return np.vstack([r for r, _ in parts]), np.vstack([s for _, s in parts])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def match_controls_parallel(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                            workers=None, mode="shards", batch_size=None, regulation_matrix=None):
+    """
+    match_controls_to_regulations across a process pool; returns identical results.
+    batch_size defaults to 1024 controls per worker in "controls" mode.
+    """
+    from models.match_engine import build_regulation_matrix, match_controls_to_regulations
+
+    if regulation_matrix is None:
+        regulation_matrix = build_regulation_matrix(regulations_embeddings_dict)
+    with ParallelMatcher(regulation_matrix, workers, mode) as matcher:
+        batch_size = batch_size or (1024 * matcher.workers if mode == "controls" else 1024)
+        return match_controls_to_regulations(control_embeddings, None, top_n, min_threshold, batch_size,
+                                             regulation_matrix=regulation_matrix, ann_index=matcher)
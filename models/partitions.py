@@ -0,0 +1,182 @@
+import re
+import numpy as np
+
+# Partitions of the stacked regulation matrix by regulator, region and
+# category_refined, for scoped matching. Regulators are contiguous row ranges
+# already; regions are unions of regulators; category rows are kept in one
+# category-sorted index with offsets. A filter expression selects the rows of
+# the matching partitions and only those rows are scored, so a scoped query
+# costs in proportion to its slice of the matrix.
+#
+# Filter expressions are clauses separated by ";", all of which must hold:
+#   key=value[,value...]    rows whose key is any of the values
+#   key!=value[,value...]   rows whose key is none of the values
+# Keys are region, regulator (a regulation's store name or display name, e.g.
+# "uk_dpa" or "UK DPA") and category (category_refined; a trailing * matches a
+# prefix). Values are case-insensitive and must name something in the
+# matrix (validate_filter); a clause may still select no rows. Examples:
+#   region=India
+#   regulator=DPDP,RBI,SEBI
+#   region=EU;category=Information Security
+#   category=Security*;regulator!=GLBA
+
+FILTER_KEYS = ("region", "regulator", "category")
+FILTER_ALIASES = {"regulation": "regulator", "category_refined": "category"}
+
+# Region of each regulation in the embedding store, by regulation_key
+REGULATION_REGIONS = {
+    "gdpr": "EU",
+    "dpdp": "India",
+    "rbi": "India",
+    "sebi": "India",
+    "pipeda": "Canada",
+    "glba": "US",
+    "uk_dpa": "UK",
+    "msa": "Singapore",
+    "bafin": "Germany",
+    "australia_privacy": "Australia",
+}
+
+# Selected sub-matrices kept per regulation matrix, by filter expression
+PARTITION_CACHE_SIZE = 32
+
+def regulation_key(name):
+    """Store-style key of a regulation name: "UK DPA" and "uk_dpa" both give "uk_dpa"."""
+    return re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_")
+
+def region_of(name, regions=None):
+    """Region of a regulation (store or display name), "Unknown" if it has none."""
+    regions = REGULATION_REGIONS if regions is None else regions
+    return regions.get(regulation_key(name), "Unknown")
+
+def parse_filter(expression):
+    """
+    Parse a filter expression into (key, negate, values) clauses.
+    Raises ValueError on unknown keys or malformed clauses.
+    """
+    clauses = []
+    for part in str(expression).split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r"([A-Za-z_]+)\s*(!?=)\s*(.+)", part)
+        if match is None:
+            raise ValueError(f"Malformed filter clause {part!r}, expected key=value[,value...]")
+        key = FILTER_ALIASES.get(match.group(1).lower(), match.group(1).lower())
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Unknown filter key {match.group(1)!r}, expected one of {FILTER_KEYS}")
+        values = [v.strip().lower() for v in match.group(3).split(",") if v.strip()]
+        if not values:
+            raise ValueError(f"Filter clause {part!r} has no values")
+        clauses.append((key, match.group(2) == "!=", values))
+    return clauses
+
+def build_partitions(regulation_matrix, regions=None):
+    """Per-regulation keys and regions plus a category-sorted row index."""
+    row_category = regulation_matrix['row_category']
+    n_categories = len(regulation_matrix['categories'])
+    return {
+        'regulation_keys': [regulation_key(name) for name in regulation_matrix['regulations']],
+        'regions': [region_of(name, regions) for name in regulation_matrix['regulations']],
+        'category_rows': np.argsort(row_category, kind="stable").astype(np.int64),
+        'category_offsets': np.concatenate(
+            [[0], np.cumsum(np.bincount(row_category, minlength=n_categories))]).astype(np.int64),
+        'cache': {},
+    }
+
+def _get_partitions(regulation_matrix):
+    if 'partitions' not in regulation_matrix:
+        regulation_matrix['partitions'] = build_partitions(regulation_matrix)
+    return regulation_matrix['partitions']
+
+def _matches(name, values):
+    name = name.lower()
+    return any(name.startswith(v[:-1]) if v.endswith("*") else name == v for v in values)
+
+def _regulator_pattern(value):
+    return regulation_key(value[:-1]) + "*" if value.endswith("*") else regulation_key(value)
+
+def validate_filter(regulation_matrix, expression):
+    """
+    Parse a filter expression and check every value against the regulation
+    matrix's partitions. Raises ValueError naming values (or prefixes) that
+    match no region, regulator or category, so a typo is not mistaken for a
+    filter that simply has no matches. Returns the parsed clauses.
+    """
+    parts = _get_partitions(regulation_matrix)
+    known = {
+        'region': parts['regions'],
+        'regulator': parts['regulation_keys'],
+        'category': list(regulation_matrix['categories']),
+    }
+    clauses = parse_filter(expression)
+    unknown = []
+    for key, negate, values in clauses:
+        for value in values:
+            pattern = _regulator_pattern(value) if key == "regulator" else value
+            if not any(_matches(name, [pattern]) for name in known[key]):
+                unknown.append(f"{key}{'!=' if negate else '='}{value}")
+    if unknown:
+        raise ValueError(f"Unknown filter value(s): {', '.join(unknown)}")
+    return clauses
+
+def select_rows(regulation_matrix, expression):
+    """
+    Sorted regulation matrix rows selected by a filter expression.
+    Raises ValueError on values that match nothing (see validate_filter).
+    """
+    parts = _get_partitions(regulation_matrix)
+    offsets = regulation_matrix['offsets']
+    clauses = validate_filter(regulation_matrix, expression)
+
+    selected_regs = np.ones(len(regulation_matrix['regulations']), dtype=bool)
+    selected_categories = None
+    for key, negate, values in clauses:
+        if key == "category":
+            hit = np.array([_matches(c, values) for c in regulation_matrix['categories']], dtype=bool)
+            selected_categories = (hit ^ negate) if selected_categories is None else selected_categories & (hit ^ negate)
+            continue
+        if key == "regulator":
+            keys = [_regulator_pattern(v) for v in values]
+            hit = np.array([_matches(name, keys) for name in parts['regulation_keys']], dtype=bool)
+        else:
+            hit = np.array([_matches(region, values) for region in parts['regions']], dtype=bool)
+        selected_regs &= hit ^ negate
+
+    regs = np.flatnonzero(selected_regs)
+    reg_rows = (np.concatenate([np.arange(offsets[r], offsets[r + 1]) for r in regs]).astype(np.int64)
+                if len(regs) else np.zeros(0, dtype=np.int64))
+    if selected_categories is None:
+        return reg_rows
+
+    cats = np.flatnonzero(selected_categories)
+    cat_rows = (np.sort(np.concatenate([parts['category_rows'][parts['category_offsets'][c]:parts['category_offsets'][c + 1]]
+                                        for c in cats]))
+                if len(cats) else np.zeros(0, dtype=np.int64))
+    if len(regs) == len(selected_regs):
+        return cat_rows
+    # Keep category rows that fall inside a selected regulator's range
+    owner = np.searchsorted(offsets, cat_rows, side="right") - 1
+    return cat_rows[selected_regs[owner]]
+
+def partition(regulation_matrix, expression):
+    """
+    The rows a filter expression selects and the sub-matrix of those rows,
+    cached on the regulation matrix so repeated scoped queries reuse it.
+    A selection that is one contiguous range is a view, not a copy.
+    """
+    if regulation_matrix.get('precision', "float32") != "float32":
+        raise ValueError("Filtered matching needs a float32 regulation matrix, not a quantized one")
+    parts = _get_partitions(regulation_matrix)
+    key = ";".join(sorted(f"{k}{'!=' if n else '='}{','.join(sorted(v))}" for k, n, v in parse_filter(expression)))
+    cache = parts['cache']
+    if key not in cache:
+        rows = select_rows(regulation_matrix, expression)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            matrix = regulation_matrix['matrix'][rows[0]:rows[-1] + 1]
+        else:
+            matrix = regulation_matrix['matrix'][rows]
+        if len(cache) >= PARTITION_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = {'rows': rows, 'matrix': matrix}
+    return cache[key]
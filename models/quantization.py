@@ -0,0 +1,151 @@
+import time
+import numpy as np
+
+# Reduced-precision regulation matrices. build_regulation_matrix(...,
+# precision="int8" | "float16") keeps the stacked matrix quantized in memory
+# (int8 with one float32 scale per row, or float16) instead of float32:
+#   int8    ~4x smaller, per-row symmetric quantization of the normalized rows
+#   float16 ~2x smaller
+# Search scores every row against the quantized matrix, shortlists
+# k * rerank candidates per control, and re-scores only those at full
+# precision from the original embeddings (memory-mapped when they come from
+# the embedding store). Final scores are exact, so match levels and
+# thresholds behave as with float32 as long as the true top-k make the shortlist.
+
+PRECISIONS = ("float32", "float16", "int8")
+DEFAULT_RERANK = 4
+
+def quantize_rows(matrix, precision):
+    """
+    Quantize L2-normalized float32 rows. Returns (values, scales) where
+    values * scales[:, None] approximates matrix.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if precision == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+    if precision == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales = scales.astype(np.float32)
+        safe = np.where(scales > 0, scales, 1.0)[:, None]
+        return np.clip(np.rint(matrix / safe), -127, 127).astype(np.int8), scales
+    raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+def dequantize_rows(values, scales):
+    """float32 approximation of quantized rows."""
+    return values.astype(np.float32) * scales[:, None]
+
+def approximate_top_k(queries, regulation_matrix, k, chunk_rows=16384):
+    """
+    Top-k rows of each query by score against the quantized matrix, scanning it
+    in chunks so only chunk_rows rows are ever widened to float32 at once.
+    """
+    from models.match_engine import top_k_rows
+
+    values = regulation_matrix['matrix']
+    scales = regulation_matrix['scales']
+    best_rows, best_scores = [], []
+    for start in range(0, len(values), chunk_rows):
+        chunk = values[start:start + chunk_rows].astype(np.float32)
+        scores = (queries @ chunk.T) * scales[start:start + chunk_rows]
+        rows, scores = top_k_rows(scores, k)
+        best_rows.append(rows + start)
+        best_scores.append(scores)
+
+    rows = np.concatenate(best_rows, axis=1)
+    scores = np.concatenate(best_scores, axis=1)
+    if rows.shape[1] > k:
+        positions, scores = top_k_rows(scores, k)
+        rows = np.take_along_axis(rows, positions, axis=1)
+    return rows, scores
+
+def full_precision_rows(regulation_matrix, rows):
+    """Normalized float32 vectors of the given global rows, read from the original embeddings."""
+    from models.match_engine import normalize_rows
+
+    rows = np.asarray(rows, dtype=np.int64)
+    out = np.empty((len(rows), regulation_matrix['matrix'].shape[1]), dtype=np.float32)
+    regulation_ids = regulation_matrix['row_regulation'][rows]
+    for reg_pos in np.unique(regulation_ids):
+        mask = regulation_ids == reg_pos
+        local = rows[mask] - regulation_matrix['offsets'][reg_pos]
+        # Sorted indices keep memory-mapped reads sequential
+        order = np.argsort(local)
+        block = np.asarray(regulation_matrix['sources'][reg_pos][local[order]], dtype=np.float32)
+        vectors = np.empty_like(block)
+        vectors[order] = block
+        out[mask] = vectors
+    return normalize_rows(out)
+
+def search(queries, regulation_matrix, k, rerank=None, chunk_rows=16384):
+    """
+    Top-k (rows, scores) for normalized float32 queries against a quantized
+    regulation matrix: approximate shortlist of k * rerank rows, then exact re-scoring.
+    Same layout and tie-breaking (lower row first) as match_engine.top_k_rows.
+    """
+    from models.match_engine import top_k_rows
+
+    rerank = rerank or regulation_matrix.get('rerank', DEFAULT_RERANK)
+    n_rows = len(regulation_matrix['matrix'])
+    shortlist = min(n_rows, max(k, k * rerank))
+    candidates, _ = approximate_top_k(queries, regulation_matrix, shortlist, chunk_rows)
+    # Row order inside the shortlist makes exact ties resolve to the lower row
+    candidates = np.sort(candidates, axis=1)
+
+    vectors = full_precision_rows(regulation_matrix, candidates.ravel()).reshape(*candidates.shape, -1)
+    exact = np.einsum('nd,nsd->ns', queries, vectors)
+    positions, scores = top_k_rows(exact, k)
+    return np.take_along_axis(candidates, positions, axis=1), scores
+
+def matrix_nbytes(regulation_matrix):
+    """In-memory size of the stacked matrix (plus int8 scales)."""
+    return int(regulation_matrix['matrix'].nbytes + regulation_matrix.get('scales', np.zeros(0)).nbytes)
+
+def accuracy_report(control_embeddings, regulations_embeddings_dict, top_n=5, min_threshold=0.65,
+                    precisions=("float16", "int8"), reranks=(1, 2, 4, 8)):
+    """
+    Compare quantized matching against float32 for each precision and re-rank factor.
+    Returns a list of dicts with recall@top_n, agreement of the matches kept
+    above min_threshold and of their match levels, the largest score difference
+    on shared matches, matrix memory and search time.
+    """
+    from models.match_engine import build_regulation_matrix, get_match_level, normalize_rows, top_k_rows
+
+    queries = normalize_rows(control_embeddings)
+    exact_matrix = build_regulation_matrix(regulations_embeddings_dict)
+    k = min(top_n, len(exact_matrix['matrix']))
+    start = time.perf_counter()
+    exact_rows, exact_scores = top_k_rows(queries @ exact_matrix['matrix'].T, k)
+    exact_seconds = time.perf_counter() - start
+
+    def kept(rows, scores):
+        return [{(int(r), get_match_level(float(s))) for r, s in zip(row_r, row_s) if s >= min_threshold}
+                for row_r, row_s in zip(rows, scores)]
+
+    exact_kept = kept(exact_rows, exact_scores)
+    exact_lookup = [dict(zip(r.tolist(), s.tolist())) for r, s in zip(exact_rows, exact_scores)]
+
+    report = []
+    for precision in precisions:
+        quantized = build_regulation_matrix(regulations_embeddings_dict, precision=precision)
+        for rerank in reranks:
+            start = time.perf_counter()
+            rows, scores = search(queries, quantized, k, rerank=rerank)
+            seconds = time.perf_counter() - start
+
+            hits = sum(len(set(a) & set(e)) for a, e in zip(rows.tolist(), exact_rows.tolist()))
+            quant_kept = kept(rows, scores)
+            same_kept = sum(a == e for a, e in zip(quant_kept, exact_kept))
+            max_diff = max((abs(s - lookup[r]) for row_r, row_s, lookup in zip(rows.tolist(), scores.tolist(), exact_lookup)
+                            for r, s in zip(row_r, row_s) if r in lookup), default=0.0)
+            report.append({
+                'precision': precision,
+                'rerank': rerank,
+                'recall': hits / exact_rows.size if exact_rows.size else 1.0,
+                'controls_with_identical_matches': same_kept / len(exact_kept) if exact_kept else 1.0,
+                'max_score_diff': max_diff,
+                'matrix_bytes': matrix_nbytes(quantized),
+                'float32_matrix_bytes': matrix_nbytes(exact_matrix),
+                'seconds': seconds,
+                'exact_seconds': exact_seconds,
+            })
+    return report
@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+from utils import tracing
+
+# Process-wide registry of NLP models. Nothing is imported or loaded until a
+# model is first requested, and every caller in the process shares the same
+# instance afterwards. Services can call preload() at start-up to pay the
+# load cost before the first request.
+# Sentence models load with an encoder backend (see models.encoding), the
+# torch reference model unless asked otherwise; OCIE_ENCODER_THREADS caps the
+# torch thread count.
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+ENCODER_THREADS = int(os.environ.get("OCIE_ENCODER_THREADS", 0)) or None
+
+_lock = threading.Lock()
+_models = {}
+_keybert_models = {}
+_load_stats = {}
+
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def _record_load(key, start_time, start_rss):
+    _load_stats[key] = {
+        "load_seconds": time.perf_counter() - start_time,
+        "rss_delta_bytes": current_rss_bytes() - start_rss,
+    }
+
+def get_model(name=DEFAULT_MODEL, backend="torch"):
+    """
+    Return the shared SentenceTransformer for name with the given encoder
+    backend, loading it on first use. Encode through the embedding cache with
+    models.encoding.model_id(name, backend) so backends never share vectors.
+    """
+    from models.encoding import model_id
+    key = model_id(name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            start_time, start_rss = time.perf_counter(), current_rss_bytes()
+            with tracing.stage("model_load", items=1):
+                from models.encoding import load_model
+                _models[key] = load_model(name, backend, threads=ENCODER_THREADS)
+            _record_load(key, start_time, start_rss)
+            print(f"🧠 Loaded {key} in {_load_stats[key]['load_seconds']:.2f}s")
+    return _models[key]
+
+def get_keybert(name=DEFAULT_MODEL):
+    """Return a shared KeyBERT wrapper around the shared reference SentenceTransformer for name."""
+    kw_model = _keybert_models.get(name)
+    if kw_model is not None:
+        return kw_model
+
+    model = get_model(name)
+    with _lock:
+        if name not in _keybert_models:
+            start_time, start_rss = time.perf_counter(), current_rss_bytes()
+            with tracing.stage("model_load", items=1):
+                from keybert import KeyBERT
+                _keybert_models[name] = KeyBERT(model)
+            _record_load(f"keybert:{name}", start_time, start_rss)
+    return _keybert_models[name]
+
+def preload(names=(DEFAULT_MODEL,), keybert=False):
+    """Load models ahead of first use, e.g. at service start-up. Returns model_stats()."""
+    for name in names:
+        if keybert:
+            get_keybert(name)
+        else:
+            get_model(name)
+    return model_stats()
+
+def is_loaded(name=DEFAULT_MODEL, backend="torch"):
+    """True if the model is already loaded in this process with the given backend."""
+    from models.encoding import model_id
+    return model_id(name, backend) in _models
+
+def model_stats():
+    """Load time and RSS growth per loaded model, plus the current process RSS."""
+    return {
+        "models": {key: dict(stats) for key, stats in _load_stats.items()},
+        "rss_bytes": current_rss_bytes(),
+    }
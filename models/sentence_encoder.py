@@ -1,20 +1,26 @@
 # /models/sentence_encoder.py
 
-from sentence_transformers import SentenceTransformer
 import pickle
-import pandas as pd
 import os
+from models import registry
+from models.encoding import model_id
+from utils.embedder import encode_with_cache
 
-# Load the sentence-transformer model once at module load
+# The model is loaded lazily by the shared registry on the first encode call
 # You can switch the model here if needed (e.g., legal-bert)
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = registry.DEFAULT_MODEL
+# Encoder backend: torch (reference), quantized or onnx; see models.encoding.
+# Check a non-reference backend with scripts.encoding_report before using it.
+ENCODER_BACKEND = os.environ.get("OCIE_ENCODER_BACKEND", "torch")
 
-def encode_texts(texts):
+def encode_texts(texts, backend=None):
     """
-    Takes a list of text strings and returns their embeddings as numpy arrays.
-    convert_to_tensor=False returns numpy arrays instead of torch tensors.
+    Takes a list of text strings and returns their embeddings as a numpy array.
+    Texts already in the embedding cache are not re-encoded; the rest are
+    encoded in length-sorted batches.
     """
-    return model.encode(texts, convert_to_tensor=False)
+    backend = backend or ENCODER_BACKEND
+    return encode_with_cache(registry.get_model(MODEL_NAME, backend), texts, model_id(MODEL_NAME, backend))
 
 def save_embeddings(texts, path):
     """
@@ -38,6 +44,7 @@ def process_regulation_csv(file_path, output_dir):
     """
 
     # Read the CSV into a DataFrame
+    import pandas as pd
     df = pd.read_csv(file_path)
 
     # Safety check to make sure required column exists
@@ -73,22 +80,14 @@ def embed_controls(control_texts):
 
 # Optional: load controls from CSV and embed
 def embed_controls_from_csv(file_path):
+    import pandas as pd
     df = pd.read_csv(file_path)
     if 'control_text' not in df.columns:
         raise ValueError(f"'control_text' column not found in {file_path}")
     return embed_controls(df['control_text'].tolist())
 
-
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-
-# Load or initialize the model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-def encode_texts(texts):
-    return model.encode(texts)
-
 def embed_controls_csv(file_path):
+    import pandas as pd
     df = pd.read_csv(file_path)
 
     if 'control_statement' not in df.columns:
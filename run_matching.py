@@ -1,22 +1,6 @@
 import pickle
-import os
-from models.match_engine import match_controls_to_regulations
-import numpy as np
-
-def load_all_regulation_embeddings(embeddings_dir):
-    embeddings_dict = {}
-    for file in os.listdir(embeddings_dir):
-        if file.endswith('.pkl'):
-            reg_name = file.replace('.pkl', '')
-            with open(os.path.join(embeddings_dir, file), 'rb') as f:
-                data = pickle.load(f)
-                embeddings_dict[reg_name] = {
-                    'embeddings': data.get('embeddings', np.array([])),
-                    'texts': data.get('expanded_text', data.get('text', [])),
-                    'tags': data.get('tags', []),
-                    'categories': data.get('category_refined', []),
-                }
-    return embeddings_dict
+from models.match_engine import iter_match_controls, load_all_regulation_embeddings
+from utils import tracing
 
 # Load your control embeddings (adjust the path)
 with open('data/control_embeddings.pkl', 'rb') as f:
@@ -25,11 +9,11 @@ with open('data/control_embeddings.pkl', 'rb') as f:
 # Load regulation embeddings dictionary
 regulations_embeddings_dict = load_all_regulation_embeddings('data/embeddings')
 
-# Call matching with your chosen parameters
-results = match_controls_to_regulations(control_embeddings, regulations_embeddings_dict, top_n=3, min_threshold=0.70)
+# Call matching with your chosen parameters; results stream in one control at a time
+results = iter_match_controls(control_embeddings, regulations_embeddings_dict, top_n=3, min_threshold=0.70)
 
 # Print results with match levels
-for i, control_matches in enumerate(results):
+for i, control_matches in results:
     print(f"\n🔐 Control {i + 1}:")
     print("-" * 40)
     if not control_matches:
@@ -44,3 +28,8 @@ for i, control_matches in enumerate(results):
         print(f"   - Tags: {match['tags']}")
         print(f"   - Category: {match['category_refined']}")
         print()
+
+# Stage timings, when run with OCIE_TRACE=1
+if tracing.enabled():
+    tracing.print_summary()
+    tracing.write_summary("outputs/run_trace.json")
@@ -0,0 +1,40 @@
+import argparse
+import json
+import os
+from models import match_engine
+from models.ann_index import build_ann_index, recall_report
+
+CONTROLS_EMB_PATH = "data/control_embeddings.pkl"
+EMBED_DIR = "data/embeddings"
+INDEX_DIR = "data/ann_index"
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and speed of the ANN index against exact matching.")
+    parser.add_argument("--backend", choices=["ivf", "chroma"], default="ivf")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--settings", default="1,2,4,8,16,32", help="nprobe (ivf) or ef (chroma) values")
+    parser.add_argument("--output", default="outputs/ann_recall_report.json")
+    args = parser.parse_args()
+
+    control_embeddings = match_engine.load_embeddings(CONTROLS_EMB_PATH)
+    regulation_matrix = match_engine.build_regulation_matrix(
+        match_engine.load_all_regulation_embeddings(EMBED_DIR)
+    )
+    index_dir = os.path.join(INDEX_DIR, args.backend)
+    index = build_ann_index(regulation_matrix, index_dir, backend=args.backend)
+
+    settings = [int(s) for s in args.settings.split(",")]
+    report = recall_report(control_embeddings, regulation_matrix, index, top_n=args.top_n, settings=settings)
+
+    knob = "nprobe" if args.backend == "ivf" else "ef"
+    print(f"\n📊 {args.backend} recall@{args.top_n} vs exact ({len(regulation_matrix['matrix'])} requirements)")
+    for row in report:
+        print(f"  {knob}={row[knob]:>4}  recall={row['recall']:.3f}  speedup={row['speedup']:.1f}x")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Saved report to {args.output}")
+
+if __name__ == "__main__":
+    main()
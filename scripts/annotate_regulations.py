@@ -1,9 +1,12 @@
 import os
-from utils import parser
+import argparse
+from utils import parser, storage
+from utils.embedder import text_key
+from scripts.embed_updated_regulations import EMBED_DIR, MODEL_NAME, read_regulation_csv
 
 REG_DIR = "data/regulations"
 
-def main():
+def main(embed=False):
     for filename in os.listdir(REG_DIR):
         if filename.endswith(".csv"):
             file_path = os.path.join(REG_DIR, filename)
@@ -11,28 +14,25 @@ def main():
 
             df = parser.load_csv(file_path)
 
-            expanded_texts = []
-            tags_list = []
-            refined_categories = []
-
-            for _, row in df.iterrows():
-                requirement = row["requirement_text"]
-                category = row["category"]
-
-                expanded, tags, refined_cat = parser.annotate_row(requirement, category)
-
-                expanded_texts.append(expanded)
-                tags_list.append(tags)
-                refined_categories.append(refined_cat)
-
-            df["expanded_text"] = expanded_texts
-            df["tags"] = tags_list
-            df["category_refined"] = refined_categories
+            # One batched pass embeds requirements, expanded texts and keyword candidates
+            df, embeddings = parser.annotate_dataframe(df)
 
             parser.save_csv(df, file_path)
             print(f"✅ Annotated: {filename}")
 
+            if embed:
+                # Store the expanded_text embeddings from the annotation pass directly
+                ids, texts, tags, categories = read_regulation_csv(file_path)
+                regulator_name = os.path.splitext(filename)[0]
+                storage.save_regulation_store(EMBED_DIR, regulator_name, embeddings, texts, tags, categories,
+                                              MODEL_NAME, ids=ids, content_hashes=[text_key(t) for t in texts])
+                print(f"✅ Saved enriched embeddings for {regulator_name} → {EMBED_DIR}/{regulator_name}.npy")
+
     print("🎉 All files processed successfully!")
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser(description="Annotate regulation CSVs with expanded text, tags and categories.")
+    arg_parser.add_argument("--embed", action="store_true",
+                            help="also write the embedding store from the annotation pass")
+    args = arg_parser.parse_args()
+    main(embed=args.embed)
@@ -0,0 +1,53 @@
+import os
+import time
+import argparse
+from models import match_engine
+from utils.sinks import CsvSink, JsonLinesSink, write_records
+
+CONTROLS_EMB_PATH = "data/control_embeddings.pkl"
+EMBED_DIR = "data/embeddings"
+
+UNCOVERED_CSV_FIELDS = [
+    "regulation", "requirement_index", "requirement_text", "category_refined",
+    "closest_control_index", "closest_similarity",
+]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find regulatory requirements no control covers, in the same pass as control matching.")
+    parser.add_argument("--top-n", type=int, default=5, help="matches kept per control")
+    parser.add_argument("--min-threshold", type=float, default=0.65)
+    parser.add_argument("--requirement-top-k", type=int, default=3, help="closest controls kept per requirement")
+    parser.add_argument("--coverage-threshold", type=float, default=None,
+                        help="similarity a control needs to cover a requirement (default: --min-threshold)")
+    parser.add_argument("--controls", default=CONTROLS_EMB_PATH)
+    parser.add_argument("--embed-dir", default=EMBED_DIR)
+    parser.add_argument("--output-dir", default="outputs")
+    args = parser.parse_args()
+
+    control_embeddings = match_engine.load_embeddings(args.controls)
+    if control_embeddings is None:
+        raise SystemExit("Failed to load control embeddings - exiting")
+    regulation_matrix = match_engine.build_regulation_matrix(match_engine.load_all_regulation_embeddings(args.embed_dir))
+
+    start = time.perf_counter()
+    result, coverage = match_engine.match_controls_bidirectional(
+        control_embeddings, None, top_n=args.top_n, min_threshold=args.min_threshold,
+        requirement_top_k=args.requirement_top_k, coverage_threshold=args.coverage_threshold,
+        regulation_matrix=regulation_matrix)
+    seconds = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    result.save(os.path.join(args.output_dir, "match_result.npz"))
+    with JsonLinesSink(os.path.join(args.output_dir, "uncovered_requirements.jsonl")) as json_sink, \
+            CsvSink(os.path.join(args.output_dir, "uncovered_requirements.csv"), UNCOVERED_CSV_FIELDS) as csv_sink:
+        uncovered = write_records(match_engine.iter_uncovered_requirements(coverage, regulation_matrix),
+                                  json_sink, csv_sink)
+
+    total = len(regulation_matrix['matrix'])
+    print(f"✅ {len(result)} controls, {result.n_matches} matches in {seconds:.2f}s")
+    print(f"❗ {uncovered}/{total} requirements have no control at or above {coverage['threshold']:.2f} "
+          f"→ {args.output_dir}/uncovered_requirements.csv")
+
+if __name__ == "__main__":
+    main()
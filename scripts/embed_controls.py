@@ -3,7 +3,12 @@
 import pandas as pd
 import pickle
 import os
-from sentence_transformers import SentenceTransformer
+from models import registry
+from models.encoding import model_id
+from models.sentence_encoder import ENCODER_BACKEND
+from utils.embedder import encode_with_cache, get_default_cache
+
+MODEL_NAME = registry.DEFAULT_MODEL
 
 # Load controls CSV
 csv_path = "data/controls/controls.csv"
@@ -17,8 +22,9 @@ if 'control_statement' not in df.columns:
 control_texts = df['control_statement'].dropna().tolist()
 
 # Embed controls using SentenceTransformer
-model = SentenceTransformer('all-MiniLM-L6-v2')
-control_embeddings = model.encode(control_texts)
+# Length-sorted batches; set OCIE_ENCODER_BACKEND to use a CPU-optimized backend
+control_embeddings = encode_with_cache(registry.get_model(MODEL_NAME, ENCODER_BACKEND), control_texts,
+                                       model_id(MODEL_NAME, ENCODER_BACKEND), show_progress_bar=True)
 
 # Save to pickle
 output_path = "data/control_embeddings.pkl"
@@ -27,3 +33,4 @@ with open(output_path, "wb") as f:
     pickle.dump(control_embeddings, f)
 
 print(f"✅ Successfully embedded {len(control_texts)} controls into: {output_path}")
+print(f"🗄️ Embedding cache: {get_default_cache().stats()}")
@@ -1,49 +1,151 @@
 import os
+import argparse
+import numpy as np
 import pandas as pd
-import pickle
-from sentence_transformers import SentenceTransformer
+from models import registry
+from utils import storage
+from utils.embedder import encode_with_cache, get_default_cache, text_key
 
 REG_DIR = "data/regulations"
 EMBED_DIR = "data/embeddings"
+MODEL_NAME = registry.DEFAULT_MODEL
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+def read_regulation_csv(filepath):
+    """
+    Read a regulation CSV into the columns stored alongside its embeddings.
+    Returns (ids, texts, tags, categories); ids is None if the CSV has no usable 'id' column.
+    """
+    df = pd.read_csv(filepath)
 
-def embed_and_save_embeddings():
+    # Use expanded_text if available, else fallback to requirement_text
+    if "expanded_text" in df.columns:
+        texts = df["expanded_text"].fillna("").tolist()
+    else:
+        texts = df["requirement_text"].fillna("").tolist()
+
+    # Optional: get tags and category if they exist
+    tags = df["tags"].fillna("N/A").tolist() if "tags" in df.columns else ["N/A"] * len(texts)
+    categories = df["category_refined"].fillna("N/A").tolist() if "category_refined" in df.columns else ["N/A"] * len(texts)
+
+    ids = None
+    if "id" in df.columns:
+        ids = df["id"].astype(str).tolist()
+        if len(set(ids)) != len(ids):
+            print(f"❗ {os.path.basename(filepath)} has duplicate ids, re-embedding the whole file")
+            ids = None
+
+    return ids, texts, tags, categories
+
+def embedding_dim(manifest):
+    """Dimension of the store's embeddings, or of the model's for a store with no regulations yet."""
+    if manifest and manifest["regulations"]:
+        return manifest["dim"]
+    model = registry.get_model(MODEL_NAME)
+    # Renamed get_embedding_dimension in newer sentence-transformers
+    return (getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension)()
+
+def diff_rows(ids, hashes, stored):
+    """
+    Compare a CSV's rows against the stored embedding set by id and content hash.
+    Returns (added, changed, deleted, reuse) where reuse maps a CSV row position
+    to the stored row whose vector can be kept.
+    """
+    stored_rows = {
+        row_id: (row, row_hash)
+        for row, (row_id, row_hash) in enumerate(zip(stored['ids'], stored['content_hashes']))
+    }
+
+    added, changed, reuse = [], [], {}
+    for pos, (row_id, row_hash) in enumerate(zip(ids, hashes)):
+        if row_id not in stored_rows:
+            added.append(pos)
+        elif stored_rows[row_id][1] != row_hash:
+            changed.append(pos)
+        else:
+            reuse[pos] = stored_rows[row_id][0]
+
+    deleted = sorted(set(stored_rows) - set(ids))
+    return added, changed, deleted, reuse
+
+def embed_regulation_incremental(filepath, regulator_name, manifest):
+    """
+    Re-embed only added or changed rows of one regulation CSV and rewrite its store
+    entry if anything differs. Returns a change summary dict.
+    """
+    ids, texts, tags, categories = read_regulation_csv(filepath)
+    hashes = [text_key(t) for t in texts]
+
+    stored = None
+    if ids is not None and manifest and regulator_name in manifest["regulations"]:
+        stored = storage.load_regulation_store(EMBED_DIR, regulator_name, manifest)
+        if len(stored['ids']) != len(stored['embeddings']) or len(stored['content_hashes']) != len(stored['embeddings']):
+            stored = None
+
+    if stored is None:
+        # Nothing usable to diff against: every row is new
+        added, changed, deleted, reuse = list(range(len(texts))), [], [], {}
+    else:
+        added, changed, deleted, reuse = diff_rows(ids, hashes, stored)
+
+    summary = {"added": len(added), "changed": len(changed), "deleted": len(deleted), "unchanged": len(reuse)}
+    to_encode = added + changed
+
+    metadata_same = stored is not None and (
+        stored['ids'] == ids and stored['texts'] == texts
+        and stored['tags'] == tags and stored['categories'] == categories
+    )
+    if not to_encode and not deleted and metadata_same:
+        summary["written"] = False
+        return summary
+
+    # A CSV with a header but no rows is stored as an empty (0, dim) entry
+    embeddings = np.zeros((len(texts), embedding_dim(manifest)), dtype=np.float32)
+    if to_encode:
+        embeddings[to_encode] = encode_with_cache(registry.get_model(MODEL_NAME), [texts[pos] for pos in to_encode],
+                                                  MODEL_NAME)
+    if reuse:
+        positions = list(reuse.keys())
+        embeddings[positions] = stored['embeddings'][list(reuse.values())]
+
+    storage.save_regulation_store(EMBED_DIR, regulator_name, embeddings, texts, tags, categories, MODEL_NAME,
+                                  ids=ids, content_hashes=hashes)
+    summary["written"] = True
+    return summary
+
+def embed_and_save_embeddings(incremental=False):
     os.makedirs(EMBED_DIR, exist_ok=True)
 
     for filename in os.listdir(REG_DIR):
         if filename.endswith(".csv"):
             filepath = os.path.join(REG_DIR, filename)
-            df = pd.read_csv(filepath)
+            regulator_name = os.path.splitext(filename)[0]
 
-            # Use expanded_text if available, else fallback to requirement_text
-            if "expanded_text" in df.columns:
-                texts = df["expanded_text"].fillna("").tolist()
-            else:
-                texts = df["requirement_text"].fillna("").tolist()
+            if incremental:
+                summary = embed_regulation_incremental(filepath, regulator_name, storage.load_manifest(EMBED_DIR))
+                status = "updated" if summary["written"] else "unchanged, skipped"
+                print(f"🔁 {regulator_name}: +{summary['added']} added, ~{summary['changed']} changed, "
+                      f"-{summary['deleted']} deleted, {summary['unchanged']} unchanged ({status})")
+                continue
 
-            # Generate embeddings
-            embeddings = model.encode(texts, show_progress_bar=True)
+            ids, texts, tags, categories = read_regulation_csv(filepath)
 
-            # Optional: get tags and category if they exist
-            tags = df["tags"].fillna("N/A").tolist() if "tags" in df.columns else ["N/A"] * len(texts)
-            categories = df["category_refined"].fillna("N/A").tolist() if "category_refined" in df.columns else ["N/A"] * len(texts)
+            # Generate embeddings
+            if texts:
+                embeddings = encode_with_cache(registry.get_model(MODEL_NAME), texts, MODEL_NAME, show_progress_bar=True)
+            else:
+                embeddings = np.zeros((0, embedding_dim(storage.load_manifest(EMBED_DIR))), dtype=np.float32)
 
-            # Save all required fields in a dictionary
-            data_to_save = {
-                "embeddings": embeddings,
-                "expanded_text": texts,
-                "tags": tags,
-                "category_refined": categories
-            }
+            # Save vectors (.npy) and texts/tags/categories (.meta.json) to the embedding store
+            storage.save_regulation_store(EMBED_DIR, regulator_name, embeddings, texts, tags, categories, MODEL_NAME,
+                                          ids=ids, content_hashes=[text_key(t) for t in texts])
 
-            # Save to .pkl
-            regulator_name = os.path.splitext(filename)[0]
-            pkl_path = os.path.join(EMBED_DIR, f"{regulator_name}.pkl")
-            with open(pkl_path, "wb") as f:
-                pickle.dump(data_to_save, f)
+            print(f"✅ Saved enriched embeddings for {regulator_name} → {EMBED_DIR}/{regulator_name}.npy")
 
-            print(f"✅ Saved enriched embeddings for {regulator_name} → {pkl_path}")
+    print(f"🗄️ Embedding cache: {get_default_cache().stats()}")
 
 if __name__ == "__main__":
-    embed_and_save_embeddings()
+    parser = argparse.ArgumentParser(description="Embed regulation CSVs into the embedding store.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-embed rows whose id is new or whose text changed")
+    args = parser.parse_args()
+    embed_and_save_embeddings(incremental=args.incremental)
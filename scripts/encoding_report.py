@@ -0,0 +1,44 @@
+import argparse
+import json
+import os
+import pandas as pd
+from models import registry
+from models.encoding import BACKENDS, DEFAULT_MAX_TOKENS, throughput_report
+
+CONTROLS_CSV_PATH = "data/controls/controls.csv"
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Encoding throughput per backend, file order vs length-sorted, with drift against the reference model.")
+    parser.add_argument("--model", default=registry.DEFAULT_MODEL)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--controls", default=CONTROLS_CSV_PATH)
+    parser.add_argument("--limit", type=int, default=5000, help="control statements to encode")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="padded tokens per sorted batch")
+    parser.add_argument("--threads", type=int, default=registry.ENCODER_THREADS)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="minimum cosine to the reference vectors")
+    parser.add_argument("--output", default="outputs/encoding_report.json")
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.controls)["control_statement"].dropna().astype(str).tolist()[:args.limit]
+    report = throughput_report(args.model, texts, args.backends.split(","), threads=args.threads,
+                               min_cosine=args.min_cosine, max_tokens=args.max_tokens)
+
+    print(f"\n📊 Encoding {len(texts)} control statements with {args.model}")
+    for row in report:
+        if 'error' in row:
+            print(f"  {row['backend']:>9}  ❌ {row['error']}")
+            continue
+        drift = row['drift']
+        drift_text = ("reference" if drift is None else
+                      f"min_cosine={drift['min_cosine']:.4f} {'✅' if drift['ok'] else '❌'}")
+        print(f"  {row['backend']:>9}  file order={row['file_order_sentences_per_second']:.1f}/s  "
+              f"sorted={row['sorted_sentences_per_second']:.1f}/s  {drift_text}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Saved report to {args.output}")
+
+if __name__ == "__main__":
+    main()
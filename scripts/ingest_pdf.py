@@ -0,0 +1,157 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from models import registry
+from utils import parser, pdf_parser, storage
+from utils.embedder import encode_with_cache, text_key
+
+REG_DIR = "data/regulations"
+EMBED_DIR = "data/embeddings"
+
+def iter_pages(pdf_path, workers=None, pages_per_task=8, max_in_flight=None):
+    """
+    Yield (page_number, text) for every page, in order.
+    Page ranges are extracted in a process pool with at most max_in_flight ranges
+    queued ahead of the consumer, so memory stays flat however long the document is.
+    """
+    n_pages = pdf_parser.page_count(pdf_path)
+    workers = max(1, workers or os.cpu_count() or 1)
+    max_in_flight = max_in_flight or workers * 2
+
+    if workers == 1:
+        for start in range(0, n_pages, pages_per_task):
+            yield from pdf_parser.extract_pages(pdf_path, start, start + pages_per_task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        next_start = 0
+        while pending or next_start < n_pages:
+            while next_start < n_pages and len(pending) < max_in_flight:
+                pending.append(pool.submit(pdf_parser.extract_pages, pdf_path, next_start, next_start + pages_per_task))
+                next_start += pages_per_task
+            yield from pending.popleft().result()
+
+def iter_clause_batches(pages, batch_size=256, min_chars=40):
+    """Segment a page stream into clauses and yield them in lists of at most batch_size."""
+    segmenter = pdf_parser.ClauseSegmenter(min_chars=min_chars)
+    batch = []
+    for page_no, text in pages:
+        batch.extend(segmenter.add_page(page_no, text))
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    batch.extend(segmenter.finish())
+    if batch:
+        yield batch
+
+def _annotate_batch(df, annotate):
+    """Annotate (or only embed) one batch of requirement rows. Returns (df, embeddings of its texts)."""
+    if annotate:
+        return parser.annotate_dataframe(df)
+
+    df = df.copy()
+    df["tags"] = "N/A"
+    df["category_refined"] = [parser.refine_category(str(c)) for c in df["category"]]
+    embeddings = encode_with_cache(registry.get_model(), df["requirement_text"].tolist(), registry.DEFAULT_MODEL)
+    return df, embeddings
+
+def ingest_pdf(pdf_path, reg_name=None, regulator=None, reg_dir=REG_DIR, embed_dir=EMBED_DIR, workers=None,
+               batch_size=256, annotate=True, min_chars=40, pages_per_task=8):
+    """
+    Stream a regulation PDF through extract → segment → annotate → embed → store.
+    Writes <reg_dir>/<reg_name>.csv (one row per clause, with stable ids) and the
+    regulation's embedding store entry, one batch of clauses at a time.
+    Returns a stats dict with page and clause counts and throughput.
+    """
+    reg_name = reg_name or os.path.splitext(os.path.basename(pdf_path))[0]
+    regulator = regulator or reg_name.upper()
+    csv_path = os.path.join(reg_dir, f"{reg_name}.csv")
+    tmp_csv_path = csv_path + ".tmp"
+    os.makedirs(reg_dir, exist_ok=True)
+
+    n_pages = pdf_parser.page_count(pdf_path)
+    print(f"📄 Ingesting {pdf_path}: {n_pages} pages → {reg_name}")
+
+    start = time.perf_counter()
+    pages_done = 0
+    clauses = 0
+    seen_ids = {}
+    writer = storage.RegulationStreamWriter(embed_dir, reg_name)
+
+    def counted_pages():
+        nonlocal pages_done
+        for page in iter_pages(pdf_path, workers, pages_per_task):
+            pages_done += 1
+            yield page
+
+    try:
+        for batch in iter_clause_batches(counted_pages(), batch_size, min_chars):
+            df = pd.DataFrame({
+                "id": pdf_parser.clause_ids(regulator, batch, seen_ids),
+                "regulator": regulator,
+                "requirement_text": [c["text"] for c in batch],
+                "category": [c["heading"] for c in batch],
+                "page": [c["page"] for c in batch],
+            })
+            df, embeddings = _annotate_batch(df, annotate)
+            texts = (df["expanded_text"] if annotate else df["requirement_text"]).tolist()
+
+            writer.append(embeddings, texts, df["tags"].tolist(), df["category_refined"].tolist(),
+                          ids=df["id"].tolist(), content_hashes=[text_key(t) for t in texts])
+            df.to_csv(tmp_csv_path, mode="a" if clauses else "w", header=not clauses, index=False)
+            clauses += len(df)
+
+            elapsed = time.perf_counter() - start
+            print(f"   {pages_done}/{n_pages} pages, {clauses} clauses, {pages_done / elapsed:.1f} pages/s")
+    except BaseException:
+        writer.abort()
+        if os.path.exists(tmp_csv_path):
+            os.remove(tmp_csv_path)
+        raise
+
+    if not clauses:
+        writer.abort()
+        print(f"❗ No clauses found in {pdf_path}")
+        return {"regulation": reg_name, "pages": n_pages, "clauses": 0, "seconds": time.perf_counter() - start}
+
+    entry = writer.close()
+    os.replace(tmp_csv_path, csv_path)
+    storage.register_regulations(embed_dir, registry.DEFAULT_MODEL, {reg_name: entry})
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "regulation": reg_name,
+        "pages": n_pages,
+        "clauses": clauses,
+        "seconds": seconds,
+        "pages_per_second": n_pages / seconds if seconds > 0 else None,
+        "clauses_per_second": clauses / seconds if seconds > 0 else None,
+    }
+    print(f"✅ {reg_name}: {n_pages} pages, {clauses} clauses in {seconds:.2f}s "
+          f"({stats['pages_per_second']:.1f} pages/s) → {csv_path}, {embed_dir}/{entry['vectors']}")
+    return stats
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Segment a regulation PDF into requirements, then annotate and embed them.")
+    arg_parser.add_argument("pdf", nargs="+", help="regulation PDF(s)")
+    arg_parser.add_argument("--name", help="regulation name (default: PDF file name); only with a single PDF")
+    arg_parser.add_argument("--regulator", help="regulator label and id prefix (default: upper-cased name)")
+    arg_parser.add_argument("--workers", type=int, default=None, help="page extraction processes (default: one per core)")
+    arg_parser.add_argument("--batch-size", type=int, default=256, help="clauses annotated and embedded per batch")
+    arg_parser.add_argument("--pages-per-task", type=int, default=8)
+    arg_parser.add_argument("--min-chars", type=int, default=40, help="drop clauses shorter than this")
+    arg_parser.add_argument("--no-annotate", action="store_true", help="skip annotation and only embed")
+    arg_parser.add_argument("--reg-dir", default=REG_DIR)
+    arg_parser.add_argument("--embed-dir", default=EMBED_DIR)
+    args = arg_parser.parse_args()
+    if args.name and len(args.pdf) > 1:
+        arg_parser.error("--name can only be used with a single PDF")
+
+    for path in args.pdf:
+        ingest_pdf(path, reg_name=args.name, regulator=args.regulator, reg_dir=args.reg_dir,
+                   embed_dir=args.embed_dir, workers=args.workers, batch_size=args.batch_size,
+                   annotate=not args.no_annotate, min_chars=args.min_chars, pages_per_task=args.pages_per_task)
@@ -0,0 +1,122 @@
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+REG_DIR = "data/regulations"
+EMBED_DIR = "data/embeddings"
+
+def _init_worker(threads_per_worker, annotate):
+    """
+    Cap BLAS / torch threads before the model loads so workers don't
+    oversubscribe the cores, then load this worker's single model instance.
+    Workers are spawned, so the environment caps apply before numpy loads;
+    threadpool_limits also caps any BLAS pool that already exists.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads_per_worker)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads_per_worker)
+    except ImportError:
+        pass
+
+    import torch
+    torch.set_num_threads(threads_per_worker)
+
+    from models import registry
+    registry.preload(keybert=annotate)
+
+def ingest_file(file_path, embed_dir=EMBED_DIR, annotate=True):
+    """
+    Run read → annotate → embed → write for one regulation CSV.
+    Writes the annotated CSV and the regulation's store files, but not the
+    manifest, which the parent process updates once for all files.
+    Returns a result dict; failures are reported in it instead of raised.
+    """
+    from models import registry
+    from utils import parser, storage
+    from utils.embedder import encode_with_cache, text_key
+    from scripts.embed_updated_regulations import read_regulation_csv
+
+    start = time.perf_counter()
+    reg_name = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        embeddings = None
+        if annotate:
+            df, embeddings = parser.annotate_dataframe(parser.load_csv(file_path))
+            parser.save_csv(df, file_path)
+
+        ids, texts, tags, categories = read_regulation_csv(file_path)
+        if embeddings is None:
+            embeddings = encode_with_cache(registry.get_model(), texts, registry.DEFAULT_MODEL)
+
+        entry = storage.write_regulation_files(embed_dir, reg_name, embeddings, texts, tags, categories,
+                                               ids=ids, content_hashes=[text_key(t) for t in texts])
+        return {"regulation": reg_name, "status": "ok", "rows": entry["rows"], "entry": entry,
+                "seconds": time.perf_counter() - start, "pid": os.getpid()}
+    except Exception as e:
+        return {"regulation": reg_name, "status": "failed", "error": f"{type(e).__name__}: {e}",
+                "seconds": time.perf_counter() - start, "pid": os.getpid()}
+
+def ingest_all(reg_dir=REG_DIR, embed_dir=EMBED_DIR, workers=None, threads_per_worker=None, annotate=True):
+    """
+    Ingest every regulation CSV in reg_dir across a process pool.
+    One file is one task, so throughput scales with the number of files up to
+    the number of workers. Returns the per-file result dicts.
+    """
+    from models import registry
+    from utils import storage
+
+    files = sorted(os.path.join(reg_dir, f) for f in os.listdir(reg_dir) if f.endswith(".csv"))
+    if not files:
+        print(f"No regulation CSVs found in {reg_dir}")
+        return []
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(files)))
+    threads_per_worker = threads_per_worker or max(1, cores // workers)
+    print(f"🚀 Ingesting {len(files)} files with {workers} workers × {threads_per_worker} threads")
+
+    start = time.perf_counter()
+    results = []
+    # Spawn, not fork: the parent has already imported numpy, and forked
+    # children would inherit its BLAS thread pools before any cap applies
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads_per_worker, annotate)) as pool:
+        futures = {pool.submit(ingest_file, path, embed_dir, annotate): path for path in files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                reg_name = os.path.splitext(os.path.basename(futures[future]))[0]
+                result = {"regulation": reg_name, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+
+            if result["status"] == "ok":
+                print(f"✅ {result['regulation']}: {result['rows']} rows in {result['seconds']:.2f}s (pid {result['pid']})")
+            else:
+                print(f"❌ {result['regulation']}: {result['error']}")
+
+    written = {r["regulation"]: r["entry"] for r in results if r["status"] == "ok"}
+    if written:
+        storage.register_regulations(embed_dir, registry.DEFAULT_MODEL, written)
+
+    failed = [r["regulation"] for r in results if r["status"] != "ok"]
+    print(f"\n📊 Ingested {len(written)}/{len(files)} files in {time.perf_counter() - start:.2f}s")
+    if failed:
+        print(f"❗ Failed: {', '.join(sorted(failed))}")
+    return results
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Annotate and embed regulation CSVs in parallel.")
+    arg_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core, at most one per file)")
+    arg_parser.add_argument("--threads-per-worker", type=int, default=None, help="torch/BLAS threads per worker (default: cores / workers)")
+    arg_parser.add_argument("--no-annotate", action="store_true", help="skip annotation and only embed")
+    arg_parser.add_argument("--reg-dir", default=REG_DIR)
+    arg_parser.add_argument("--embed-dir", default=EMBED_DIR)
+    args = arg_parser.parse_args()
+    ingest_all(args.reg_dir, args.embed_dir, workers=args.workers,
+               threads_per_worker=args.threads_per_worker, annotate=not args.no_annotate)
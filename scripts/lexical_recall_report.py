@@ -0,0 +1,43 @@
+import argparse
+import json
+import os
+import pandas as pd
+from models import match_engine
+from models.lexical_index import LexicalIndex, recall_report
+
+CONTROLS_EMB_PATH = "data/control_embeddings.pkl"
+CONTROLS_CSV_PATH = "data/controls/controls.csv"
+EMBED_DIR = "data/embeddings"
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and dense-comparison savings of the BM25 prefilter against exact matching.")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--settings", default="50,100,200,500,1000", help="candidate set sizes per control")
+    parser.add_argument("--min-candidates", type=int, default=50, help="fall back to exhaustive search below this")
+    parser.add_argument("--output", default="outputs/lexical_recall_report.json")
+    args = parser.parse_args()
+
+    control_embeddings = match_engine.load_embeddings(CONTROLS_EMB_PATH)
+    control_texts = pd.read_csv(CONTROLS_CSV_PATH)["control_statement"].fillna("").tolist()
+    regulation_matrix = match_engine.build_regulation_matrix(
+        match_engine.load_all_regulation_embeddings(EMBED_DIR)
+    )
+    index = LexicalIndex.build(regulation_matrix)
+
+    settings = [int(s) for s in args.settings.split(",")]
+    report = recall_report(control_embeddings, control_texts, regulation_matrix, index, top_n=args.top_n,
+                           settings=settings, min_candidates=args.min_candidates)
+
+    print(f"\n📊 BM25 prefilter recall@{args.top_n} vs exact ({len(regulation_matrix['matrix'])} requirements, "
+          f"{len(index.vocabulary)} terms)")
+    for row in report:
+        print(f"  candidates={row['candidates']:>5}  recall={row['recall']:.3f}  "
+              f"dense={row['dense_fraction']:.1%}  fallback={row['fallback_rate']:.1%}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Saved report to {args.output}")
+
+if __name__ == "__main__":
+    main()
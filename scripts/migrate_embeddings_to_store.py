@@ -0,0 +1,32 @@
+import os
+import pickle
+from models import registry
+from utils import storage
+
+EMBED_DIR = "data/embeddings"
+MODEL_NAME = registry.DEFAULT_MODEL
+
+def migrate():
+    """Copy every legacy .pkl in EMBED_DIR into the memory-mapped embedding store."""
+    for filename in sorted(os.listdir(EMBED_DIR)):
+        if not filename.endswith(".pkl"):
+            continue
+
+        with open(os.path.join(EMBED_DIR, filename), "rb") as f:
+            data = pickle.load(f)
+
+        if not isinstance(data, dict):
+            print(f"❗ Skipping {filename}: no texts/tags/categories to migrate (type {type(data)})")
+            continue
+
+        regulator_name = os.path.splitext(filename)[0]
+        embeddings = data["embeddings"]
+        texts = data.get("expanded_text", data.get("text", []))
+        tags = data.get("tags", ["N/A"] * len(texts))
+        categories = data.get("category_refined", ["N/A"] * len(texts))
+
+        storage.save_regulation_store(EMBED_DIR, regulator_name, embeddings, texts, tags, categories, MODEL_NAME)
+        print(f"✅ Migrated {filename} → {EMBED_DIR}/{regulator_name}.npy")
+
+if __name__ == "__main__":
+    migrate()
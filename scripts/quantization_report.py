@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+from models import match_engine
+from models.quantization import accuracy_report
+
+CONTROLS_EMB_PATH = "data/control_embeddings.pkl"
+EMBED_DIR = "data/embeddings"
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and memory of quantized matching against float32.")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--min-threshold", type=float, default=0.65)
+    parser.add_argument("--precisions", default="float16,int8")
+    parser.add_argument("--reranks", default="1,2,4,8", help="shortlist sizes as multiples of top-n")
+    parser.add_argument("--output", default="outputs/quantization_report.json")
+    args = parser.parse_args()
+
+    control_embeddings = match_engine.load_embeddings(CONTROLS_EMB_PATH)
+    regulations = match_engine.load_all_regulation_embeddings(EMBED_DIR)
+    report = accuracy_report(
+        control_embeddings, regulations, top_n=args.top_n, min_threshold=args.min_threshold,
+        precisions=args.precisions.split(","), reranks=[int(r) for r in args.reranks.split(",")],
+    )
+
+    print(f"\n📊 Quantized vs float32 matching (top {args.top_n}, threshold {args.min_threshold})")
+    for row in report:
+        print(f"  {row['precision']:>7} rerank={row['rerank']:>2}  recall={row['recall']:.3f}  "
+              f"identical={row['controls_with_identical_matches']:.3f}  "
+              f"max_diff={row['max_score_diff']:.2e}  "
+              f"memory={row['matrix_bytes'] / row['float32_matrix_bytes']:.2f}x")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Saved report to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import argparse
+from models import match_engine
+from models.match_state import rematch
+from utils import scorer
+
+CONTROLS_EMB_PATH = "data/control_embeddings.pkl"
+EMBED_DIR = "data/embeddings"
+STATE_DIR = "data/match_state"
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-match controls after regulation updates, re-scoring only the regulations that changed.")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--min-threshold", type=float, default=0.65)
+    parser.add_argument("--controls", default=CONTROLS_EMB_PATH)
+    parser.add_argument("--embed-dir", default=EMBED_DIR)
+    parser.add_argument("--state-dir", default=STATE_DIR)
+    parser.add_argument("--output-dir", default="outputs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    control_embeddings = match_engine.load_embeddings(args.controls)
+    regulations = match_engine.load_all_regulation_embeddings(args.embed_dir)
+    regulation_matrix = match_engine.build_regulation_matrix(regulations)
+
+    state, summary = rematch(control_embeddings, regulations, args.state_dir, top_n=args.top_n,
+                             dim=regulation_matrix['matrix'].shape[1])
+    result = state.match_result(regulation_matrix, min_threshold=args.min_threshold)
+    report = scorer.gap_analysis(result)
+
+    print(f"🔁 Re-scored {len(summary['recomputed'])} regulation(s) "
+          f"({summary['rows_scored']}/{summary['total_rows']} requirements) in {summary['seconds']:.2f}s")
+    for reg_name in summary['recomputed']:
+        print(f"   - {reg_name}")
+    if summary['removed']:
+        print(f"🗑️ Dropped {', '.join(summary['removed'])}")
+
+    # Run summary plus per-control scores and gaps, rewritten in place on every run.
+    # Kept apart from test_match.py's per-control compliance_report.jsonl/.csv
+    os.makedirs(args.output_dir, exist_ok=True)
+    result.save(os.path.join(args.output_dir, "match_result.npz"))
+    categories = regulation_matrix['categories']
+    controls = [
+        {
+            "control_index": int(control),
+            "compliance_score": float(score),
+            "matched_regulations": int(matched),
+            "missing_categories": missing,
+        }
+        for control, score, matched, missing in zip(
+            report['controls'], report['compliance_scores'], report['matched_count'],
+            scorer.expand_names(report['missing_categories'], categories))
+    ]
+    with open(os.path.join(args.output_dir, "rematch_report.json"), "w") as f:
+        json.dump({"summary": summary, "controls": controls}, f, indent=2)
+
+    print(f"✅ {len(result)} controls, {result.n_matches} matches in {time.perf_counter() - start:.2f}s "
+          f"→ {args.output_dir}/match_result.npz, {args.output_dir}/rematch_report.json")
+
+if __name__ == "__main__":
+    main()
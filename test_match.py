@@ -1,53 +1,55 @@
-from sentence_transformers import SentenceTransformer
 import pandas as pd
 import os
-import json
-from models import match_engine
-from utils import plot_utils  # Make sure this module exists
+from models import match_engine, registry
+from utils import plot_utils, tracing  # Make sure this module exists
+from utils.embedder import encode_with_cache, get_default_cache
+from utils.sinks import CsvSink, JsonLinesSink
+
+MODEL_NAME = registry.DEFAULT_MODEL
+
+REPORT_CSV_FIELDS = [
+    "control_id", "control_text", "compliance_score", "matched_count",
+    "matched_regulations", "missing_categories", "missing_regions",
+]
+
+def report_csv_row(item):
+    """Simplified CSV row for one compliance report record."""
+    return {
+        "control_id": item["control_id"],
+        "control_text": item["control_text"][:200],  # Truncate for CSV
+        "compliance_score": item["compliance_score"],
+        "matched_count": item["matched_count"],
+        "matched_regulations": ", ".join(item["matched_regulations"]),
+        "missing_categories": ", ".join(item["missing_categories"]),
+        "missing_regions": ", ".join(item["missing_regions"])
+    }
 
 # Create outputs directory if it doesn't exist
 os.makedirs("outputs", exist_ok=True)
 
 def main():
     try:
-        # Load the sentence transformer model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Load the sentence transformer model (shared through the registry)
+        model = registry.get_model(MODEL_NAME)
 
         # Load control statements from a CSV file
-        controls_df = pd.read_csv("data/controls/controls.csv")
+        with tracing.stage("csv_read") as span:
+            controls_df = pd.read_csv("data/controls/controls.csv")
+            span.add_items(len(controls_df))
         control_texts = controls_df["control_statement"].fillna("").tolist()
 
-        # Generate sentence embeddings for all control statements
-        control_embeddings = model.encode(control_texts)
+        # Generate sentence embeddings for all control statements (unchanged ones come from the cache)
+        control_embeddings = encode_with_cache(model, control_texts, MODEL_NAME)
+        print(f"🗄️ Embedding cache: {get_default_cache().stats()}")
 
         # Load all pre-generated regulation embeddings
         reg_embeds = match_engine.load_all_regulation_embeddings("data/embeddings")
         if not reg_embeds:
             raise ValueError("No regulation embeddings loaded")
 
-        # Perform control-to-regulation matching
-        matches = match_engine.match_controls_to_regulations(
-            control_embeddings,
-            reg_embeds,
-            top_n=3,
-            min_threshold=0.5
-        )
-
-        # Display matching results
-        for i, match_list in enumerate(matches):
-            print(f"\n🔐 Control {i+1}: {control_texts[i][:100]}...")  # Truncate long text
-            print("-" * 100)
-            if not match_list:
-                print("❌ No matches found.")
-            for m in match_list:
-                print(f"✅ Regulation: {m['regulation']}")
-                print(f"   - Similarity: {m['similarity']:.2f}")
-                print(f"   - Requirement: {m['requirement_text'][:100]}...")
-                print(f"   - Tags: {m.get('tags', 'N/A')} | Category: {m.get('category_refined', 'N/A')}")
-
         # Get unique regulation names
         reg_list = list(reg_embeds.keys())
-        
+
         # Get all categories and regions from regulation embeddings
         all_categories = set()
         all_regions = set()
@@ -58,59 +60,68 @@ def main():
                 # You might need more specific logic here depending on your data structure
                 pass
 
-        # Compute compliance metrics
-        compliance_scores = match_engine.compute_compliance_score(matches, len(reg_list))
-        missing_categories, missing_regions = match_engine.detect_gaps(matches, all_categories, all_regions)
-
-        # Build comprehensive report
-        report = []
-        for i, (text, score) in enumerate(zip(control_texts, compliance_scores)):
-            match_list = matches[i]
-            matched_regs = list(set(m['regulation'] for m in match_list)) if match_list else []
-            
-            report.append({
-                "control_id": i + 1,
-                "control_text": text,
-                "compliance_score": score,
-                "matched_regulations": matched_regs,
-                "matched_count": len(matched_regs),
-                "missing_categories": missing_categories[i],
-                "missing_regions": missing_regions[i],
-                "matches": match_list
-            })
-
-        # Save reports
-        with open("outputs/compliance_report.json", "w") as f:
-            json.dump(report, f, indent=2)
-
-        # Create simplified DataFrame for CSV
-        csv_data = []
-        for item in report:
-            csv_data.append({
-                "control_id": item["control_id"],
-                "control_text": item["control_text"][:200],  # Truncate for CSV
-                "compliance_score": item["compliance_score"],
-                "matched_count": item["matched_count"],
-                "matched_regulations": ", ".join(item["matched_regulations"]),
-                "missing_categories": ", ".join(item["missing_categories"]),
-                "missing_regions": ", ".join(item["missing_regions"])
-            })
-        
-        pd.DataFrame(csv_data).to_csv("outputs/compliance_report.csv", index=False)
+        # Perform control-to-regulation matching, one control at a time
+        matches = match_engine.iter_match_controls(
+            control_embeddings,
+            reg_embeds,
+            top_n=3,
+            min_threshold=0.5
+        )
+
+        # Compliance score and gaps are computed per control as matches arrive
+        report = match_engine.iter_compliance_report(
+            matches, control_texts, len(reg_list), all_categories, all_regions
+        )
+
+        # Only the small per-control summaries are kept for the charts
+        compliance_scores = []
+        matched_regs_per_control = []
+
+        # Stream the report to disk: full records as JSON Lines, simplified rows as CSV
+        with JsonLinesSink("outputs/compliance_report.jsonl") as json_sink, \
+                CsvSink("outputs/compliance_report.csv", REPORT_CSV_FIELDS, row_fn=report_csv_row) as csv_sink:
+            for item in report:
+                i = item["control_id"] - 1
+                match_list = item["matches"]
+
+                # Display matching results
+                print(f"\n🔐 Control {i+1}: {control_texts[i][:100]}...")  # Truncate long text
+                print("-" * 100)
+                if not match_list:
+                    print("❌ No matches found.")
+                for m in match_list:
+                    print(f"✅ Regulation: {m['regulation']}")
+                    print(f"   - Similarity: {m['similarity']:.2f}")
+                    print(f"   - Requirement: {m['requirement_text'][:100]}...")
+                    print(f"   - Tags: {m.get('tags', 'N/A')} | Category: {m.get('category_refined', 'N/A')}")
+
+                json_sink.write(item)
+                csv_sink.write(item)
+                compliance_scores.append(item["compliance_score"])
+                matched_regs_per_control.append(item["matched_regulations"])
+
         print("\n✅ Compliance scores & gap analysis saved to outputs/ folder.")
 
+        if tracing.enabled():
+            tracing.print_summary()
+            tracing.write_summary("outputs/run_trace.json")
+            print("📁 Saved stage timings to outputs/run_trace.json")
+
         # Generate visualizations
         plot_utils.plot_compliance_bar(
-            [r["control_text"][:50] + "..." for r in report],  # Truncate labels
-            [r["compliance_score"] for r in report]
+            [text[:50] + "..." for text in control_texts],  # Truncate labels
+            compliance_scores
         )
-        
+
         regulation_coverage = {}
-        for item in report:
-            for reg in item["matched_regulations"]:
+        for matched_regs in matched_regs_per_control:
+            for reg in matched_regs:
                 regulation_coverage[reg] = regulation_coverage.get(reg, 0) + 1
-                
-        plot_utils.plot_coverage_heatmap(matches, reg_list)
+
+        plot_utils.plot_coverage_heatmap(
+            [[{'regulation': reg} for reg in matched_regs] for matched_regs in matched_regs_per_control],
+            reg_list
+        )
         plot_utils.plot_region_pie(regulation_coverage)
 
     except Exception as e:
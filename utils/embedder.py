@@ -0,0 +1,253 @@
+import os
+import time
+import sqlite3
+import threading
+import json
+import hashlib
+import numpy as np
+from utils import tracing
+
+# Persistent content-addressed embedding cache. Entries are keyed by
+# (model id, sha256 of the whitespace-normalized text), so unchanged text is
+# never sent to the model twice, whichever script or module encodes it.
+DEFAULT_CACHE_PATH = os.environ.get("OCIE_EMBEDDING_CACHE", "data/cache/embeddings.sqlite")
+DEFAULT_MAX_BYTES = int(os.environ.get("OCIE_EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Eviction frees down to this fraction of max_bytes, so a full cache does not evict on every put
+EVICT_TO_FRACTION = 0.9
+EVICT_CHUNK_ROWS = 1000
+# Cache hits update last_used in memory; the buffer is written on put/evict,
+# or on a read once it is this old or this large
+TOUCH_FLUSH_SECONDS = 30.0
+TOUCH_FLUSH_ROWS = 10000
+# encode options that do not change the vectors; any other option (e.g.
+# normalize_embeddings, output_value, precision, prompt) is part of the cache id
+OUTPUT_NEUTRAL_OPTIONS = frozenset({
+    "show_progress_bar", "device", "convert_to_numpy", "convert_to_tensor", "max_tokens", "max_batch_size",
+})
+
+def normalize_text(text):
+    """Collapse runs of whitespace so formatting-only edits still hit the cache."""
+    return " ".join(str(text).split())
+
+def text_key(text):
+    """Content hash used as the cache key for a text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def cache_model_id(model_id, encode_kwargs):
+    """
+    Cache id for vectors from model_id encoded with encode_kwargs: model_id
+    itself when only output-neutral options are set, otherwise model_id plus a
+    stable serialization of the options that shape the output.
+    """
+    options = {k: v for k, v in encode_kwargs.items() if k not in OUTPUT_NEUTRAL_OPTIONS}
+    if not options:
+        return model_id
+    return f"{model_id}|{json.dumps(options, sort_keys=True, default=repr)}"
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache with least-recently-used eviction once the
+    stored vectors exceed max_bytes. Keeps hit/miss counters for this process.
+    The stored size is tracked as a running total, read once at open; other
+    processes sharing the file are accounted for when eviction re-reads the
+    true size. Reads never write: last_used updates are buffered (see flush).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # One connection is shared by every thread in the process (e.g. API workers)
+        self.lock = threading.RLock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Generous timeout: parallel ingestion workers share one cache file
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self._bytes = self._stored_bytes()
+        # (model_id, key) -> last_used of cache hits not yet written
+        self._touched = {}
+        self._touched_since = time.time()
+
+    def get_many(self, model_id, keys, chunk_size=500):
+        """Return {key: vector} for the keys that are cached, and count hits and misses."""
+        with self.lock:
+            return self._get_many(model_id, keys, chunk_size)
+
+    def _get_many(self, model_id, keys, chunk_size):
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                [model_id, *chunk],
+            ).fetchall()
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+
+        if found:
+            now = time.time()
+            if not self._touched:
+                self._touched_since = now
+            self._touched.update(((model_id, key), now) for key in found)
+            if len(self._touched) >= TOUCH_FLUSH_ROWS or now - self._touched_since >= TOUCH_FLUSH_SECONDS:
+                self._flush()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model_id, items):
+        """Store (key, vector) pairs, then evict old entries if the cache is over its size limit."""
+        now = time.time()
+        rows = [
+            (model_id, key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items
+        ]
+        with self.lock:
+            self._flush(commit=False)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+            # Replaced rows are counted twice until the next eviction re-reads the true size
+            self._bytes += sum(len(row[3]) for row in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def flush(self):
+        """Write buffered last_used updates of cache hits."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self, commit=True):
+        if not self._touched:
+            return
+        self.conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+            [(used, model_id, key) for (model_id, key), used in self._touched.items()],
+        )
+        self._touched = {}
+        if commit:
+            self.conn.commit()
+
+    def _stored_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def size_bytes(self):
+        """Total size of the stored vectors (running total for this process)."""
+        return self._bytes
+
+    def evict(self):
+        """Drop least recently used entries until the stored vectors fit in max_bytes."""
+        with self.lock:
+            return self._evict()
+
+    def _evict(self):
+        self._flush()
+        # Other processes may have added or evicted entries since this total was read
+        self._bytes = self._stored_bytes()
+        if self._bytes <= self.max_bytes:
+            return 0
+
+        excess = self._bytes - int(self.max_bytes * EVICT_TO_FRACTION)
+        freed, evicted = 0, 0
+        while freed < excess:
+            doomed = []
+            rows = self.conn.execute(
+                "SELECT model, key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT ?", (EVICT_CHUNK_ROWS,)
+            ).fetchall()
+            for model_id, key, size in rows:
+                if freed >= excess:
+                    break
+                doomed.append((model_id, key))
+                freed += size
+            if not doomed:
+                break
+            self.conn.executemany("DELETE FROM embeddings WHERE model = ? AND key = ?", doomed)
+            evicted += len(doomed)
+
+        self.conn.commit()
+        self._bytes -= freed
+        return evicted
+
+    def stats(self):
+        """Hit/miss counters for this process and current cache size."""
+        total = self.hits + self.misses
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size = self.size_bytes()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+_default_cache = None
+
+def get_default_cache():
+    """Process-wide cache at DEFAULT_CACHE_PATH, opened on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
+
+def encode_with_cache(model, texts, model_id, cache=None, batch_size=None, sort_by_length=True, **encode_kwargs):
+    """
+    Encode texts with a SentenceTransformer-style model through the embedding cache.
+    Only distinct texts missing from the cache reach the model: in length-sorted,
+    token-budgeted batches of at most batch_size texts (models.encoding.encode_sorted),
+    or in file order in batches of batch_size (default 64) when sort_by_length is False.
+    Returns a float32 array with one row per input text, in input order, or a
+    single vector if texts is one string (as model.encode does).
+    Vectors encoded with output-changing encode_kwargs are cached separately
+    (see cache_model_id).
+    """
+    if isinstance(texts, str):
+        return encode_with_cache(model, [texts], model_id, cache, batch_size, sort_by_length, **encode_kwargs)[0]
+
+    cache = cache or get_default_cache()
+    model_id = cache_model_id(model_id, encode_kwargs)
+    texts = list(texts)
+    keys = [text_key(t) for t in texts]
+    with tracing.stage("embedding_cache", items=len(keys)):
+        found = cache.get_many(model_id, keys)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        with tracing.stage("encode", items=len(missing)):
+            if sort_by_length:
+                from models.encoding import DEFAULT_MAX_BATCH_SIZE, encode_sorted
+                new_vectors = encode_sorted(model, list(missing.values()),
+                                            max_batch_size=batch_size or DEFAULT_MAX_BATCH_SIZE, **encode_kwargs)
+            else:
+                new_vectors = model.encode(
+                    list(missing.values()), batch_size=batch_size or 64, convert_to_numpy=True, **encode_kwargs
+                )
+            new_vectors = np.asarray(new_vectors, dtype=np.float32)
+        with tracing.stage("embedding_cache", items=len(missing)):
+            cache.put_many(model_id, zip(missing.keys(), new_vectors))
+        found.update(zip(missing.keys(), new_vectors))
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([found[key] for key in keys])
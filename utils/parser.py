@@ -1,14 +1,15 @@
 import pandas as pd
-from keybert import KeyBERT
-from sentence_transformers import SentenceTransformer
-
-# Load models once
-model = SentenceTransformer('all-MiniLM-L6-v2')
-kw_model = KeyBERT(model)
+from sklearn.feature_extraction.text import CountVectorizer
+from models import registry
+from utils import tracing
+from utils.embedder import encode_with_cache
 
 def load_csv(path):
     """Load a CSV file as a pandas DataFrame."""
-    return pd.read_csv(path)
+    with tracing.stage("csv_read") as span:
+        df = pd.read_csv(path)
+        span.add_items(len(df))
+    return df
 
 def save_csv(df, path):
     """Save pandas DataFrame to a CSV file (overwrite)."""
@@ -22,11 +23,57 @@ def expand_requirement(text):
 def extract_tags(text, top_n=3):
     """Use KeyBERT to extract top keywords as tags."""
     try:
-        keywords = kw_model.extract_keywords(text, top_n=top_n)
+        keywords = registry.get_keybert().extract_keywords(text, top_n=top_n)
         return ", ".join([kw[0] for kw in keywords])
     except Exception:
         return ""
 
+def candidate_vectorizer(texts):
+    """
+    Fit the same single-word candidate vectorizer KeyBERT uses by default.
+    Returns (vectorizer, candidate words), or (None, []) if no candidates remain.
+    """
+    try:
+        vectorizer = CountVectorizer(stop_words="english").fit(texts)
+    except ValueError:
+        # Every text was empty or only stop words
+        return None, []
+    return vectorizer, list(vectorizer.get_feature_names_out())
+
+def extract_tags_batch(texts, top_n=3, doc_embeddings=None, vectorizer=None, word_embeddings=None):
+    """
+    Use KeyBERT to extract top keywords as tags for many texts at once.
+    Documents and candidate words are embedded in batches through the embedding
+    cache unless their embeddings are passed in. Returns one tag string per text.
+    """
+    texts = [str(t) for t in texts]
+    if vectorizer is None:
+        vectorizer, words = candidate_vectorizer(texts)
+        if vectorizer is None:
+            return [""] * len(texts)
+        word_embeddings = None
+    else:
+        words = list(vectorizer.get_feature_names_out())
+
+    model = registry.get_model()
+    if doc_embeddings is None:
+        doc_embeddings = encode_with_cache(model, texts, registry.DEFAULT_MODEL)
+    if word_embeddings is None:
+        word_embeddings = encode_with_cache(model, words, registry.DEFAULT_MODEL)
+
+    try:
+        keywords = registry.get_keybert().extract_keywords(
+            texts, top_n=top_n, vectorizer=vectorizer,
+            doc_embeddings=doc_embeddings, word_embeddings=word_embeddings,
+        )
+    except Exception:
+        return [""] * len(texts)
+
+    # KeyBERT returns a flat list of keywords when given a single document
+    if len(texts) == 1:
+        keywords = [keywords]
+    return [", ".join([kw[0] for kw in doc_keywords]) for doc_keywords in keywords]
+
 def refine_category(original_category):
     """Normalize and improve category labels."""
     mapping = {
@@ -44,3 +91,31 @@ def annotate_row(requirement_text, category):
     tags = extract_tags(requirement_text)
     refined_category = refine_category(category)
     return expanded, tags, refined_category
+
+def annotate_dataframe(df, top_n=3):
+    """
+    Annotate every row of a regulation DataFrame in one batched pass.
+    Requirement texts, their expanded texts and all candidate keywords are
+    encoded together, so annotating a file costs one large forward pass.
+    Returns (annotated df, embeddings of the expanded_text column) so the
+    embedding stage can store them without encoding the texts again.
+    """
+    requirements = df["requirement_text"].fillna("").astype(str).tolist()
+    expanded = [expand_requirement(text) for text in requirements]
+    vectorizer, words = candidate_vectorizer(requirements)
+
+    vectors = encode_with_cache(registry.get_model(), requirements + expanded + words, registry.DEFAULT_MODEL)
+    n = len(requirements)
+    doc_embeddings, expanded_embeddings, word_embeddings = vectors[:n], vectors[n:2 * n], vectors[2 * n:]
+
+    if vectorizer is None:
+        tags = [""] * n
+    else:
+        tags = extract_tags_batch(requirements, top_n=top_n, doc_embeddings=doc_embeddings,
+                                  vectorizer=vectorizer, word_embeddings=word_embeddings)
+
+    df = df.copy()
+    df["expanded_text"] = expanded
+    df["tags"] = tags
+    df["category_refined"] = [refine_category(str(c)) for c in df["category"].fillna("")]
+    return df, expanded_embeddings
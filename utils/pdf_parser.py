@@ -0,0 +1,150 @@
+import re
+
+# Text extraction and clause segmentation for regulation PDFs.
+# Pages are read with PyMuPDF (imported lazily, so the rest of the package
+# works without it) and fed one at a time into a ClauseSegmenter, which splits
+# the running text into numbered clauses that can become requirement rows.
+
+# "Article 5", "Section 12A", "Rule 3", ... optionally followed by a title
+HEADING_RE = re.compile(
+    r"^\s*(article|section|rule|regulation|clause|paragraph)\s+(\d+[a-z]?)\b[.:\-–]?\s*(.*)$", re.IGNORECASE)
+# "1.", "4)", "2.3", "2.3." at the start of a line (a bare "2019 ..." is not a clause number)
+NUMBERED_RE = re.compile(r"^\s*(\d{1,3}(?:\.\d{1,3})+\.?|\d{1,3}[.)])\s+(\S.*)$")
+# "(a)", "a)", "(iv)" at the start of a line
+ITEM_RE = re.compile(r"^\s*\(?([a-z]|[ivx]{1,5})\)\s+(\S.*)$", re.IGNORECASE)
+# Running headers / footers that carry no text of their own
+PAGE_NUMBER_RE = re.compile(r"^\s*(page\s+)?\d+(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+
+# _pdf_cache holds the document open in a worker process across page ranges
+_pdf_cache = {}
+
+def _fitz():
+    """PyMuPDF under its current name, falling back to the older fitz alias."""
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        import fitz
+        return fitz
+
+def _open_pdf(path):
+    doc = _pdf_cache.get(path)
+    if doc is None:
+        for old in _pdf_cache.values():
+            old.close()
+        _pdf_cache.clear()
+        doc = _pdf_cache[path] = _fitz().open(path)
+    return doc
+
+def page_count(path):
+    """Number of pages in a PDF."""
+    with _fitz().open(path) as doc:
+        return doc.page_count
+
+def extract_pages(path, start, end):
+    """Plain text of pages start..end-1 as a list of (page_number, text); page numbers are 1-based."""
+    doc = _open_pdf(path)
+    return [(page_no + 1, doc.load_page(page_no).get_text("text", sort=True))
+            for page_no in range(start, min(end, doc.page_count))]
+
+class ClauseSegmenter:
+    """
+    Split running regulation text into clauses.
+
+    Feed pages in order with add_page(); it returns the clauses completed so far
+    and keeps the unfinished one, so a clause can run across a page break.
+    Each clause is a dict with a hierarchical 'label' (e.g. "Art5.1.a"),
+    'text', the 'heading' title it sits under and the 'page' it starts on.
+    Call finish() after the last page to flush the final clause.
+    """
+
+    def __init__(self, min_chars=40):
+        self.min_chars = min_chars
+        self.heading = None
+        self.heading_title = ""
+        self.number = None
+        self.item = None
+        self._lines = []
+        self._label = None
+        self._page = None
+        self._awaiting_title = False
+
+    def _current_label(self):
+        parts = [p for p in (self.heading, self.number, self.item) if p]
+        return ".".join(parts) if parts else None
+
+    def _flush(self):
+        text = " ".join(" ".join(self._lines).split())
+        self._lines = []
+        # Words hyphenated across a line break
+        text = re.sub(r"(\w)- (\w)", r"\1\2", text)
+        if len(text) < self.min_chars:
+            return None
+        return {"label": self._label, "text": text, "heading": self.heading_title or "General",
+                "page": self._page}
+
+    def _start(self, page_no, first_line):
+        clause = self._flush() if self._lines else None
+        self._label = self._current_label()
+        self._page = page_no
+        if first_line:
+            self._lines.append(first_line)
+        return clause
+
+    def add_page(self, page_no, text):
+        """Consume one page of text and return the clauses it completed."""
+        clauses = []
+        for line in text.splitlines():
+            if not line.strip() or PAGE_NUMBER_RE.match(line):
+                continue
+
+            heading = HEADING_RE.match(line)
+            numbered = None if heading else NUMBERED_RE.match(line)
+            item = None if heading or numbered else ITEM_RE.match(line)
+
+            if heading:
+                kind = heading.group(1)[:3].title()
+                self.heading, self.number, self.item = f"{kind}{heading.group(2)}", None, None
+                self.heading_title = heading.group(3).strip()
+                self._awaiting_title = not self.heading_title
+                clause = self._start(page_no, "")
+            elif numbered:
+                self.number, self.item = numbered.group(1).rstrip(".)"), None
+                self._awaiting_title = False
+                clause = self._start(page_no, numbered.group(2))
+            elif item:
+                self.item = item.group(1).lower()
+                self._awaiting_title = False
+                clause = self._start(page_no, item.group(2))
+            else:
+                if self._awaiting_title:
+                    # Title printed on the line after "Article 5"
+                    self.heading_title = line.strip()
+                    self._awaiting_title = False
+                    continue
+                if self._page is None:
+                    self._page = page_no
+                self._lines.append(line)
+                continue
+
+            if clause:
+                clauses.append(clause)
+        return clauses
+
+    def finish(self):
+        """Flush and return the last clause, if it is long enough."""
+        clause = self._flush() if self._lines else None
+        return [clause] if clause else []
+
+def clause_ids(prefix, clauses, seen):
+    """
+    Stable row ids for clauses: '<prefix>-<label>', or '<prefix>-p<page>' for
+    unnumbered text. Repeats get a '-2', '-3', ... suffix; seen carries the
+    counts across batches of the same document.
+    """
+    ids = []
+    for clause in clauses:
+        base = f"{prefix}-{clause['label'] or 'p' + str(clause['page'])}"
+        seen[base] = seen.get(base, 0) + 1
+        ids.append(base if seen[base] == 1 else f"{base}-{seen[base]}")
+    return ids
@@ -1,64 +1,213 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-from collections import Counter
-import os
-
-def plot_compliance_bar(control_texts, compliance_scores, save_path=None):
-    plt.figure(figsize=(12, 5))
-    sns.barplot(x=list(range(len(compliance_scores))), y=compliance_scores)
-    plt.xlabel("Control Index")
-    plt.ylabel("Compliance Score")
-    plt.title("Compliance Score per Control")
-    if save_path:
-        plt.savefig(save_path)
-    plt.tight_layout()
-    plt.show()
-
-
-def plot_coverage_heatmap(matches, regulation_list, save_path=None):
-    matrix = []
-    for control_matches in matches:
-        matched = set(m['regulation'] for m in control_matches)
-        row = [1 if r in matched else 0 for r in regulation_list]
-        matrix.append(row)
-
-    df_matrix = pd.DataFrame(matrix, columns=regulation_list)
-    plt.figure(figsize=(12, 6))
-    sns.heatmap(df_matrix, cmap="YlGnBu", cbar=True, linewidths=0.3, linecolor='gray')
-    plt.title("Heatmap: Control × Regulation Coverage")
-    plt.xlabel("Regulations")
-    plt.ylabel("Controls")
-    if save_path:
-        plt.savefig(save_path)
-    plt.tight_layout()
-    plt.show()
+import numpy as np
+from collections.abc import Mapping
+from models.partitions import region_of
+from utils import scorer
 
+# Charts over large control sets. Nothing here draws one mark per control once
+# there are more than a few dozen: coverage comes in as a controls × regulations
+# boolean matrix built straight from integer match arrays (utils.scorer), and
+# rows are aggregated into groups (control families, score bins) or contiguous
+# bands before rendering, so render time depends on the number of groups and
+# regulations rather than on the number of controls.
+# backend="plotly" returns an interactive plotly figure instead of drawing with
+# matplotlib; per-control views (plot_control_scores) use WebGL traces.
+# pandas, matplotlib, seaborn and plotly are imported inside the functions that draw,
+# so importing this module (e.g. at dashboard start-up) stays cheap.
 
-def plot_region_pie(matches, save_path=None):
-    regions = {
-        "GDPR": "EU", "DPDP": "India", "RBI": "India", "PIPEDA": "Canada",
-        "GLBA": "US", "UK DPA": "UK", "MSA": "Singapore", "BaFin": "Germany",
-        "Australia Privacy": "Australia", "SEBI": "India"
-    }
+BACKENDS = ("matplotlib", "plotly")
+# Above this many controls, bars and heatmap rows are aggregated
+MAX_ROWS = 50
 
-    all_matches = [m['regulation'] for control in matches for m in control]
-    region_labels = [regions.get(reg, "Unknown") for reg in all_matches]
-    region_counts = dict(Counter(region_labels))
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
 
-    plt.figure(figsize=(7, 7))
-    plt.pie(region_counts.values(), labels=region_counts.keys(), autopct='%1.1f%%', startangle=140)
-    plt.title("Regulation Coverage per Region")
+def _finish(fig, save_path=None, show=True):
+    """Save and/or show a matplotlib figure, then return it."""
+    fig.tight_layout()
     if save_path:
-        plt.savefig(save_path)
-    plt.tight_layout()
-    plt.show()
+        fig.savefig(save_path)
+    if show:
+        import matplotlib.pyplot as plt
+        plt.show()
+    return fig
+
+def coverage_from_matches(matches, regulation_list):
+    """
+    Controls × regulations boolean coverage matrix. matches can be lists of match
+    dicts per control, a MatchResult, or an existing coverage matrix.
+    """
+    if isinstance(matches, np.ndarray):
+        return matches.astype(bool, copy=False)
+    if hasattr(matches, "control_offsets"):
+        coverage = scorer.coverage_from_result(matches)['regulations']
+        # Reorder to regulation_list's columns
+        columns = scorer.encode(regulation_list, scorer.index_of(matches.regulation_names))
+        out = np.zeros((len(coverage), len(regulation_list)), dtype=bool)
+        out[:, columns >= 0] = coverage[:, columns[columns >= 0]]
+        return out
+    return scorer.encode_matches(matches, regulation_list)['regulations']
+
+def score_bins(scores, bins=10):
+    """Group label of each control by compliance score range (scores in 0..1), and the label names."""
+    scores = np.asarray(scores, dtype=np.float64)
+    edges = np.linspace(0, 1, bins + 1)
+    groups = np.clip(np.searchsorted(edges, scores, side="right") - 1, 0, bins - 1)
+    names = [f"{lo:.0%}-{hi:.0%}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return groups, names
+
+def aggregate_rows(coverage, groups=None, group_names=None, max_rows=MAX_ROWS):
+    """
+    Collapse coverage rows into at most max_rows rows of covered fractions.
+    With groups (an integer group per control, e.g. a control family or
+    score bin) each row is one group; otherwise contiguous bands of controls.
+    Returns (fractions, row labels, controls per row).
+    """
+    coverage = np.asarray(coverage, dtype=bool)
+    n_rows = len(coverage)
+    if groups is None:
+        if n_rows <= max_rows:
+            return coverage.astype(np.float32), [str(i + 1) for i in range(n_rows)], np.ones(n_rows, dtype=np.int64)
+        bounds = np.linspace(0, n_rows, max_rows + 1).astype(np.int64)
+        groups = np.repeat(np.arange(max_rows), np.diff(bounds))
+        group_names = [f"{lo + 1}-{hi}" for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    groups = np.asarray(groups, dtype=np.int64)
+    n_groups = len(group_names) if group_names is not None else int(groups.max(initial=-1)) + 1
+    sizes = np.bincount(groups, minlength=n_groups)
+    totals = np.column_stack([np.bincount(groups, weights=column, minlength=n_groups) for column in coverage.T]) \
+        if coverage.shape[1] else np.zeros((n_groups, 0))
+    fractions = totals / np.maximum(sizes, 1)[:, None]
+    names = group_names if group_names is not None else [str(g) for g in range(n_groups)]
+    return fractions.astype(np.float32), list(names), sizes
+
+def plot_compliance_bar(control_texts, compliance_scores, save_path=None, max_bars=MAX_ROWS, bins=10,
+                        backend="matplotlib", show=True):
+    """
+    One bar per control for small sets; above max_bars, the number of controls
+    per compliance score range instead.
+    """
+    _check_backend(backend)
+    scores = np.asarray(compliance_scores, dtype=np.float64)
+    if len(scores) <= max_bars:
+        x, y = [str(i) for i in range(len(scores))], scores
+        xlabel, ylabel, title = "Control Index", "Compliance Score", "Compliance Score per Control"
+    else:
+        groups, x = score_bins(scores, bins)
+        y = np.bincount(groups, minlength=bins)
+        xlabel, ylabel, title = "Compliance Score", "Controls", f"Compliance Scores of {len(scores)} Controls"
+
+    if backend == "plotly":
+        import plotly.graph_objects as go
+        fig = go.Figure(go.Bar(x=x, y=y))
+        fig.update_layout(title=title, xaxis_title=xlabel, yaxis_title=ylabel)
+        return fig
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 5))
+    ax.bar(x, y)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    return _finish(fig, save_path, show)
+
+def plot_coverage_heatmap(matches, regulation_list, save_path=None, groups=None, group_names=None,
+                          max_rows=MAX_ROWS, backend="matplotlib", show=True):
+    """
+    Control × regulation coverage. Up to max_rows controls are drawn one row
+    each; larger sets, or any set given groups, are drawn as the share of
+    controls in each group (or band of controls) covering each regulation.
+    """
+    _check_backend(backend)
+    coverage = coverage_from_matches(matches, regulation_list)
+    fractions, row_labels, sizes = aggregate_rows(coverage, groups, group_names, max_rows)
+    aggregated = groups is not None or len(coverage) > max_rows
+    title = (f"Heatmap: Share of {len(coverage)} Controls Covering Each Regulation" if aggregated
+             else "Heatmap: Control × Regulation Coverage")
+    ylabel = "Control Group" if groups is not None else "Controls"
+
+    if backend == "plotly":
+        import plotly.graph_objects as go
+        fig = go.Figure(go.Heatmap(
+            z=fractions, x=list(regulation_list), y=row_labels, colorscale="YlGnBu", zmin=0, zmax=1,
+            customdata=np.repeat(sizes[:, None], len(regulation_list), axis=1),
+            hovertemplate="%{y} × %{x}: %{z:.0%} of %{customdata} controls<extra></extra>",
+        ))
+        fig.update_layout(title=title, xaxis_title="Regulations", yaxis_title=ylabel, yaxis_autorange="reversed")
+        return fig
+
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=(12, 6))
+    sns.heatmap(pd.DataFrame(fractions, index=row_labels, columns=list(regulation_list)), cmap="YlGnBu",
+                vmin=0, vmax=1, cbar=True, linewidths=0.3 if len(row_labels) <= max_rows else 0,
+                linecolor='gray', ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel("Regulations")
+    ax.set_ylabel(ylabel)
+    return _finish(fig, save_path, show)
 
+def plot_control_scores(compliance_scores, matched_counts, control_labels=None, save_path=None,
+                        backend="plotly", show=True):
+    """
+    Every control as one point (compliance score against matched regulations).
+    The plotly backend uses a WebGL scatter, which stays interactive for 10^5+ points.
+    """
+    _check_backend(backend)
+    scores = np.asarray(compliance_scores, dtype=np.float64)
+    counts = np.asarray(matched_counts)
 
+    if backend == "plotly":
+        import plotly.graph_objects as go
+        fig = go.Figure(go.Scattergl(
+            x=np.arange(1, len(scores) + 1), y=scores, mode="markers",
+            marker=dict(size=4, color=counts, colorscale="Viridis", showscale=True,
+                        colorbar=dict(title="Matched")),
+            text=control_labels, hovertemplate="%{text}<br>score %{y:.0%}<extra></extra>" if control_labels is not None else None,
+        ))
+        fig.update_layout(title=f"Compliance Score of {len(scores)} Controls", xaxis_title="Control",
+                          yaxis_title="Compliance Score")
+        return fig
 
-import matplotlib.pyplot as plt
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 5))
+    ax.scatter(np.arange(1, len(scores) + 1), scores, c=counts, s=2, rasterized=True)
+    ax.set_xlabel("Control")
+    ax.set_ylabel("Compliance Score")
+    ax.set_title(f"Compliance Score of {len(scores)} Controls")
+    return _finish(fig, save_path, show)
+
+def plot_region_pie(matches, save_path=None, backend="matplotlib", show=True):
+    """
+    Matches per region (see models.partitions.REGULATION_REGIONS). matches can be
+    lists of match dicts per control or a {regulation: count} dict of per-regulation totals.
+    """
+    _check_backend(backend)
+    if isinstance(matches, Mapping):
+        regulations, counts = list(matches.keys()), np.asarray(list(matches.values()), dtype=np.int64)
+    else:
+        regulations, counts = np.unique([m['regulation'] for control in matches for m in control],
+                                        return_counts=True)
+    region_labels = np.array([region_of(reg) for reg in regulations], dtype=object)
+    region_names, codes = np.unique(region_labels.astype(str), return_inverse=True)
+    region_counts = np.bincount(codes.reshape(-1), weights=counts, minlength=len(region_names))
+
+    if backend == "plotly":
+        import plotly.graph_objects as go
+        fig = go.Figure(go.Pie(labels=region_names.tolist(), values=region_counts))
+        fig.update_layout(title="Regulation Coverage per Region")
+        return fig
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(7, 7))
+    ax.pie(region_counts, labels=region_names.tolist(), autopct='%1.1f%%', startangle=140)
+    ax.set_title("Regulation Coverage per Region")
+    return _finish(fig, save_path, show)
 
 def plot_pie_coverage(coverage_dict, save_path=None):
+    import matplotlib.pyplot as plt
+
     labels = list(coverage_dict.keys())
     sizes = list(coverage_dict.values())
 
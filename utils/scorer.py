@@ -0,0 +1,107 @@
+import numpy as np
+from utils import tracing
+
+# Vectorized compliance scoring and gap detection. Matches are reduced to
+# integer codes (control, regulation id, category id, region id) once and
+# coverage is kept as boolean controls × regulations / controls × categories
+# matrices. Scores, gaps and roll-ups are reductions over those matrices;
+# names are only expanded when a report is written.
+
+def index_of(names):
+    """Map each name to its position in names."""
+    return {name: i for i, name in enumerate(names)}
+
+def encode(values, index):
+    """Integer codes of values under index, -1 for values not in it."""
+    return np.fromiter((index.get(v, -1) for v in values), dtype=np.int64, count=len(values))
+
+def coverage_matrix(owner, codes, n_rows, n_cols):
+    """Boolean n_rows × n_cols matrix with (owner[i], codes[i]) set; codes of -1 are skipped."""
+    covered = np.zeros((n_rows, n_cols), dtype=bool)
+    owner = np.asarray(owner, dtype=np.int64)
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = codes >= 0
+    covered[owner[valid], codes[valid]] = True
+    return covered
+
+def encode_matches(matches_per_control, regulations, categories=(), regions=()):
+    """
+    Coverage matrices from lists of match dicts (one list per control).
+    regulations, categories, regions: the column names of each matrix, in order.
+    Match values outside these names, and empty values, are ignored.
+    Returns {'regulations', 'categories', 'regions'} boolean matrices.
+    """
+    counts = [len(matches) for matches in matches_per_control]
+    owner = np.repeat(np.arange(len(counts)), counts)
+    flat = [m for matches in matches_per_control for m in matches]
+
+    def column(key, names):
+        codes = encode([m.get(key) or None for m in flat], index_of(names))
+        return coverage_matrix(owner, codes, len(counts), len(names))
+
+    return {
+        'regulations': column('regulation', regulations),
+        'categories': column('category_refined', categories),
+        'regions': column('region', regions),
+    }
+
+def coverage_from_result(result):
+    """
+    Coverage matrices straight from a MatchResult's integer arrays.
+    Columns follow regulation_matrix['regulations'] and regulation_matrix['categories'].
+    """
+    matrix = result.regulation_matrix
+    owner = np.repeat(np.arange(len(result)), np.diff(result.control_offsets))
+    return {
+        'regulations': coverage_matrix(owner, result.regulation_id, len(result), len(matrix['regulations'])),
+        'categories': coverage_matrix(owner, result.category_id, len(result), len(matrix['categories'])),
+    }
+
+def compliance_scores(regulation_coverage, total_regulations):
+    """Matched regulations / total regulations per control (0 when total is 0)."""
+    if total_regulations <= 0:
+        return np.zeros(len(regulation_coverage))
+    return regulation_coverage.sum(axis=1) / total_regulations
+
+def rollup(coverage, names):
+    """Number of controls covering each column, by name."""
+    return dict(zip(names, coverage.sum(axis=0).tolist()))
+
+def gap_rollup(coverage, names):
+    """Number of controls missing each column, by name."""
+    return dict(zip(names, (len(coverage) - coverage.sum(axis=0)).tolist()))
+
+def expand_names(mask, names):
+    """Per-row lists of the names whose column is set in mask."""
+    names = np.asarray(names, dtype=object)
+    return [names[row].tolist() for row in mask]
+
+def pack(coverage):
+    """Bit-pack a coverage matrix row-wise (8 columns per byte)."""
+    return np.packbits(coverage, axis=1)
+
+def unpack(bits, n_cols):
+    """Inverse of pack."""
+    return np.unpackbits(bits, axis=1, count=n_cols).astype(bool)
+
+def gap_analysis(result, total_regulations=None):
+    """
+    Scores, gaps and roll-ups for a whole MatchResult without building match dicts.
+    Returns a dict of arrays; expand missing_categories with expand_names on output.
+    """
+    categories = result.regulation_matrix['categories']
+    if total_regulations is None:
+        total_regulations = len(result.regulation_matrix['regulations'])
+
+    with tracing.stage("gap_analysis", items=len(result)):
+        coverage = coverage_from_result(result)
+        return {
+            'controls': result.controls,
+            'compliance_scores': compliance_scores(coverage['regulations'], total_regulations),
+            'matched_count': coverage['regulations'].sum(axis=1),
+            'regulation_coverage': coverage['regulations'],
+            'category_coverage': coverage['categories'],
+            'missing_categories': ~coverage['categories'],
+            'controls_per_regulation': rollup(coverage['regulations'], result.regulation_names),
+            'controls_missing_category': gap_rollup(coverage['categories'], categories),
+        }
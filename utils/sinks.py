@@ -0,0 +1,85 @@
+import os
+import csv
+import json
+import numpy as np
+from utils import tracing
+
+# Incremental writers for match results and compliance reports. Each record
+# is written as soon as it is produced, so memory use does not grow with the
+# number of controls.
+
+def _to_builtin(obj):
+    """json default= hook for numpy scalars and arrays."""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class JsonLinesSink:
+    """Writes one JSON object per line."""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        with tracing.stage("serialization", items=1):
+            self._file.write(json.dumps(record, ensure_ascii=False, default=_to_builtin))
+            self._file.write("\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CsvSink:
+    """
+    Writes dict rows under a fixed header. Keys not in fieldnames are ignored;
+    row_fn can turn a record into the CSV row first.
+    """
+
+    def __init__(self, path, fieldnames, row_fn=None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.count = 0
+        self.row_fn = row_fn
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, record):
+        with tracing.stage("serialization", items=1):
+            self._writer.writerow(self.row_fn(record) if self.row_fn else record)
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_records(records, *sinks):
+    """Write every record from an iterable to each sink as it arrives. Returns the record count."""
+    count = 0
+    for record in records:
+        for sink in sinks:
+            sink.write(record)
+        count += 1
+    return count
@@ -0,0 +1,246 @@
+import os
+import json
+import numpy as np
+
+# On-disk layout of an embedding store directory (e.g. data/embeddings):
+#   manifest.json       model name, embedding dimension and one entry per regulation
+#   <reg>.npy           contiguous float32 (rows, dim) matrix, memory-mapped on load
+#   <reg>.meta.json     texts, tags and category_refined columns for the same rows,
+#                       plus optional row ids and content hashes for incremental updates
+MANIFEST_NAME = "manifest.json"
+STORE_FORMAT_VERSION = 1
+
+def _write_atomic(path, write_fn):
+    """Write a file through a temp path and rename it, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    _write_atomic(path, write)
+
+def load_manifest(store_dir):
+    """Return the store manifest as a dict, or None if store_dir has no manifest."""
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(store_dir, manifest):
+    """Write the store manifest."""
+    _write_json(os.path.join(store_dir, MANIFEST_NAME), manifest)
+
+def _check_compatible(manifest, reg_name, model_name, dim):
+    if manifest and manifest["regulations"] and (manifest["model"] != model_name or manifest["dim"] != dim):
+        raise ValueError(
+            f"{reg_name}: store holds {manifest['model']} ({manifest['dim']}d) embeddings, "
+            f"got {model_name} ({dim}d)"
+        )
+
+def write_regulation_files(store_dir, reg_name, embeddings, texts, tags, categories, ids=None, content_hashes=None):
+    """
+    Write one regulation's vectors and metadata files without touching the manifest.
+    Safe to call from several processes at once for different regulations; the
+    returned entry is then added with register_regulations.
+    embeddings: (rows, dim) array, stored as contiguous float32
+    texts, tags, categories: lists with one entry per row
+    ids, content_hashes: optional per-row source ids and text hashes, used to
+      re-embed only changed rows next time
+    """
+    ids = list(ids) if ids is not None else []
+    content_hashes = list(content_hashes) if content_hashes is not None else []
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2:
+        raise ValueError(f"Expected 2D embeddings for {reg_name}, got shape {embeddings.shape}")
+
+    rows, dim = embeddings.shape
+    columns = [("texts", texts), ("tags", tags), ("categories", categories)]
+    columns += [(name, column) for name, column in (("ids", ids), ("content_hashes", content_hashes)) if column]
+    for name, column in columns:
+        if len(column) != rows:
+            raise ValueError(f"{reg_name}: {name} has {len(column)} entries for {rows} embeddings")
+
+    os.makedirs(store_dir, exist_ok=True)
+    vectors_file = f"{reg_name}.npy"
+    metadata_file = f"{reg_name}.meta.json"
+
+    def write_vectors(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+
+    _write_atomic(os.path.join(store_dir, vectors_file), write_vectors)
+    _write_json(os.path.join(store_dir, metadata_file), {
+        "expanded_text": list(texts),
+        "tags": list(tags),
+        "category_refined": list(categories),
+        "id": ids,
+        "content_hash": content_hashes,
+    })
+
+    return {
+        "rows": rows,
+        "dim": dim,
+        "vectors": vectors_file,
+        "metadata": metadata_file,
+    }
+
+class RegulationStreamWriter:
+    """
+    Incremental version of write_regulation_files for regulations that arrive in
+    batches (e.g. long PDFs). Vectors are spooled to disk as they come in, so only
+    the metadata columns stay in memory. close() writes the same files as
+    write_regulation_files and returns the entry for register_regulations.
+    """
+
+    def __init__(self, store_dir, reg_name):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.reg_name = reg_name
+        self.rows = 0
+        self.dim = None
+        self.columns = {"texts": [], "tags": [], "categories": [], "ids": [], "content_hashes": []}
+        self._spool_path = os.path.join(store_dir, f"{reg_name}.npy.part")
+        self._spool = open(self._spool_path, "wb")
+
+    def append(self, embeddings, texts, tags, categories, ids=None, content_hashes=None):
+        """Add one batch of rows; see write_regulation_files for the arguments."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            raise ValueError(f"Expected 2D embeddings for {self.reg_name}, got shape {embeddings.shape}")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"{self.reg_name}: batch has dimension {embeddings.shape[1]}, expected {self.dim}")
+
+        batch = {"texts": texts, "tags": tags, "categories": categories,
+                 "ids": ids or [], "content_hashes": content_hashes or []}
+        for name, column in batch.items():
+            if (column or name in ("texts", "tags", "categories")) and len(column) != len(embeddings):
+                raise ValueError(f"{self.reg_name}: {name} has {len(column)} entries for {len(embeddings)} embeddings")
+            self.columns[name].extend(column)
+
+        self._spool.write(embeddings.tobytes())
+        self.rows += len(embeddings)
+
+    def abort(self):
+        """Drop the spooled vectors without writing anything to the store."""
+        self._spool.close()
+        if os.path.exists(self._spool_path):
+            os.remove(self._spool_path)
+
+    def close(self, chunk_bytes=1 << 20):
+        """Write <reg>.npy and <reg>.meta.json from the spooled batches. Returns the store entry."""
+        self._spool.close()
+        for name in ("ids", "content_hashes"):
+            if self.columns[name] and len(self.columns[name]) != self.rows:
+                raise ValueError(f"{self.reg_name}: {name} given for only some batches")
+
+        vectors_file = f"{self.reg_name}.npy"
+        metadata_file = f"{self.reg_name}.meta.json"
+        dim = self.dim or 0
+
+        def write_vectors(tmp_path):
+            with open(tmp_path, "wb") as out, open(self._spool_path, "rb") as spool:
+                np.lib.format.write_array_header_1_0(out, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                    "fortran_order": False,
+                    "shape": (self.rows, dim),
+                })
+                while True:
+                    chunk = spool.read(chunk_bytes)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+
+        _write_atomic(os.path.join(self.store_dir, vectors_file), write_vectors)
+        os.remove(self._spool_path)
+        _write_json(os.path.join(self.store_dir, metadata_file), {
+            "expanded_text": self.columns["texts"],
+            "tags": self.columns["tags"],
+            "category_refined": self.columns["categories"],
+            "id": self.columns["ids"],
+            "content_hash": self.columns["content_hashes"],
+        })
+
+        return {
+            "rows": self.rows,
+            "dim": dim,
+            "vectors": vectors_file,
+            "metadata": metadata_file,
+        }
+
+def register_regulations(store_dir, model_name, entries):
+    """
+    Add entries returned by write_regulation_files (reg_name -> entry) to the
+    manifest in a single update. Returns the new manifest.
+    """
+    manifest = load_manifest(store_dir)
+    for reg_name, entry in entries.items():
+        _check_compatible(manifest, reg_name, model_name, entry["dim"])
+        if manifest is None:
+            manifest = {
+                "format_version": STORE_FORMAT_VERSION,
+                "model": model_name,
+                "dim": entry["dim"],
+                "regulations": {},
+            }
+        manifest["model"] = model_name
+        manifest["dim"] = entry["dim"]
+        manifest["regulations"][reg_name] = {
+            "rows": entry["rows"],
+            "vectors": entry["vectors"],
+            "metadata": entry["metadata"],
+        }
+
+    if manifest is not None:
+        save_manifest(store_dir, manifest)
+    return manifest
+
+def save_regulation_store(store_dir, reg_name, embeddings, texts, tags, categories, model_name,
+                          ids=None, content_hashes=None):
+    """
+    Save one regulation's embeddings and metadata into the store and register it in the manifest.
+    model_name: encoder that produced the embeddings; must match the rest of the store
+    See write_regulation_files for the other arguments.
+    """
+    _check_compatible(load_manifest(store_dir), reg_name, model_name, np.shape(embeddings)[-1])
+    entry = write_regulation_files(store_dir, reg_name, embeddings, texts, tags, categories,
+                                   ids=ids, content_hashes=content_hashes)
+    return register_regulations(store_dir, model_name, {reg_name: entry})
+
+def load_regulation_store(store_dir, reg_name, manifest=None, mmap=True):
+    """
+    Load one regulation from the store.
+    Vectors are memory-mapped read-only by default, so processes loading the
+    same store share the OS page cache instead of holding private copies.
+    Returns a dict with 'embeddings', 'texts', 'tags', 'categories', 'ids' and
+    'content_hashes' (the last two are empty lists if they were never saved).
+    """
+    if manifest is None:
+        manifest = load_manifest(store_dir)
+    if manifest is None or reg_name not in manifest["regulations"]:
+        raise KeyError(f"{reg_name} not found in embedding store {store_dir}")
+
+    entry = manifest["regulations"][reg_name]
+    embeddings = np.load(os.path.join(store_dir, entry["vectors"]), mmap_mode="r" if mmap else None)
+    if embeddings.shape != (entry["rows"], manifest["dim"]):
+        raise ValueError(
+            f"{reg_name}: vectors have shape {embeddings.shape}, "
+            f"manifest expects ({entry['rows']}, {manifest['dim']})"
+        )
+
+    with open(os.path.join(store_dir, entry["metadata"]), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    return {
+        'embeddings': embeddings,
+        'texts': metadata.get("expanded_text", []),
+        'tags': metadata.get("tags", []),
+        'categories': metadata.get("category_refined", []),
+        'ids': metadata.get("id", []),
+        'content_hashes': metadata.get("content_hash", []),
+    }
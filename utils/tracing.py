@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# Opt-in per-stage instrumentation for the matching pipeline. Wrap a stage in
+#
+#     with tracing.stage("similarity", items=len(batch)):
+#         ...
+#
+# and each stage's calls, wall time, CPU time, item count and the process's
+# peak RSS are aggregated per stage name. Tracing is off unless OCIE_TRACE=1
+# (or enable() is called); when off, stage() returns a shared no-op context
+# manager, so instrumented code costs one function call per stage.
+#
+# Stages should not nest: a stage's time would otherwise also count towards
+# the stage around it.
+
+_enabled = os.environ.get("OCIE_TRACE", "0") not in ("", "0", "false", "False")
+_lock = threading.Lock()
+_stages = {}
+_started_at = time.time()
+
+def enabled():
+    return _enabled
+
+def enable():
+    """Turn tracing on for this process."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    """Drop all recorded stages and restart the run clock."""
+    global _started_at
+    with _lock:
+        _stages.clear()
+        _started_at = time.time()
+
+def peak_rss_bytes():
+    """High-water resident set size of this process, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_items(self, n):
+        pass
+
+_NOOP = _NoopStage()
+
+class _Stage:
+    __slots__ = ("name", "items", "_wall", "_cpu")
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def add_items(self, n):
+        """Count items that are only known once the stage has run."""
+        self.items += n
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        peak = peak_rss_bytes()
+        with _lock:
+            record = _stages.get(self.name)
+            if record is None:
+                record = _stages[self.name] = {"calls": 0, "errors": 0, "wall_seconds": 0.0,
+                                               "cpu_seconds": 0.0, "items": 0, "max_wall_seconds": 0.0,
+                                               "peak_rss_bytes": None}
+            record["calls"] += 1
+            record["errors"] += exc_type is not None
+            record["wall_seconds"] += wall
+            record["cpu_seconds"] += cpu
+            record["items"] += self.items
+            record["max_wall_seconds"] = max(record["max_wall_seconds"], wall)
+            if peak is not None:
+                record["peak_rss_bytes"] = max(record["peak_rss_bytes"] or 0, peak)
+        return False
+
+def stage(name, items=0):
+    """Context manager timing one run of a pipeline stage (a no-op unless tracing is enabled)."""
+    if not _enabled:
+        return _NOOP
+    return _Stage(name, items)
+
+def summary():
+    """Structured run summary: per-stage totals plus throughput, in first-seen order."""
+    with _lock:
+        stages = {name: dict(record) for name, record in _stages.items()}
+    for record in stages.values():
+        wall = record["wall_seconds"]
+        record["items_per_second"] = record["items"] / wall if wall > 0 and record["items"] else None
+    return {
+        "enabled": _enabled,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_started_at)),
+        "run_seconds": time.time() - _started_at,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": stages,
+    }
+
+def write_summary(path):
+    """Write summary() as JSON."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2)
+
+def print_summary():
+    """Console table of the recorded stages."""
+    stages = summary()["stages"]
+    if not stages:
+        return
+    print("\n⏱️ Stage timings:")
+    print(f"   {'stage':<16}{'calls':>8}{'wall s':>10}{'cpu s':>10}{'items':>10}{'peak RSS MB':>13}")
+    for name, r in stages.items():
+        peak = f"{r['peak_rss_bytes'] / 2**20:.0f}" if r["peak_rss_bytes"] else "-"
+        print(f"   {name:<16}{r['calls']:>8}{r['wall_seconds']:>10.3f}{r['cpu_seconds']:>10.3f}{r['items']:>10}{peak:>13}")
+
+def prometheus_text(prefix="ocie"):
+    """Stage metrics in the Prometheus text exposition format."""
+    stages = summary()["stages"]
+    metrics = [
+        ("stage_calls_total", "counter", "Number of times the stage ran", "calls"),
+        ("stage_errors_total", "counter", "Number of stage runs that raised", "errors"),
+        ("stage_wall_seconds_total", "counter", "Wall time spent in the stage", "wall_seconds"),
+        ("stage_cpu_seconds_total", "counter", "Process CPU time spent in the stage", "cpu_seconds"),
+        ("stage_items_total", "counter", "Items processed by the stage", "items"),
+        ("stage_peak_rss_bytes", "gauge", "Process peak RSS observed at the end of the stage", "peak_rss_bytes"),
+    ]
+    lines = []
+    for metric, kind, help_text, key in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, record in stages.items():
+            if record[key] is not None:
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {record[key]}')
+    return "\n".join(lines) + "\n"